@@ -0,0 +1,85 @@
+import argparse
+import logging
+import time
+
+from catalog import DatasetCatalog, dataset_fingerprint
+from config import CGUS_DATASET_PATH
+from content_hashes import ContentHashes, content_hashes_path
+from mapped_index import mapped_index_path, write_mapped_index
+from metrics import metrics
+from term_index import TermIndex, term_index_path
+
+logger = logging.getLogger(__name__)
+
+
+def load_previous_indexes(previous_root):
+    """
+    Content hashes and term index persisted for a previous release, or None for each
+    of them which is missing or cannot be read
+    """
+    indexes = list()
+    for index_class, path in [
+        (ContentHashes, content_hashes_path(previous_root)),
+        (TermIndex, term_index_path(previous_root)),
+    ]:
+        try:
+            indexes.append(index_class.load(path))
+        except Exception as exception:  # pylint: disable=broad-except
+            logger.warning(f"Could not load {path}, rebuilding it: {exception}")
+            indexes.append(None)
+    return indexes
+
+
+def build_indexes(root_path: str, previous_root: str = None):
+    """
+    Build and persist the indexes of the dataset at `root_path`, then write them
+    with its catalog into the mapped index that serving processes open.
+    With `previous_root`, the dataset of a previous release, only the versions
+    added since then are read.
+    """
+    fingerprint = dataset_fingerprint(root_path)
+    catalog = DatasetCatalog(root_path)
+    previous_hashes, previous_index = None, None
+    if previous_root:
+        previous_hashes, previous_index = load_previous_indexes(previous_root)
+    start = time.perf_counter()
+    with metrics.timer("index_build_duration_seconds", index="content_hashes"):
+        content_hashes = ContentHashes.build(catalog, previous_hashes)
+        content_hashes.save(content_hashes_path(root_path))
+    stats = content_hashes.stats()
+    logger.info(
+        f"Hashed {stats['versions']} versions: {stats['distinct_contents']} distinct contents, "
+        f"{stats['saved_ratio']:.0%} of bytes are duplicates"
+    )
+    if previous_index is not None:
+        added = len(set(content_hashes.paths).difference(previous_index.paths))
+        removed = len(set(previous_index.paths).difference(content_hashes.paths))
+        logger.info(f"Since {previous_root}: {added} versions added, {removed} removed")
+    with metrics.timer("index_build_duration_seconds", index="terms"):
+        index = TermIndex.build(catalog, content_hashes, previous_index)
+        path = term_index_path(root_path)
+        index.save(path)
+    logger.info(
+        f"Indexed {len(index.paths)} versions ({len(index.postings)} trigrams) "
+        f"in {time.perf_counter() - start:.1f}s into {path}"
+    )
+    with metrics.timer("index_build_duration_seconds", index="mapped"):
+        path = mapped_index_path(root_path)
+        write_mapped_index(path, catalog, content_hashes, index, fingerprint)
+    logger.info(f"Wrote the mapped index {path} ({path.stat().st_size} bytes)")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(
+        description="Build the content hashes and term index of a dataset"
+    )
+    parser.add_argument("root_path", nargs="?", default=CGUS_DATASET_PATH)
+    parser.add_argument(
+        "--previous",
+        help="dataset of a previous release, whose indexes are updated "
+        "instead of reading every version",
+    )
+    args = parser.parse_args()
+    build_indexes(args.root_path, args.previous)
+    metrics.flush()
@@ -0,0 +1,76 @@
+import argparse
+import logging
+from pathlib import Path, PurePosixPath
+import time
+import zipfile
+
+from catalog import DatasetCatalog
+from packed_store import PackWriter, pack_path
+
+logger = logging.getLogger(__name__)
+
+
+def _zip_versions(archive: zipfile.ZipFile) -> list:
+    """
+    (service, doc_type, filename, member) of every version of a release archive,
+    whose versions are stored under a single top-level directory
+    """
+    versions = list()
+    for member in archive.infolist():
+        parts = PurePosixPath(member.filename).parts
+        if member.is_dir() or len(parts) != 4:
+            continue
+        _, service, doc_type, filename = parts
+        if service.startswith(".") or doc_type.startswith("."):
+            continue
+        versions.append((service, doc_type, filename, member))
+    return versions
+
+
+def build_pack_from_zip(zip_path, root_path, compress: bool = False) -> Path:
+    """
+    Pack the versions of a release archive into the dataset directory `root_path`,
+    without unpacking them. Return the location of the pack.
+    """
+    path = pack_path(root_path)
+    with zipfile.ZipFile(zip_path) as archive, PackWriter(path, compress) as writer:
+        # in catalog order, so that scans read the pack sequentially
+        for service, doc_type, filename, member in sorted(
+            _zip_versions(archive), key=lambda version: version[:3]
+        ):
+            writer.add(service, doc_type, filename, archive.read(member))
+    return path
+
+
+def build_pack_from_directory(source_path, root_path, compress: bool = False) -> Path:
+    """
+    Pack the versions of the dataset directory `source_path` into `root_path`.
+    Return the location of the pack.
+    """
+    path = pack_path(root_path)
+    catalog = DatasetCatalog(source_path)
+    with PackWriter(path, compress) as writer:
+        for service, doc_type, _, version_path in catalog.iter_versions():
+            writer.add(service, doc_type, version_path.name, version_path.read_bytes())
+    return path
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    parser = argparse.ArgumentParser(
+        description="Pack the versions of a release archive or dataset directory "
+        "into a single file, read by the API instead of one file per version"
+    )
+    parser.add_argument("source", help="release zip or dataset directory")
+    parser.add_argument("root_path", help="dataset directory to write the pack into")
+    parser.add_argument("--compress", action="store_true", help="compress versions")
+    args = parser.parse_args()
+    start = time.perf_counter()
+    if Path(args.source).is_dir():
+        built = build_pack_from_directory(args.source, args.root_path, args.compress)
+    else:
+        built = build_pack_from_zip(args.source, args.root_path, args.compress)
+    logger.info(
+        f"Packed {args.source} into {built} ({built.stat().st_size / 1e6:.1f} MB) "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
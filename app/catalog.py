@@ -0,0 +1,441 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from calendar import timegm
+from datetime import datetime, timedelta
+import logging
+import os
+from itertools import count
+from pathlib import Path
+from threading import Lock, RLock
+
+from config import (
+    DATASET_DATE_FORMAT,
+    LAST_DATASET_PATH,
+    PACK_FILENAME,
+    RELEASE_FILENAME,
+)
+from mapped_index import MappedIndex, StringTable, mapped_index_path
+from metrics import metrics
+from packed_store import PackedVersion, pack_path, read_pack_table
+
+
+EPOCH = datetime(1970, 1, 1)
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def to_timestamp(date: datetime) -> int:
+    """
+    Convert a naive UTC datetime to whole seconds since the epoch (microseconds are dropped)
+    """
+    return timegm(date.timetuple())
+
+
+def from_timestamp(timestamp: int) -> datetime:
+    """
+    Convert seconds since the epoch back to a naive UTC datetime
+    """
+    return EPOCH + timedelta(seconds=timestamp)
+
+
+class DocumentVersions:
+    """
+    Versions recorded for a given service and document type, sorted by date.
+    Dates are kept as a compact array of epoch seconds so lookups can bisect it.
+    """
+
+    def __init__(self, service: str, doc_type: str, directory: Path, versions: list):
+        self.service = service
+        self.doc_type = doc_type
+        self.directory = directory
+        versions.sort()
+        self.timestamps = array("q", (to_timestamp(date) for date, _ in versions))
+        self.filenames = [filename for _, filename in versions]
+        # id of the first version of this document in the catalog iteration order
+        self.first_version_id = 0
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def dates(self) -> list:
+        """
+        Version dates in chronological order
+        """
+        return [from_timestamp(timestamp) for timestamp in self.timestamps]
+
+    def date(self, index: int) -> datetime:
+        """
+        Date of the version stored at the given index
+        """
+        return from_timestamp(self.timestamps[index])
+
+    def locate(self, date: datetime, low: int = 0) -> int:
+        """
+        Return the number of versions recorded strictly before `date`,
+        i.e. the index of the first version at or after `date`.
+        `low` can be given to skip versions already known to be before `date`.
+        """
+        timestamp = to_timestamp(date)
+        if date.microsecond:
+            return bisect_right(self.timestamps, timestamp, low)
+        return bisect_left(self.timestamps, timestamp, low)
+
+    def path(self, index: int) -> Path:
+        """
+        Location of the version stored at the given index
+        """
+        return self.directory / self.filenames[index]
+
+    def items(self, start: int = 0, stop: int = None):
+        """
+        Yield (version_date, path) pairs in chronological order,
+        for the versions stored between the indexes `start` and `stop`
+        """
+        stop = len(self) if stop is None else stop
+        for index in range(start, stop):
+            yield from_timestamp(self.timestamps[index]), self.path(index)
+
+
+class PackedDocumentVersions(DocumentVersions):
+    """
+    Versions of a document stored in a pack file rather than in a directory
+    """
+
+    def __init__(self, service: str, doc_type: str, pack: Path, versions: list):
+        versions.sort()
+        super().__init__(
+            service,
+            doc_type,
+            pack.parent / service / doc_type,
+            [(date, filename) for date, filename, _ in versions],
+        )
+        self.pack = str(pack)
+        self.locations = [location for _, _, location in versions]
+
+    def path(self, index: int) -> PackedVersion:
+        offset, size, compressed = self.locations[index]
+        return PackedVersion(self.pack, offset, size, compressed, self.filenames[index])
+
+
+class MappedDocumentVersions(DocumentVersions):
+    """
+    Versions of a document read from a mapped index:
+    its dates and filenames are views of the mapped file rather than copies
+    """
+
+    # pylint: disable=super-init-not-called
+    def __init__(self, service, doc_type, directory, timestamps, filenames):
+        self.service = service
+        self.doc_type = doc_type
+        self.directory = directory
+        self.timestamps = timestamps
+        self.filenames = filenames
+        self.first_version_id = 0
+
+
+class MappedPackedDocumentVersions(MappedDocumentVersions):
+    """
+    Versions of a document stored in a pack file, read from a mapped index
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, service, doc_type, pack, timestamps, filenames, locations):
+        super().__init__(
+            service, doc_type, pack.parent / service / doc_type, timestamps, filenames
+        )
+        self.pack = str(pack)
+        # offsets, sizes, and whether the versions are compressed
+        self.offsets, self.sizes, self.compressed = locations
+
+    def path(self, index: int) -> PackedVersion:
+        return PackedVersion(
+            self.pack,
+            self.offsets[index],
+            self.sizes[index],
+            self.compressed,
+            self.filenames[index],
+        )
+
+
+class DatasetCatalog:
+    """
+    In-memory view of a dataset: service -> document type -> sorted versions.
+    Built once by walking the dataset directory, or by reading the table of contents
+    of its pack file when it has one, then shared by every request.
+    When the dataset has an up-to-date mapped index, the catalog is read from it instead,
+    so processes serving the same dataset share its arrays through the page cache.
+    `generation` numbers the catalogs successively served by the process.
+    """
+
+    def __init__(self, root_path, release: str = None, generation: int = 0):
+        self.root_path = Path(root_path)
+        self.release = release
+        self.generation = generation
+        self.mapped = load_mapped_index(self.root_path)
+        if self.mapped is None:
+            self.documents = self._scan(self.root_path)
+        else:
+            self.documents = self._read_mapped(self.mapped)
+        self._derived = dict()
+        # one lock per structure, so that a long build does not hold back the others
+        self._derived_locks = dict()
+        version_id = 0
+        for document in self.iter_documents():
+            document.first_version_id = version_id
+            version_id += len(document)
+
+    @staticmethod
+    def _scan(root_path: Path) -> dict:
+        if pack_path(root_path).exists():
+            return DatasetCatalog._read_pack(pack_path(root_path))
+        documents = dict()
+        for service in _sorted_subdirectories(root_path):
+            for doc_type in _sorted_subdirectories(root_path / service):
+                directory = root_path / service / doc_type
+                versions = list()
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        version_date = _parse_version_date(entry.name)
+                        if version_date is not None and entry.is_file():
+                            versions.append((version_date, entry.name))
+                if versions:
+                    documents.setdefault(service, dict())[doc_type] = DocumentVersions(
+                        service, doc_type, directory, versions
+                    )
+        return documents
+
+    @staticmethod
+    def _read_pack(pack: Path) -> dict:
+        documents = dict()
+        compressed, table = read_pack_table(pack)
+        for service in sorted(table):
+            for doc_type in sorted(table[service]):
+                versions = list()
+                for filename, offset, size in zip(*table[service][doc_type]):
+                    version_date = _parse_version_date(filename)
+                    if version_date is not None:
+                        versions.append(
+                            (version_date, filename, (offset, size, compressed))
+                        )
+                if versions:
+                    documents.setdefault(service, dict())[doc_type] = (
+                        PackedDocumentVersions(service, doc_type, pack, versions)
+                    )
+        return documents
+
+    def _read_mapped(self, mapped: MappedIndex) -> dict:
+        documents = dict()
+        timestamps = mapped.section("timestamps")
+        filenames = mapped.filenames()
+        pack_offsets = mapped.section("pack_offsets")
+        pack_sizes = mapped.section("pack_sizes")
+        start = 0
+        for service, doc_type, versions_count in mapped.documents:
+            stop = start + versions_count
+            views = (
+                timestamps[start:stop],
+                StringTable(filenames.blob, filenames.offsets[start : stop + 1]),
+            )
+            if mapped.pack_compressed is None:
+                document = MappedDocumentVersions(
+                    service, doc_type, self.root_path / service / doc_type, *views
+                )
+            else:
+                document = MappedPackedDocumentVersions(
+                    service,
+                    doc_type,
+                    pack_path(self.root_path),
+                    *views,
+                    (
+                        pack_offsets[start:stop],
+                        pack_sizes[start:stop],
+                        mapped.pack_compressed,
+                    ),
+                )
+            documents.setdefault(service, dict())[doc_type] = document
+            start = stop
+        return documents
+
+    def get(self, service: str, doc_type: str):
+        """
+        Return the versions of a document, or None if it is not in the dataset
+        """
+        return self.documents.get(service, dict()).get(doc_type)
+
+    def iter_documents(self, services=None, doc_types=None):
+        """
+        Yield every DocumentVersions of the dataset,
+        or only those of the given services and document types
+        """
+        for service, documents in self.documents.items():
+            if services is not None and service not in services:
+                continue
+            for doc_type, document in documents.items():
+                if doc_types is None or doc_type in doc_types:
+                    yield document
+
+    def iter_versions(self):
+        """
+        Yield (service, doc_type, version_date, path) for every version of the dataset
+        """
+        for document in self.iter_documents():
+            for version_date, path in document.items():
+                yield document.service, document.doc_type, version_date, path
+
+    def relative_paths(self) -> list:
+        """
+        Path of every version relative to the dataset root, in iteration order
+        """
+        return self.derived(
+            "relative_paths",
+            lambda catalog: [
+                f"{document.service}/{document.doc_type}/{filename}"
+                for document in catalog.iter_documents()
+                for filename in document.filenames
+            ],
+        )
+
+    def count_versions(self) -> int:
+        """
+        Total number of versions in the dataset
+        """
+        return sum(len(document) for document in self.iter_documents())
+
+    def derived(self, name: str, factory):
+        """
+        Return a structure derived from this catalog, computing it with `factory(catalog)`
+        on first access. Derived structures live as long as the catalog.
+        """
+        if name not in self._derived:
+            with self._derived_locks.setdefault(name, RLock()):
+                if name not in self._derived:
+                    with metrics.timer("dataset_load_duration_seconds", structure=name):
+                        self._derived[name] = factory(self)
+        return self._derived[name]
+
+    def derived_if_ready(self, name: str):
+        """
+        Return a structure derived from this catalog if it was already computed,
+        None otherwise, without waiting for a computation in progress.
+        """
+        return self._derived.get(name)
+
+
+def _parse_version_date(filename: str):
+    """
+    Date of the version stored in `filename`, or None if it is not a version
+    """
+    if not filename.endswith(".md"):
+        return None
+    try:
+        return datetime.strptime(filename[: -len(".md")], DATASET_DATE_FORMAT)
+    except ValueError:
+        return None
+
+
+def _sorted_subdirectories(path: Path) -> list:
+    with os.scandir(path) as entries:
+        return sorted(
+            entry.name
+            for entry in entries
+            if entry.is_dir() and not entry.name.startswith(".")
+        )
+
+
+def dataset_fingerprint(root_path) -> tuple:
+    """
+    Summary of the files of the dataset at `root_path`, which changes when versions
+    are added or removed: the size and modification time of its pack file,
+    or the modification time and number of entries of each document directory.
+    Only directories are listed, no version file is read or parsed.
+    """
+    root_path = Path(root_path)
+    pack = pack_path(root_path)
+    if pack.exists():
+        stat = pack.stat()
+        return ((PACK_FILENAME, stat.st_size, stat.st_mtime_ns),)
+    fingerprint = list()
+    for service in _sorted_subdirectories(root_path):
+        for doc_type in _sorted_subdirectories(root_path / service):
+            directory = root_path / service / doc_type
+            fingerprint.append(
+                (
+                    service,
+                    doc_type,
+                    directory.stat().st_mtime_ns,
+                    len(os.listdir(directory)),
+                )
+            )
+    return tuple(fingerprint)
+
+
+def load_mapped_index(root_path):
+    """
+    Open the mapped index of the dataset at `root_path`.
+    Returns None if there is none, or if the dataset changed since it was written.
+    """
+    path = mapped_index_path(root_path)
+    if not path.exists():
+        return None
+    try:
+        mapped = MappedIndex(path)
+    except Exception as exception:  # pylint: disable=broad-except
+        logger.warning(f"Could not open mapped index {path}, ignoring it: {exception}")
+        return None
+    if mapped.fingerprint != dataset_fingerprint(root_path):
+        logger.warning(f"Mapped index {path} does not match the dataset, ignoring it")
+        return None
+    return mapped
+
+
+def read_release(root_path=None):
+    """
+    Return the release of the dataset installed at `root_path`, or None if unknown.
+    Staged releases record it in their directory, older installs in LAST_DATASET_PATH.
+    """
+    paths = [Path(LAST_DATASET_PATH)]
+    if root_path is not None:
+        paths.insert(0, Path(root_path, RELEASE_FILENAME))
+    for path in paths:
+        try:
+            return path.read_text().strip("\n")
+        except FileNotFoundError:
+            continue
+    return None
+
+
+_catalogs = dict()
+_catalogs_lock = Lock()
+_generations = count(1)
+
+
+def get_catalog(root_path) -> DatasetCatalog:
+    """
+    Return the catalog of the dataset at `root_path`.
+    The catalog is built on first use and rebuilt only when the installed release changes,
+    either in place or by switching `root_path` to another directory (symlink).
+    A catalog keeps reading from the directory it was built from, so requests
+    which started before a switch finish on the previous release.
+    """
+    key = Path(root_path).absolute()
+    real_path = Path(root_path).resolve()
+    release = read_release(real_path)
+    catalog = _catalogs.get(key)
+    if _is_current(catalog, real_path, release):
+        return catalog
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if not _is_current(catalog, real_path, release):
+            with metrics.timer("dataset_load_duration_seconds", structure="catalog"):
+                catalog = DatasetCatalog(real_path, release, next(_generations))
+            _catalogs[key] = catalog
+    return catalog
+
+
+def _is_current(catalog, real_path: Path, release: str) -> bool:
+    return (
+        catalog is not None
+        and catalog.root_path == real_path
+        and catalog.release == release
+    )
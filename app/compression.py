@@ -0,0 +1,38 @@
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.middleware.gzip import GZipResponder
+
+from config import GZIP_MINIMUM_SIZE
+
+
+class CompressionMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    ASGI middleware compressing the responses of the routes starting with `paths`
+    for clients accepting gzip. Other routes are left alone, in particular streamed
+    ones, whose lines would otherwise wait in the compressor until enough of them
+    are buffered.
+    Responses of these routes vary by Accept-Encoding, compressed or not, so that
+    caches do not serve a compressed response to a client which did not accept it.
+    """
+
+    def __init__(self, app, paths: tuple, minimum_size: int = GZIP_MINIMUM_SIZE):
+        self.app = app
+        self.paths = tuple(paths)
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_vary(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(raw=message.setdefault("headers", list()))
+                if "accept-encoding" not in headers.get("vary", "").lower():
+                    headers.add_vary_header("Accept-Encoding")
+            await send(message)
+
+        if "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+            responder = GZipResponder(self.app, self.minimum_size)
+            await responder(scope, receive, send_with_vary)
+        else:
+            await self.app(scope, receive, send_with_vary)
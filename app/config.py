@@ -1,11 +1,77 @@
 import os
+import tempfile
 
 CGUS_DATASET_PATH = "./dataset/"
 LAST_DATASET_PATH = "./latest_dataset.txt"
 DATASET_DATE_FORMAT = "%Y-%m-%dT%H-%M-%SZ"
 RATE_LIMIT = "10000/minute"
+INDEX_DIRNAME = ".index"
+# file naming the release of a dataset directory, written when it is installed
+RELEASE_FILENAME = ".release"
+# file present while a new dataset is being downloaded and installed
+UPDATE_LOCK_PATH = "./dataset.updating"
+# interval between checks for a newly installed dataset to load, in seconds
+DATASET_POLL_INTERVAL = int(os.getenv("DATASET_POLL_INTERVAL", "60"))
 
 BASE_PATH = os.getenv("BASE_PATH", "")
 
 # pylint: disable=line-too-long
 DOCTYPE_URL = "https://raw.githubusercontent.com/OpenTermsArchive/terms-types/main/termsTypes.json"
+# local copy of the document types, downloaded when the image is built and kept up to date
+DOCTYPES_SNAPSHOT_PATH = "./termsTypes.json"
+# age after which the document types are refreshed in the background, in seconds
+DOCTYPES_MAX_AGE = int(os.getenv("DOCTYPES_MAX_AGE", "3600"))
+
+# number of processes scanning the dataset for a query (1 scans in the calling process)
+SCAN_WORKERS = int(os.getenv("SCAN_WORKERS", "1"))
+# number of items sent to a scanning process at once: versions for /all_occurences,
+# whole documents (all their versions) for /first_occurence
+SCAN_CHUNK_SIZE = int(os.getenv("SCAN_CHUNK_SIZE", "256"))
+
+# number of query results kept in memory by each worker
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "256"))
+# memory taken by these results, measured by their serialized size, in bytes
+QUERY_CACHE_BYTES = int(os.getenv("QUERY_CACHE_BYTES", str(256 * 1024 * 1024)))
+# directory where query results are also stored, shared by workers (disabled if empty)
+QUERY_CACHE_DIR = os.getenv("QUERY_CACHE_DIR", "")
+
+# memory taken by the version texts kept by each worker, in bytes
+TEXT_CACHE_BYTES = int(os.getenv("TEXT_CACHE_BYTES", str(64 * 1024 * 1024)))
+# responses larger than this are compressed for clients accepting it, in bytes
+GZIP_MINIMUM_SIZE = 1000
+
+# number of threads running occurrence queries, shared by identical concurrent queries
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# number of finished jobs whose result can still be fetched from /jobs
+JOBS_KEPT = int(os.getenv("JOBS_KEPT", "256"))
+# longest time a /jobs request waits for the job to finish, in seconds
+JOB_MAX_WAIT = 30
+# number of threads for blocking file and network calls made by requests
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+# number of threads for the lighter computations of requests (versions, statistics)
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", "2"))
+# largest number of versions a /get_versions_at_dates request can ask for
+MAX_VERSION_LOOKUPS = 10000
+# characters returned around each match by /occurence_snippets, by default and at most
+SNIPPET_CONTEXT = 80
+MAX_SNIPPET_CONTEXT = 1000
+# matching versions returned by a /occurence_snippets page, by default and at most
+SNIPPETS_PAGE_SIZE = 100
+MAX_SNIPPETS_PAGE_SIZE = 1000
+# matches returned per version by /occurence_snippets, by default and at most
+SNIPPET_MATCHES = 20
+MAX_SNIPPET_MATCHES = 200
+# timeout of requests to GitHub, in seconds
+HTTP_TIMEOUT = 10
+# file holding every version of a dataset installed as a pack, instead of one file per version
+PACK_FILENAME = "versions.pack"
+
+# directory where each process writes its metrics, summed by /metrics (disabled if set
+# to an empty string: /metrics then only reports the worker answering the request)
+METRICS_DIR = os.getenv(
+    "METRICS_DIR", os.path.join(tempfile.gettempdir(), "ota-metrics")
+)
+# minimum interval between writes of the metrics of a process, in seconds
+METRICS_FLUSH_INTERVAL = 5
+# whether to record the scan time of every (service, document type) pair
+METRICS_PER_DOCUMENT = os.getenv("METRICS_PER_DOCUMENT", "1") == "1"
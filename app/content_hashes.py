@@ -0,0 +1,165 @@
+from array import array
+import hashlib
+import logging
+from pathlib import Path
+import pickle
+
+from catalog import DatasetCatalog
+from config import INDEX_DIRNAME
+
+CONTENT_HASHES_FILENAME = "contents.pickle"
+DIGEST_SIZE = 16
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def digest_bytes(content: bytes) -> bytes:
+    """
+    Digest identifying a version content
+    """
+    return hashlib.blake2b(content, digest_size=DIGEST_SIZE).digest()
+
+
+class ContentHashes:
+    """
+    Digest and size of every version of a dataset, by version id (catalog iteration order).
+    Versions sharing a digest have identical contents, so scans only need to read one of them.
+    """
+
+    def __init__(self, paths: list, digests: bytes, sizes: array):
+        # digests and sizes can also be views of a mapped index, paths then are None
+        self.paths = paths
+        self.digests = digests
+        self.sizes = sizes
+        self._groups = None
+
+    @classmethod
+    def build(cls, catalog: DatasetCatalog, previous=None):
+        """
+        Read and hash every version of the dataset.
+        With the content hashes of a previous release, the digests of the versions
+        it already had (same path, hence same date) are reused: only new versions are read.
+        """
+        previous_ids = dict()
+        if previous is not None:
+            previous_ids = {
+                path: version_id for version_id, path in enumerate(previous.paths)
+            }
+        relative_paths = catalog.relative_paths()
+        digests = bytearray()
+        sizes = array("Q")
+        for relative_path, (*_, path) in zip(relative_paths, catalog.iter_versions()):
+            previous_id = previous_ids.get(relative_path)
+            if previous_id is None:
+                content = path.read_bytes()
+                digests += digest_bytes(content)
+                sizes.append(len(content))
+            else:
+                digests += previous.digest(previous_id)
+                sizes.append(previous.sizes[previous_id])
+        return cls(relative_paths, bytes(digests), sizes)
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def digest(self, version_id: int) -> bytes:
+        """
+        Digest of a version
+        """
+        return bytes(
+            self.digests[version_id * DIGEST_SIZE : (version_id + 1) * DIGEST_SIZE]
+        )
+
+    def groups(self) -> dict:
+        """
+        Map each distinct digest to the ids of the versions sharing it, in id order
+        """
+        if self._groups is None:
+            groups = dict()
+            for version_id in range(len(self)):
+                groups.setdefault(self.digest(version_id), list()).append(version_id)
+            self._groups = groups
+        return self._groups
+
+    def stats(self) -> dict:
+        """
+        How much reading is saved by processing each distinct content once
+        """
+        total_bytes = sum(self.sizes)
+        distinct_bytes = sum(self.sizes[ids[0]] for ids in self.groups().values())
+        return {
+            "versions": len(self),
+            "distinct_contents": len(self.groups()),
+            "duplicate_versions": len(self) - len(self.groups()),
+            "total_bytes": total_bytes,
+            "distinct_bytes": distinct_bytes,
+            "saved_bytes": total_bytes - distinct_bytes,
+            "saved_ratio": (
+                (total_bytes - distinct_bytes) / total_bytes if total_bytes else 0
+            ),
+        }
+
+    def save(self, path: Path):
+        """
+        Persist the digests
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as file:
+            pickle.dump(
+                {"paths": self.paths, "digests": self.digests, "sizes": self.sizes},
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        temporary_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        """
+        Load persisted digests
+        """
+        with open(path, "rb") as file:
+            content = pickle.load(file)
+        return cls(content["paths"], content["digests"], content["sizes"])
+
+
+def content_hashes_path(root_path) -> Path:
+    """
+    Location of the content hashes of the dataset at `root_path`
+    """
+    return Path(root_path, INDEX_DIRNAME, CONTENT_HASHES_FILENAME)
+
+
+def load_content_hashes(catalog: DatasetCatalog) -> ContentHashes:
+    """
+    Load the persisted content hashes of a catalog,
+    or compute them if they are missing or were computed for another set of versions.
+    """
+    if catalog.mapped is not None:
+        return ContentHashes(
+            None, catalog.mapped.section("digests"), catalog.mapped.section("sizes")
+        )
+    path = content_hashes_path(catalog.root_path)
+    if path.exists():
+        hashes = ContentHashes.load(path)
+        if hashes.paths == catalog.relative_paths():
+            return hashes
+        logger.warning(f"Content hashes {path} do not match the dataset, ignoring them")
+    return ContentHashes.build(catalog)
+
+
+def get_content_hashes(catalog: DatasetCatalog) -> ContentHashes:
+    """
+    Content hashes of a catalog, loaded once per catalog
+    """
+    return catalog.derived("content_hashes", load_content_hashes)
+
+
+def get_ready_content_hashes(catalog: DatasetCatalog):
+    """
+    Content hashes of a catalog if they can be used right away: already loaded, or
+    read from its mapped index. None while they are being computed in the background.
+    """
+    if catalog.mapped is not None:
+        return get_content_hashes(catalog)
+    return catalog.derived_if_ready("content_hashes")
@@ -1,10 +1,22 @@
 from datetime import datetime
+import hashlib
+import io
+import json
 from pathlib import Path
 
-from config import CGUS_DATASET_PATH, DATASET_DATE_FORMAT
+from catalog import get_catalog
+from config import CGUS_DATASET_PATH
+from content_hashes import digest_bytes, get_ready_content_hashes
+from metrics import metrics
+from text_cache import text_cache
 
 
-class CGUsDataFinder:  # pylint: disable=too-few-public-methods
+def _decode(content: bytes) -> str:
+    # as a file opened in text mode would be
+    return io.TextIOWrapper(io.BytesIO(content)).read()
+
+
+class CGUsDataFinder:
     """
     Helper class to find a specific version in the dataset for a given service and doc_type
     """
@@ -13,32 +25,109 @@ class CGUsDataFinder:  # pylint: disable=too-few-public-methods
         self.service = service
         self.doc_type = doc_type
         self.path = Path(CGUS_DATASET_PATH, self.service, self.doc_type)
-        self.__validate_path(self.path)
-        self.versions = {
-            datetime.strptime(
-                file_path.name.rstrip(".md"), DATASET_DATE_FORMAT
-            ): file_path
-            for file_path in self.path.glob("*.md")
-        }
+        catalog = get_catalog(CGUS_DATASET_PATH)
+        self.document = catalog.get(self.service, self.doc_type)
+        self.__validate_path(self.path, self.document)
+        # None until the worker has computed them: versions are then read to hash them
+        self.content_hashes = get_ready_content_hashes(catalog)
 
     def get_version_at_date(self, date: datetime):
         """
         Given a date, return information about the closest recorded version
         """
-        versions_around_date = self._get_versions_around_date(date)
-        date_before = versions_around_date.get("version_at_date", False)
-        data = ""
-        if date_before:
-            data = self.versions[date_before].read_text()
+        return self.get_versions_at_dates([date])[0]
+
+    def get_versions_at_dates(self, dates: list):
+        """
+        Given a list of dates, return information about the closest recorded version
+        for each of them, in the same order.
+        Each distinct content is read only once.
+        """
+        texts = dict()
+        return [
+            self._describe(date, index, data=texts.get(digest, ""))
+            for date, index, digest in self._resolve(dates, texts)
+        ]
+
+    def find_versions_at_dates(self, dates: list, texts: dict = None):
+        """
+        Like get_versions_at_dates, but each version refers to its content by digest
+        ("content", None before the first version) instead of including it.
+        Contents not in `texts` (digest -> text) are read into it, if given.
+        """
+        return [
+            self._describe(date, index, content=digest.hex() if digest else None)
+            for date, index, digest in self._resolve(dates, texts)
+        ]
+
+    def _resolve(self, dates: list, texts: dict = None):
+        """
+        (date, number of versions recorded before it, digest of the version at date)
+        of each date, reading the contents missing from `texts` if given
+        """
+        resolved = list()
+        located = self._locate_dates(dates)
+        # without content hashes, digests of the versions read so far, by index
+        digests = dict()
+        for date in dates:
+            index = located[date]
+            digest = None
+            if index > 0 and self.content_hashes is None:
+                if index not in digests:
+                    content = self._read_bytes(index - 1)
+                    digests[index] = digest_bytes(content)
+                    if texts is not None and digests[index] not in texts:
+                        texts[digests[index]] = text_cache.get_or_read(
+                            digests[index], lambda content=content: _decode(content)
+                        )
+                digest = digests[index]
+            elif index > 0:
+                version_id = self.document.first_version_id + index - 1
+                digest = self.content_hashes.digest(version_id)
+                if texts is not None and digest not in texts:
+                    texts[digest] = text_cache.get_or_read(
+                        digest, lambda index=index - 1: self._read(index)
+                    )
+            resolved.append((date, index, digest))
+        return resolved
+
+    def _read(self, index: int) -> str:
+        version_id = self.document.first_version_id + index
+        metrics.inc("finder_versions_read_total")
+        metrics.inc("finder_bytes_read_total", self.content_hashes.sizes[version_id])
+        return self.document.path(index).read_text()
 
-        date_after = versions_around_date.get("next_version", False)
+    def _read_bytes(self, index: int) -> bytes:
+        content = self.document.path(index).read_bytes()
+        metrics.inc("finder_versions_read_total")
+        metrics.inc("finder_bytes_read_total", len(content))
+        return content
+
+    def version_etag(self, date: datetime) -> str:
+        """
+        ETag of what get_version_at_date returns for `date`, computed without reading
+        the version: it changes with the version content and the dates around it.
+        It is weak, since compressed and identity responses share it.
+        """
+        (version,) = self.find_versions_at_dates([date])
+        description = json.dumps(version, sort_keys=True).encode()
+        return f'W/"{hashlib.blake2b(description, digest_size=16).hexdigest()}"'
+
+    def _describe(self, date: datetime, index: int, **content):
+        """
+        Serialize the versions around `date`, given the number of versions recorded before it,
+        with `content` (its data, or a reference to it) between them
+        """
+        date_before = self.document.date(index - 1) if index > 0 else None
+        has_next = self.document is not None and index < len(self.document)
+        date_after = self.document.date(index) if has_next else None
 
         return {
             "service": self.service,
             "doc_type": self.doc_type,
             "date": date.isoformat(),
             "version_at_date": date_before.isoformat() if date_before else False,
-            "data": data,
+            **content,
             "next_version": date_after.isoformat() if date_after else False,
         }
 
@@ -46,41 +135,60 @@ class CGUsDataFinder:  # pylint: disable=too-few-public-methods
         """
         Given a date, returns the closest captured version before the date and after the date.
         """
-        closest_anterior_version = None
-        closest_posterior_version = None
-        all_versions = self._list_ordered_version_dates()
-        first_version = all_versions[0]
-
-        if date < first_version:
-            return {"version_at_date": None, "next_version": first_version}
-
-        for i, version_date in enumerate(all_versions):
-            if version_date < date:
-                closest_anterior_version = all_versions[i]
-                try:
-                    closest_posterior_version = all_versions[i + 1]
-                except IndexError:
-                    closest_posterior_version = None
+        index = self._locate_dates([date])[date]
+        has_next = self.document is not None and index < len(self.document)
         return {
-            "version_at_date": closest_anterior_version,
-            "next_version": closest_posterior_version,
+            "version_at_date": self.document.date(index - 1) if index > 0 else None,
+            "next_version": self.document.date(index) if has_next else None,
         }
 
-    def _list_ordered_version_dates(self):
-        ordered_version_dates = list(self.versions.keys())
-        ordered_version_dates.sort()
-        return ordered_version_dates
+    def _locate_dates(self, dates: list):
+        """
+        Map each date to the number of versions recorded strictly before it.
+        Dates are resolved in chronological order so each bisection starts
+        where the previous one stopped.
+        """
+        located = dict()
+        if self.document is None:
+            return {date: 0 for date in dates}
+        low = 0
+        for date in sorted(set(dates)):
+            low = self.document.locate(date, low)
+            located[date] = low
+        return located
 
     @staticmethod
-    def __validate_path(path: Path):
-        if (
-            not Path(CGUS_DATASET_PATH).resolve() in path.resolve().parents
-            or not path.exists()
+    def __validate_path(path: Path, document):
+        # documents of a packed dataset have no directory
+        if not Path(CGUS_DATASET_PATH).resolve() in path.resolve().parents or (
+            document is None and not path.exists()
         ):
             raise Exception(f"Filename {path} is not in the dataset directory")
         return True
 
 
+def find_versions(lookups: list, include_data: bool = True) -> dict:
+    """
+    Resolve (service, doc_type, date) lookups, in order, against the loaded dataset.
+    Versions refer to their content by digest, and with `include_data` each
+    distinct content is returned once in "contents" (digest -> text).
+    Raise an exception if a document is not in the dataset.
+    """
+    dates_by_document = dict()
+    for service, doc_type, date in lookups:
+        dates_by_document.setdefault((service, doc_type), list()).append(date)
+    texts = dict() if include_data else None
+    found = dict()
+    for (service, doc_type), dates in dates_by_document.items():
+        finder = CGUsDataFinder(service, doc_type)
+        for date, version in zip(dates, finder.find_versions_at_dates(dates, texts)):
+            found[service, doc_type, date] = version
+    result = {"versions": [found[lookup] for lookup in lookups]}
+    if include_data:
+        result["contents"] = {digest.hex(): text for digest, text in texts.items()}
+    return result
+
+
 class NoVersionAtDateException(Exception):
     """
     Used when a user asks for a date before we started tracking the service
@@ -1,9 +1,26 @@
 from abc import ABC, abstractmethod
-from collections import Counter, defaultdict
+from array import array
+from collections import defaultdict
 from datetime import datetime
 from pathlib import Path, PosixPath
 import re
-from config import DATASET_DATE_FORMAT
+import time
+
+from catalog import get_catalog
+from config import (
+    DATASET_DATE_FORMAT,
+    METRICS_PER_DOCUMENT,
+    SNIPPET_CONTEXT,
+    SNIPPET_MATCHES,
+    SNIPPETS_PAGE_SIZE,
+)
+from content_hashes import get_content_hashes
+from metrics import metrics
+from scan_engine import ScanEngine
+from packed_store import PackedVersion
+from scanner import TermMatcher, bytes_contains, compile_bytes_patterns
+from term_index import get_term_index
+
 
 class CGUsDataset:
     """
@@ -15,6 +32,13 @@ class CGUsDataset:
         assert self.root_path.exists(), f"{root_path} does not exist"
         assert self.root_path.is_dir(), f"{root_path} is not a directory"
 
+    @property
+    def catalog(self):
+        """
+        Catalog of the dataset, shared between requests
+        """
+        return get_catalog(self.root_path)
+
     def yield_all_md(self, ignore_rootdir: bool = True) -> list:
         """
         Yield a list of all recorded versions (.md files) in the dataset
@@ -22,29 +46,19 @@ class CGUsDataset:
             ignore_rootdir: used to ignore README.md when run against a repository
         """
         if ignore_rootdir:
-            return self.root_path.glob("**/*/*.md")
+            return (path for _, _, _, path in self.catalog.iter_versions())
         return self.root_path.glob("**/*.md")
 
     def list_all_services_doc_types(self, multiple_versions_only: bool = False) -> list:
         """
         Returns all services and document types in a dataset.
         """
-        all_service_doctypes = Counter(
-            # pylint: disable=line-too-long
-            [(f.parts[-3], f.parts[-2]) for f in self.root_path.glob("**/*.md") if not f.match('README.md')]
-        )
-
         threshold = 1 if multiple_versions_only else 0
 
-        all_filtered_service_doctypes = (
-            (key[0], key[1])
-            for key, count in all_service_doctypes.items()
-            if count > threshold
-        )
-
         dict_out = defaultdict(list)
-        for service, doc_type in all_filtered_service_doctypes:
-            dict_out[service].append(doc_type)
+        for document in self.catalog.iter_documents():
+            if len(document) > threshold:
+                dict_out[document.service].append(document.doc_type)
         return dict(dict_out)
 
     def get_stats(self):
@@ -52,28 +66,68 @@ class CGUsDataset:
         Extract basic info for every CGU in historical dataset
         """
         all_stats = dict()
-        for file_path in self.yield_all_md(ignore_rootdir=True):
-            cgu = CGU(file_path, is_historical=True)
-            all_stats[cgu.fullname] = cgu.to_dict()
+        for service, doc_type, version_date, _ in self.catalog.iter_versions():
+            all_stats[f"{service} - {doc_type} - {version_date}"] = {
+                "service": service,
+                "document_type": doc_type,
+                "date": version_date,
+            }
         return all_stats
 
 
 class CGUsParser(ABC):
     """
-    Abstract base class for parsing a CGU dataset
+    Abstract base class for parsing a CGU dataset.
+    Versions are scanned by a ScanEngine: each chunk of versions is turned into
+    a partial result by `_scan_chunk`, and partial results are merged by `_merge`.
+    Versions with identical contents (same digest) are only read once.
+    With `per_term`, parsers report which of the comma-separated terms each document
+    contains, finding all of them in a single read of each version.
+    Terms containing regex metacharacters, or all terms with `regex`, are searched as
+    regexes: every version is then decoded and searched line by line, without the term index.
+    `services`, `doc_types`, `start` and `end` restrict the query to some documents and
+    to the versions recorded between two dates: other versions are never read.
     """
 
-    def __init__(self, path: PosixPath):
+    # whether results depend on the order of the comma-separated terms
+    ordered_terms = False
+
+    def __init__(
+        self,
+        path: PosixPath,
+        workers: int = None,
+        chunk_size: int = None,
+        services: list = None,
+        doc_types: list = None,
+        start: datetime = None,
+        end: datetime = None,
+    ):
         self.path = path
         self.dataset = CGUsDataset(self.path)
+        self.engine = ScanEngine(workers, chunk_size)
+        self.services = None if services is None else set(services)
+        self.doc_types = None if doc_types is None else set(doc_types)
+        self.start = start
+        self.end = end
+        self.terms = None
+        self.term_list = None
         self.regex_term = None
+        self.bytes_terms = None
+        self.matcher = None
         self.output = None
 
-    @abstractmethod
     def run(self):
         """
         Run parser
         """
+        catalog = self.dataset.catalog
+        output = self._new_output(catalog)
+        items = self._items_to_scan(
+            catalog, self._candidates(catalog), get_content_hashes(catalog)
+        )
+        for partial in self.engine.map(self._scan_chunk, items):
+            self._merge(output, partial)
+        self.output = output
 
     @abstractmethod
     def to_dict(self):
@@ -81,6 +135,63 @@ class CGUsParser(ABC):
         Serialize parser in dict
         """
 
+    @abstractmethod
+    def _new_output(self, catalog):
+        """
+        Output of the parser when no version contains the terms
+        """
+
+    def _items_to_scan(self, catalog, candidates, content_hashes) -> list:
+        """
+        Items sent to `_scan_chunk`: by default, one item per distinct content
+        among the versions which may contain the terms:
+        (path, [(service, document_type, version_date), ...]) where path is
+        the first version sharing that content.
+        """
+        items = dict()
+        for version_id, service, document_type, version_date, path in self._versions(
+            catalog
+        ):
+            if candidates is not None and version_id not in candidates:
+                continue
+            item = items.setdefault(content_hashes.digest(version_id), (path, list()))
+            item[1].append((service, document_type, version_date))
+        return list(items.values())
+
+    def _documents(self, catalog):
+        """
+        Yield (document, start, stop) for every document selected by the query,
+        where the versions between the indexes `start` and `stop` are in its date range
+        """
+        for document in catalog.iter_documents(self.services, self.doc_types):
+            start = document.locate(self.start) if self.start else 0
+            stop = document.locate(self.end, start) if self.end else len(document)
+            yield document, start, stop
+
+    def _versions(self, catalog):
+        """
+        Yield (version_id, service, document_type, version_date, path)
+        for every version selected by the query
+        """
+        for document, start, stop in self._documents(catalog):
+            for version_id, (version_date, path) in enumerate(
+                document.items(start, stop), document.first_version_id + start
+            ):
+                yield version_id, document.service, document.doc_type, version_date, path
+
+    @abstractmethod
+    def _scan_chunk(self, items: list):
+        """
+        Given a chunk of items to scan,
+        return a partial result keyed by (service, document_type)
+        """
+
+    @abstractmethod
+    def _merge(self, output: dict, partial: dict):
+        """
+        Merge the partial result of a chunk into the output
+        """
+
     @staticmethod
     def _parse_name(file_path):
         """
@@ -93,12 +204,90 @@ class CGUsParser(ABC):
         service, document_type = file_path.as_posix().split("/")[-3:-1]
         return service, document_type, version_date
 
+    def _set_terms(self, terms: str, per_term: bool = False, regex: bool = False):
+        """
+        Compile the comma-separated terms searched by the parser
+        """
+        self.terms = terms
+        self.term_list = list(dict.fromkeys(terms.split(",")))
+        self.regex_term = re.compile(rf"{self._to_regex(terms)}", re.IGNORECASE)
+        self.bytes_terms = None if regex else compile_bytes_patterns(terms)
+        if per_term:
+            self.matcher = TermMatcher(self.term_list, regex=self.bytes_terms is None)
+
+    def _candidates(self, catalog):
+        """
+        Ids of the versions of `catalog` which may contain the terms according to
+        its term index, or None if every version has to be scanned
+        """
+        index = get_term_index(catalog)
+        if index is None or self.bytes_terms is None:
+            return None
+        return index.candidates(self.terms)
+
+    def _content_contains(self, digest: bytes, file_path: Path, matches: dict):
+        """
+        Whether a version contains the terms, reading it only if no version
+        with the same digest has been read yet. `matches` maps read digests to their result.
+        """
+        if digest not in matches:
+            matches[digest] = self._file_contains(file_path)
+        return matches[digest]
+
     def _file_contains(self, file_path: Path):
-        with open(file_path, "r") as file:
+        """
+        Whether a file contains the terms, or with `per_term` the indexes of the terms
+        it contains. Plain-text terms are searched in the whole file as bytes;
+        regexes are searched line by line as text.
+        Versions stored in a pack file are read from the memory-mapped pack.
+        """
+        if self.bytes_terms is None:
+            contains, size = self._text_contains(file_path)
+        else:
+            # a single read: searching a memory map would need either a copy of it
+            # or case-insensitive patterns, which `re` searches several times slower
+            content = file_path.read_bytes()
+            contains = self._bytes_contains(content)
+            # bytes stored, compressed or not in a pack
+            is_packed = isinstance(file_path, PackedVersion)
+            size = file_path.size if is_packed else len(content)
+        parser = type(self).__name__
+        metrics.inc("scan_files_read_total", parser=parser)
+        metrics.inc("scan_bytes_read_total", size, parser=parser)
+        if contains:
+            metrics.inc("scan_files_matched_total", parser=parser)
+        return contains
+
+    def _bytes_contains(self, content: bytes):
+        if self.matcher is not None:
+            return self.matcher.find_bytes(content)
+        return bytes_contains(content, self.bytes_terms)
+
+    def _text_contains(self, file_path: Path):
+        """
+        Whether a file contains the terms, searched line by line,
+        and the number of bytes read until the first match
+        """
+        with file_path.open("r") as file:
+            if self.matcher is not None:
+                return self.matcher.find_lines(file), file.buffer.tell()
             for line in file:
                 if self.regex_term.search(line):
-                    return True
-        return False
+                    return True, file.buffer.tell()
+            return False, file.buffer.tell()
+
+    @staticmethod
+    def _record_document_time(service: str, document_type: str, start: float):
+        """
+        Count the time spent scanning a document since `start`
+        """
+        if METRICS_PER_DOCUMENT:
+            metrics.inc(
+                "scan_document_seconds_total",
+                time.perf_counter() - start,
+                service=service,
+                doc_type=document_type,
+            )
 
     @staticmethod
     def _to_regex(comma_separated_terms: str):
@@ -112,79 +301,354 @@ class CGUsParser(ABC):
 
 class CGUsFirstOccurenceParser(CGUsParser):
     """
-    Parser to find first occurence of a term in a dataset
+    Parser to find first occurence of a term in a dataset.
+    The versions of each document are read in chronological order until the first match.
+    With `assume_persistent`, the terms are assumed to stay in a document once they appear,
+    and the first match is found by binary search instead: this reads far fewer versions,
+    but can miss a term which appeared and was then removed.
+    With `per_term`, the first occurence of each term is returned.
     """
 
-    def __init__(self, path, terms):
-        super().__init__(path)
-        self.regex_term = re.compile(rf"{self._to_regex(terms)}", re.IGNORECASE)
+    def __init__(
+        self,
+        path,
+        terms,
+        assume_persistent: bool = False,
+        per_term: bool = False,
+        regex: bool = False,
+        **options,
+    ):
+        super().__init__(path, **options)
+        self.assume_persistent = assume_persistent
+        self._set_terms(terms, per_term, regex)
 
-    def run(self):
+    def to_dict(self):
+        return self.output
+
+    def _new_output(self, catalog):
+        output = dict()
+        for document, _, _ in self._documents(catalog):
+            output.setdefault(document.service, dict())[document.doc_type] = (
+                False
+                if self.matcher is None
+                else {term: False for term in self.term_list}
+            )
+        return output
+
+    def _items_to_scan(self, catalog, candidates, content_hashes) -> list:
         """
-        For each service provider, and for each document type,
-        return date of first occurence of a given term (or comma-separated terms), or `False`
+        One item per document: (service, document_type, [(version_date, path, digest), ...])
+        with the versions which may contain the terms, in chronological order
         """
-        self.output = dict()
-
-        for markdown in self.dataset.yield_all_md(ignore_rootdir=True):
-            service, document_type, version_date = self._parse_name(markdown)
+        documents = list()
+        for document, start, stop in self._documents(catalog):
+            versions = [
+                (version_date, path, content_hashes.digest(version_id))
+                for version_id, (version_date, path) in enumerate(
+                    document.items(start, stop), document.first_version_id + start
+                )
+                if candidates is None or version_id in candidates
+            ]
+            if versions:
+                documents.append((document.service, document.doc_type, versions))
+        return documents
+
+    def _scan_chunk(self, items: list):
+        first_occurences = dict()
+        matches = dict()
+        for service, document_type, versions in items:
+            start = time.perf_counter()
+            if self.matcher is not None:
+                version_date = self._first_match_per_term(versions, matches)
+            elif self.assume_persistent:
+                version_date = self._bisect_first_match(versions, matches)
+            else:
+                version_date = self._first_match(versions, matches)
+            self._record_document_time(service, document_type, start)
+            if version_date:
+                first_occurences[(service, document_type)] = version_date
+        return first_occurences
+
+    def _first_match(self, versions: list, matches: dict):
+        for version_date, markdown, digest in versions:
+            if self._content_contains(digest, markdown, matches):
+                return version_date
+        return None
+
+    def _first_match_per_term(self, versions: list, matches: dict):
+        """
+        Date of the first version containing each term found in the document
+        """
+        first_dates = dict()
+        if self.assume_persistent:
+            for index, term in enumerate(self.term_list):
+                version_date = self._bisect_first_match(
+                    versions, matches, lambda found, index=index: index in found
+                )
+                if version_date:
+                    first_dates[term] = version_date
+            return first_dates
+        for version_date, markdown, digest in versions:
+            for index in self._content_contains(digest, markdown, matches):
+                first_dates.setdefault(self.term_list[index], version_date)
+            if len(first_dates) == len(self.term_list):
+                break
+        return first_dates
+
+    def _bisect_first_match(self, versions: list, matches: dict, matched=bool):
+        low, high = 0, len(versions)
+        while low < high:
+            middle = (low + high) // 2
+            _, markdown, digest = versions[middle]
+            if matched(self._content_contains(digest, markdown, matches)):
+                high = middle
+            else:
+                low = middle + 1
+        return versions[low][0] if low < len(versions) else None
+
+    def _merge(self, output: dict, partial: dict):
+        for (service, document_type), version_date in partial.items():
+            if self.matcher is not None:
+                first_dates = output[service][document_type]
+                for term, term_date in version_date.items():
+                    if not first_dates[term] or term_date < first_dates[term]:
+                        first_dates[term] = term_date
+                continue
+            first_occurence = output[service][document_type]
+            if not first_occurence or version_date < first_occurence:
+                output[service][document_type] = version_date
 
-            # TODO: clean and optimize this
-            if service not in self.output.keys():
-                self.output[service] = {document_type: False}
 
-            if document_type not in self.output[service].keys():
-                self.output[service] = {
-                    **self.output[service],
-                    **{document_type: False},
-                }
+class CGUsAllOccurencesParser(CGUsParser):
+    """
+    Parser to find all occurences of a term in a dataset.
+    With `per_term`, the terms contained by each version are returned.
+    """
 
-            if self._file_contains(markdown):
-                if not self.output[service][document_type]:
-                    self.output[service][document_type] = version_date
-                elif version_date < self.output[service][document_type]:
-                    self.output[service][document_type] = version_date
+    def __init__(
+        self,
+        path,
+        terms,
+        per_term: bool = False,
+        regex: bool = False,
+        **options,
+    ):
+        super().__init__(path, **options)
+        self._set_terms(terms, per_term, regex)
 
     def to_dict(self):
         return self.output
 
+    def _new_output(self, catalog):
+        output = dict()
+        nothing = self._occurence(frozenset())
+        for document, start, stop in self._documents(catalog):
+            output.setdefault(document.service, dict())[document.doc_type] = {
+                document.date(index): nothing for index in range(start, stop)
+            }
+        return output
 
-class CGUsAllOccurencesParser(CGUsParser):
+    def _occurence(self, contains):
+        """
+        Result of a version: whether it contains the terms,
+        or with `per_term` the list of terms it contains
+        """
+        if self.matcher is None:
+            return bool(contains)
+        return [self.term_list[index] for index in sorted(contains)]
+
+    def _scan_chunk(self, items: list):
+        occurences = dict()
+        for markdown, versions in items:
+            start = time.perf_counter()
+            contains = self._occurence(self._file_contains(markdown))
+            self._record_document_time(*versions[0][:2], start)
+            for service, document_type, version_date in versions:
+                document_occurences = occurences.setdefault(
+                    (service, document_type), dict()
+                )
+                document_occurences[version_date] = contains
+        return occurences
+
+    def _merge(self, output: dict, partial: dict):
+        for (service, document_type), occurences in partial.items():
+            output[service][document_type].update(occurences)
+
+    def iter_records(self):
+        """
+        Yield (service, document_type, version_date, contains) for every version,
+        as soon as it is scanned, without building the whole output.
+        Versions are yielded in scan order rather than in chronological order.
+        """
+        catalog = self.dataset.catalog
+        candidates = self._candidates(catalog)
+        items = self._items_to_scan(catalog, candidates, get_content_hashes(catalog))
+        for partial in self.engine.map(self._scan_chunk, items):
+            for (service, document_type), occurences in partial.items():
+                for version_date, contains in occurences.items():
+                    yield service, document_type, version_date, contains
+        if candidates is None:
+            return
+        # versions ruled out by the term index were not scanned
+        for version_id, service, document_type, version_date, _ in self._versions(
+            catalog
+        ):
+            if version_id not in candidates:
+                yield service, document_type, version_date, self._occurence(frozenset())
+
+
+class CGUsTermPresenceParser(CGUsParser):
     """
-    Parser to find all occurences of a term in a dataset
+    Parser finding which versions of the dataset contain a term: its output is a bitmap
+    of version ids (bit `i % 8` of byte `i // 8` is set if version `i` contains the term),
+    the row of the term in a presence matrix of the dataset.
     """
 
-    def __init__(self, path, terms):
-        super().__init__(path)
-        self.regex_term = re.compile(rf"{self._to_regex(terms)}", re.IGNORECASE)
+    def __init__(self, path, terms, regex: bool = False, **options):
+        super().__init__(path, **options)
+        self._set_terms(terms, regex=regex)
 
-    def run(self):
+    def to_dict(self):
+        return bytes(self.output)
+
+    def _new_output(self, catalog):
+        return bytearray((catalog.count_versions() + 7) // 8)
+
+    def _items_to_scan(self, catalog, candidates, content_hashes) -> list:
         """
-        For each service provider, and for each document type,
-        return date of first occurence of a given term (or comma-separated terms), or `False`
+        One item per distinct content among the candidate versions:
+        (path, ids of the versions sharing that content)
         """
-        self.output = dict()
+        items = dict()
+        for version_id, *_, path in self._versions(catalog):
+            if candidates is not None and version_id not in candidates:
+                continue
+            item = items.setdefault(
+                content_hashes.digest(version_id), (path, array("I"))
+            )
+            item[1].append(version_id)
+        return list(items.values())
 
-        for markdown in self.dataset.yield_all_md(ignore_rootdir=True):
-            service, document_type, version_date = self._parse_name(markdown)
+    def _scan_chunk(self, items: list):
+        found = array("I")
+        for path, version_ids in items:
+            if self._file_contains(path):
+                found.extend(version_ids)
+        return found
 
-            # TODO: clean and optimize this
-            if service not in self.output.keys():
-                self.output[service] = {document_type: {version_date: False}}
+    def _merge(self, output: bytearray, partial: array):
+        for version_id in partial:
+            output[version_id >> 3] |= 1 << (version_id & 7)
 
-            if document_type not in self.output[service].keys():
-                self.output[service] = {
-                    **self.output[service],
-                    **{document_type: {version_date: False}},
-                }
 
-            self.output[service][document_type][version_date] = self._file_contains(
-                markdown
-            )
+class CGUsSnippetsParser(CGUsParser):
+    """
+    Parser finding where the terms occur in each version: the character offsets
+    of the matches in the version text (as returned by /get_version_at_date),
+    each with `context` characters around it.
+    Versions are scanned in id order from the version id `cursor`, and the scan stops
+    once `limit` versions matched: the output gives the id to continue from.
+    At most `max_matches` matches are returned per version, so the memory taken
+    by a page is bounded however common the terms are.
+    Each candidate content is read once per page, whatever the number of versions sharing it.
+    Terms are searched as one alternation, so where terms overlap the first one matches.
+    """
+
+    ordered_terms = True
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        path,
+        terms,
+        regex: bool = False,
+        context: int = SNIPPET_CONTEXT,
+        max_matches: int = SNIPPET_MATCHES,
+        limit: int = SNIPPETS_PAGE_SIZE,
+        cursor: int = 0,
+        **options,
+    ):
+        super().__init__(path, **options)
+        self._set_terms(terms, regex=regex)
+        self.context = context
+        self.max_matches = max_matches
+        self.limit = limit
+        self.cursor = cursor
+
+    def run(self):
+        catalog = self.dataset.catalog
+        candidates = self._candidates(catalog)
+        content_hashes = get_content_hashes(catalog)
+        output = self._new_output(catalog)
+        matches = dict()
+        for version_id, document, index in self._versions_from_cursor(catalog):
+            if candidates is not None and version_id not in candidates:
+                continue
+            if len(output["versions"]) == self.limit:
+                output["next_cursor"] = version_id
+                break
+            digest = content_hashes.digest(version_id)
+            if digest not in matches:
+                (matches[digest],) = self._scan_chunk([document.path(index)])
+            if matches[digest]["n_matches"]:
+                self._merge(
+                    output,
+                    {
+                        "service": document.service,
+                        "doc_type": document.doc_type,
+                        "date": document.date(index).isoformat(),
+                        **matches[digest],
+                    },
+                )
+        self.output = output
 
     def to_dict(self):
         return self.output
 
+    def _new_output(self, catalog):
+        return {"versions": list(), "next_cursor": None}
+
+    def _versions_from_cursor(self, catalog):
+        """
+        Yield (version_id, document, index) for the versions selected by the query,
+        from the version id `cursor`
+        """
+        for document, start, stop in self._documents(catalog):
+            start = max(start, self.cursor - document.first_version_id)
+            for index in range(start, stop):
+                yield document.first_version_id + index, document, index
+
+    def _scan_chunk(self, items: list):
+        """
+        Matches of the terms in each of the given versions
+        """
+        return [self._find_matches(path) for path in items]
+
+    def _merge(self, output: dict, partial: dict):
+        output["versions"].append(partial)
+
+    def _find_matches(self, path) -> dict:
+        text = path.read_text()
+        parser = type(self).__name__
+        metrics.inc("scan_files_read_total", parser=parser)
+        found = list()
+        count = 0
+        for count, match in enumerate(self.regex_term.finditer(text), 1):
+            if count > self.max_matches:
+                continue
+            start = max(match.start() - self.context, 0)
+            found.append(
+                {
+                    "offset": match.start(),
+                    "length": match.end() - match.start(),
+                    "snippet_offset": start,
+                    "snippet": text[start : match.end() + self.context],
+                }
+            )
+        if count:
+            metrics.inc("scan_files_matched_total", parser=parser)
+        return {"n_matches": count, "matches": found}
+
 
 class CGU:  # pylint: disable=too-few-public-methods
     """
@@ -0,0 +1,127 @@
+import json
+import logging
+from pathlib import Path
+import sys
+from threading import Lock
+import time
+
+import requests
+
+from config import DOCTYPE_URL, DOCTYPES_MAX_AGE, DOCTYPES_SNAPSHOT_PATH, HTTP_TIMEOUT
+from executors import io_executor
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class RemoteDocumentCache:
+    """
+    Local copy of a remote JSON document, served from memory.
+    Starts from a snapshot file (bundled with the app), and once the copy is older
+    than `max_age` seconds, keeps serving it while a conditional request
+    (ETag / If-Modified-Since) refreshes it in the background.
+    Refreshed copies are written back to the snapshot, so they survive restarts.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        snapshot_path,
+        max_age: float = DOCTYPES_MAX_AGE,
+        timeout: float = HTTP_TIMEOUT,
+    ):
+        self.url = url
+        self.snapshot_path = Path(snapshot_path)
+        self.max_age = max_age
+        self.timeout = timeout
+        self.document = None
+        self.etag = None
+        self.last_modified = None
+        # wall-clock time of the last successful request, or failed attempt
+        self.checked_at = 0
+        self.refresh_future = None
+        self.lock = Lock()
+        self._read_snapshot()
+
+    def _read_snapshot(self):
+        try:
+            snapshot = json.loads(self.snapshot_path.read_text())
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as exception:
+            logger.warning(f"Could not read {self.snapshot_path}: {exception}")
+            return
+        self.document = snapshot["document"]
+        self.etag = snapshot.get("etag")
+        self.last_modified = snapshot.get("last_modified")
+        self.checked_at = snapshot.get("checked_at", 0)
+
+    def _write_snapshot(self):
+        snapshot = {
+            "url": self.url,
+            "etag": self.etag,
+            "last_modified": self.last_modified,
+            "checked_at": self.checked_at,
+            "document": self.document,
+        }
+        try:
+            temporary_path = self.snapshot_path.with_suffix(".tmp")
+            temporary_path.write_text(json.dumps(snapshot))
+            temporary_path.replace(self.snapshot_path)
+        except OSError as exception:
+            logger.warning(f"Could not write {self.snapshot_path}: {exception}")
+
+    def is_stale(self) -> bool:
+        """
+        Whether the copy is older than `max_age`
+        """
+        return time.time() - self.checked_at > self.max_age
+
+    def refresh(self):
+        """
+        Download the document if it changed since the last request.
+        Raise requests.RequestException if it cannot be downloaded.
+        """
+        headers = dict()
+        if self.document is not None:
+            if self.etag:
+                headers["If-None-Match"] = self.etag
+            if self.last_modified:
+                headers["If-Modified-Since"] = self.last_modified
+        response = requests.get(self.url, headers=headers, timeout=self.timeout)
+        if response.status_code != 304:
+            response.raise_for_status()
+            self.document = response.json()
+            self.etag = response.headers.get("ETag")
+            self.last_modified = response.headers.get("Last-Modified")
+        self.checked_at = time.time()
+        self._write_snapshot()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except (requests.RequestException, ValueError) as exception:
+            # serve the current copy, and try again once it is stale again
+            self.checked_at = time.time()
+            logger.warning(f"Could not refresh {self.url}: {exception}")
+
+    def get(self):
+        """
+        Return the document, downloading it if there is no copy yet (which may
+        raise requests.RequestException), and refreshing a stale copy in the background
+        """
+        if self.document is None:
+            self.refresh()
+        elif self.is_stale():
+            with self.lock:
+                if self.refresh_future is None or self.refresh_future.done():
+                    self.refresh_future = io_executor.submit(
+                        self._refresh_in_background
+                    )
+        return self.document
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    path = sys.argv[1] if len(sys.argv) > 1 else DOCTYPES_SNAPSHOT_PATH
+    RemoteDocumentCache(DOCTYPE_URL, path).refresh()
+    logger.info(f"Saved {DOCTYPE_URL} into {path}")
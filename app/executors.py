@@ -0,0 +1,26 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from config import CPU_WORKERS, IO_WORKERS
+
+# blocking file and network calls
+io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS, thread_name_prefix="io")
+# computations over the dataset catalog and version contents
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+
+
+async def run_io(function, *args, **kwargs):
+    """
+    Run a blocking I/O call without blocking the event loop
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(io_executor, partial(function, *args, **kwargs))
+
+
+async def run_cpu(function, *args, **kwargs):
+    """
+    Run a computation without blocking the event loop
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor, partial(function, *args, **kwargs))
@@ -0,0 +1,98 @@
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import time
+from threading import Lock
+import uuid
+
+from config import JOBS_KEPT, JOB_WORKERS
+
+
+class Job:
+    """
+    A computation run in the background, which clients can wait for or poll
+    """
+
+    def __init__(self, key, future):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.future = future
+        self.created = time.time()
+
+    @property
+    def status(self) -> str:
+        """
+        One of "pending", "running", "done" or "failed"
+        """
+        if not self.future.done():
+            return "running" if self.future.running() else "pending"
+        return "failed" if self.future.exception() else "done"
+
+    def to_dict(self, with_result: bool = True) -> dict:
+        """
+        Serialize the job, with its result or error once it is finished
+        """
+        output = {"job_id": self.id, "status": self.status}
+        if with_result and self.status == "done":
+            output["result"] = self.future.result()
+        elif self.status == "failed":
+            output["error"] = str(self.future.exception())
+        return output
+
+
+class JobManager:
+    """
+    Runs expensive computations in a bounded thread pool.
+    Identical computations (same key) submitted while one is in flight share its job,
+    so concurrent callers wait on a single computation.
+    Finished jobs are kept so that their result can be polled.
+    """
+
+    def __init__(self, max_workers: int = JOB_WORKERS, max_kept: int = JOBS_KEPT):
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="job"
+        )
+        self.max_kept = max_kept
+        self.in_flight = dict()
+        self.jobs = OrderedDict()
+        self.lock = Lock()
+
+    def submit(self, key, compute) -> Job:
+        """
+        Run `compute()` in the background, unless a job with the same key is in flight
+        """
+        with self.lock:
+            job = self.in_flight.get(key)
+            if job is not None:
+                return job
+            job = Job(key, self.executor.submit(compute))
+            self.in_flight[key] = job
+            self.jobs[job.id] = job
+            while len(self.jobs) > self.max_kept:
+                oldest_id, oldest = next(iter(self.jobs.items()))
+                if not oldest.future.done():
+                    break
+                del self.jobs[oldest_id]
+        job.future.add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def get(self, job_id: str):
+        """
+        Return a job by id, or None if it is unknown or was forgotten
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    @staticmethod
+    async def wait(job: Job, timeout: float = None):
+        """
+        Wait for a job without blocking the event loop, and return its result
+        """
+        return await asyncio.wait_for(
+            asyncio.shield(asyncio.wrap_future(job.future)), timeout
+        )
+
+    def _finish(self, job: Job):
+        with self.lock:
+            if self.in_flight.get(job.key) is job:
+                del self.in_flight[job.key]
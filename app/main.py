@@ -1,32 +1,71 @@
 # pylint: disable=unused-argument
+import asyncio
+from datetime import datetime
+import hashlib
+from itertools import islice
+import json
 import logging
 from pathlib import Path
 import os
+import re
 import subprocess
+from typing import List
 
-import pandas as pd
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import Depends, FastAPI, Request, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import PlainTextResponse, RedirectResponse, StreamingResponse
 import requests
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
+from pydantic import BaseModel
 
 from config import (
     CGUS_DATASET_PATH,
     RATE_LIMIT,
     BASE_PATH,
-    LAST_DATASET_PATH,
+    UPDATE_LOCK_PATH,
+    DATASET_POLL_INTERVAL,
     DOCTYPE_URL,
+    DOCTYPES_SNAPSHOT_PATH,
+    GZIP_MINIMUM_SIZE,
+    JOB_MAX_WAIT,
+    MAX_SNIPPET_CONTEXT,
+    MAX_SNIPPET_MATCHES,
+    MAX_SNIPPETS_PAGE_SIZE,
+    MAX_VERSION_LOOKUPS,
+    HTTP_TIMEOUT,
+    METRICS_FLUSH_INTERVAL,
+    SNIPPET_CONTEXT,
+    SNIPPET_MATCHES,
+    SNIPPETS_PAGE_SIZE,
 )
-from data_finder import CGUsDataFinder
+from catalog import get_catalog, read_release
+from compression import CompressionMiddleware
+from content_hashes import get_content_hashes
+from stats import PERIOD_FIELDS, get_service_stats, get_version_grid
+from term_index import get_term_index
+from data_finder import CGUsDataFinder, find_versions
+from document_cache import RemoteDocumentCache
+from executors import run_cpu, run_io
 from dataset_parser import (
     CGUsFirstOccurenceParser,
     CGUsAllOccurencesParser,
     CGUsDataset,
+    CGUsParser,
+    CGUsSnippetsParser,
+    CGUsTermPresenceParser,
+)
+from jobs import Job, JobManager
+from metrics import MetricsMiddleware, metrics
+from query_cache import QueryCache, query_key
+from text_cache import text_cache
+from utils import (
+    date_range,
+    etag_matches,
+    parse_user_date,
+    parse_date_from_dataset_url,
 )
-from utils import parse_user_date, parse_date_from_dataset_url
 
 limiter = Limiter(key_func=get_remote_address)
 app = FastAPI(openapi_url=f"{BASE_PATH}/openapi.json", docs_url=f"{BASE_PATH}/docs")
@@ -42,25 +81,201 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
+# version texts and lists, but not the scans, whose NDJSON format is streamed
+app.add_middleware(
+    CompressionMiddleware,
+    paths=tuple(
+        f"{BASE_PATH}/{route}/"
+        for route in (
+            "get_version_at_date",
+            "get_versions_at_dates",
+            "get_version_timeline",
+            "list_services",
+            "list_documentTypes",
+        )
+    ),
+    minimum_size=GZIP_MINIMUM_SIZE,
+)
 
 logger = logging.getLogger("uvicorn.error")
+query_cache = QueryCache()
+jobs = JobManager()
+document_types = RemoteDocumentCache(DOCTYPE_URL, DOCTYPES_SNAPSHOT_PATH)
 
 
 def read_dataset():
     """
     Get the current dataset version stored in a file
     """
-    dataset_file = Path(LAST_DATASET_PATH)
-    return dataset_file.read_text().strip("\n")
+    return read_release(CGUS_DATASET_PATH)
+
+
+def warm_up_dataset():
+    """
+    Load the catalog and indexes of the installed dataset, so that a newly
+    installed release is ready before requests need it. Return the catalog.
+    """
+    catalog = get_catalog(CGUS_DATASET_PATH)
+    get_content_hashes(catalog)
+    get_term_index(catalog)
+    get_service_stats(catalog)
+    return catalog
+
+
+async def flush_metrics():
+    """
+    Regularly write the metrics of the worker, for /metrics answered by other workers
+    """
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+        await run_io(metrics.flush)
+
+
+async def watch_dataset():
+    """
+    Warm up every new dataset release as soon as it is installed
+    """
+    generation = None
+    while True:
+        try:
+            catalog = await run_cpu(warm_up_dataset)
+            if catalog.generation != generation:
+                generation = catalog.generation
+                logger.info(
+                    f"Serving dataset {catalog.release} (generation {generation}) : "
+                    f"{catalog.count_versions()} versions"
+                )
+                stats = await run_cpu(get_content_hashes(catalog).stats)
+                logger.info(f"Dataset contents : {stats['distinct_contents']} distinct")
+        except Exception as exception:  # pylint: disable=broad-except
+            logger.error(f"Could not load the dataset: {exception}")
+        await asyncio.sleep(DATASET_POLL_INTERVAL)
+
+
+def ndjson_batch(records, size: int = 1000) -> str:
+    """
+    Serialize the next `size` (service, document_type, version_date, contains) records
+    as newline-delimited JSON. Return an empty string when records are exhausted.
+    """
+    return "".join(
+        json.dumps(
+            {
+                "service": service,
+                "doc_type": document_type,
+                "date": version_date.isoformat(),
+                "matched": contains,
+            }
+        )
+        + "\n"
+        for service, document_type, version_date, contains in islice(records, size)
+    )
+
+
+async def stream_records(records):
+    """
+    Stream records as newline-delimited JSON, scanning in the job threads
+    """
+    loop = asyncio.get_running_loop()
+    records = iter(records)
+    while True:
+        batch = await loop.run_in_executor(jobs.executor, ndjson_batch, records)
+        if not batch:
+            return
+        yield batch
+
+
+def fetch_json(url: str):
+    """
+    Download a JSON document, failing after HTTP_TIMEOUT seconds
+    """
+    response = requests.get(url, timeout=HTTP_TIMEOUT)
+    response.raise_for_status()
+    return response.json()
+
+
+async def submit_query(endpoint: str, parser: CGUsParser, **options) -> Job:
+    """
+    Run a parser in the background, or return its cached result for the current
+    dataset version. Identical queries running at the same time share one job.
+    """
+    version = await run_io(read_dataset)
+    key = query_key(endpoint, parser, **options)
+
+    def compute():
+        with metrics.timer("query_scan_duration_seconds", endpoint=endpoint):
+            parser.run()
+        return parser.to_dict()
+
+    return jobs.submit(
+        (version, key), lambda: query_cache.get_or_compute(version, key, compute)
+    )
+
+
+PARSERS = {
+    "first_occurence": CGUsFirstOccurenceParser,
+    "all_occurences": CGUsAllOccurencesParser,
+    "term_frequency": CGUsTermPresenceParser,
+    "occurence_snippets": CGUsSnippetsParser,
+}
+
+
+def make_parser(endpoint: str, term: str, **options):
+    """
+    Parser answering an occurrence endpoint, raising a 400 error on invalid regexes
+    """
+    try:
+        return PARSERS[endpoint](Path(CGUS_DATASET_PATH), term, **options)
+    except re.error as exception:
+        raise HTTPException(400, f"Invalid regex : {exception}") from exception
+
+
+def scan_filters(
+    services: str = None, doc_types: str = None, start: str = None, end: str = None
+) -> dict:
+    """
+    Parser options restricting an occurrence query to some services and document types
+    (separated by a comma), and to the versions recorded between two dates (YYYY-MM-DD)
+    """
+    try:
+        start_date = (
+            parse_user_date(start).replace(hour=0, minute=0, second=0, microsecond=0)
+            if start
+            else None
+        )
+        end_date = parse_user_date(end) if end else None
+    except ValueError as exception:
+        raise HTTPException(
+            400,
+            f"Issue parsing date : {str(exception)}. Expected format is YYYY-MM-DD.",
+        ) from exception
+    return dict(
+        services=tuple(sorted(services.split(","))) if services else None,
+        doc_types=tuple(sorted(doc_types.split(","))) if doc_types else None,
+        start=start_date,
+        end=end_date,
+    )
+
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """
+    Write the last metrics of the worker
+    """
+    metrics.flush()
 
 
 @app.on_event("startup")
 async def startup_event():
     """
-    Log current commit on startup.
+    Log current commit on startup, and load the dataset and watch for new releases
+    in the background: the worker answers requests while content hashes are computed,
+    reading the versions it serves instead.
     """
     logger.info(f"Built using commit {os.getenv('COMMIT_SHA', 'unknown')}")
     logger.info(f"Dataset version : {read_dataset()}")
+    asyncio.ensure_future(watch_dataset())
+    asyncio.ensure_future(flush_metrics())
 
 
 @app.get(f"{BASE_PATH}/")
@@ -79,13 +294,17 @@ async def check_for_dataset(request: Request):
     Checks if a new dataset is available,
     and downloads it
     """
-    req = requests.get(
-        "https://api.github.com/repos/OpenTermsArchive/contrib-versions/releases/latest"
-    )
-    newest_dataset = req.json()["assets"][0]["browser_download_url"]
-    current_dataset = read_dataset()
-
-    if current_dataset == "updating":
+    try:
+        release = await run_io(
+            fetch_json,
+            "https://api.github.com/repos/OpenTermsArchive/contrib-versions/releases/latest",
+        )
+    except requests.RequestException as exception:
+        raise HTTPException(502, f"Could not reach GitHub: {exception}") from exception
+    newest_dataset = release["assets"][0]["browser_download_url"]
+    current_dataset = await run_io(read_dataset)
+
+    if await run_io(Path(UPDATE_LOCK_PATH).exists):
         return {
             "status": "a new dataset is being downloaded. please wait a few minutes.",
             "most_recent_dataset": f"{newest_dataset}",
@@ -114,38 +333,225 @@ async def version(request: Request):
      https://github.com/OpenTermsArchive/contrib-versions/releases
     Also return the commit SHA on which the API was built
     """
-    dataset_url = read_dataset()
+    dataset_url = await run_io(read_dataset)
+    catalog = await run_cpu(get_catalog, CGUS_DATASET_PATH)
     return {
         "dataset_url": dataset_url,
         "dataset_date": parse_date_from_dataset_url(dataset_url),
+        "dataset_generation": catalog.generation,
         "api_version": os.getenv("COMMIT_SHA", "unknown"),
     }
 
 
 @app.get(f"{BASE_PATH}/first_occurence/v1/{{term}}")
 @limiter.limit(RATE_LIMIT)
-async def first_occurence(request: Request, term: str):
+async def first_occurence(
+    request: Request,
+    term: str,
+    assume_persistent: bool = False,
+    per_term: bool = False,
+    regex: bool = False,
+    filters: dict = Depends(scan_filters),
+):
     """
     Returns the date of first occurence of a given term for every (Service - Document Type) pair.
     Search for multiple terms by separating them with a comma (e.g. "rgpd,trackers,cookies").
     Search is case-insensitive. `false` is returned if the term is not found.
+    assume_persistent: faster search assuming that a term is never removed from a document
+    once it appears. Terms which were added then removed may be reported as not found.
+    per_term: return the date of first occurence of each term, e.g.
+    {"Facebook": {"Terms of Service": {"rgpd": "2020-08-12T14:30:11", "cookies": false}}}
+    regex: search the terms as regular expressions. Much slower: every version is
+    read and searched line by line. Terms with regex metacharacters are always regexes.
+    services, doc_types: only search these services and document types, separated by a comma
+    start, end: only search the versions recorded between these dates (format YYYY-MM-DD)
     """
-    parser = CGUsFirstOccurenceParser(Path(CGUS_DATASET_PATH), term)
-    parser.run()
-    return parser.to_dict()
+    options = dict(
+        assume_persistent=assume_persistent, per_term=per_term, regex=regex, **filters
+    )
+    parser = make_parser("first_occurence", term, **options)
+    return await jobs.wait(await submit_query("first_occurence", parser, **options))
 
 
 @app.get(f"{BASE_PATH}/all_occurences/v1/{{term}}")
 @limiter.limit(RATE_LIMIT)
-async def all_occurence(request: Request, term: str):
+async def all_occurence(
+    request: Request,
+    term: str,
+    format: str = "json",
+    per_term: bool = False,
+    regex: bool = False,
+    filters: dict = Depends(scan_filters),
+):
     """
     Returns whether a version in the dataset contains a given term.
     Search for multiple terms by separating them with a comma (e.g. "rgpd,trackers,cookies").
     Search is case-insensitive.
+    format: "json" (default) returns one object once every version is scanned;
+    "ndjson" streams one line per version as soon as it is scanned:
+    {"service": ..., "doc_type": ..., "date": ..., "matched": true}
+    per_term: return the list of terms each version contains instead of true or false
+    regex: search the terms as regular expressions (see /first_occurence)
+    services, doc_types, start, end: only search some versions (see /first_occurence)
+    """
+    options = dict(per_term=per_term, regex=regex, **filters)
+    parser = make_parser("all_occurences", term, **options)
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_records(parser.iter_records()), media_type="application/x-ndjson"
+        )
+    if format != "json":
+        raise HTTPException(400, f"Unknown format {format}, expected json or ndjson.")
+    return await jobs.wait(await submit_query("all_occurences", parser, **options))
+
+
+def encode_cursor(version: str, version_id: int) -> str:
+    """
+    Opaque cursor resuming a paged query at `version_id` of the dataset `version`
+    """
+    return f"{version_id}.{hashlib.sha256(str(version).encode()).hexdigest()[:8]}"
+
+
+def decode_cursor(version: str, cursor: str) -> int:
+    """
+    Version id a cursor resumes at, raising a 400 error if it is invalid
+    or was returned for another dataset version
+    """
+    if cursor is None:
+        return 0
+    version_id, _, _ = cursor.partition(".")
+    if not version_id.isdigit() or encode_cursor(version, int(version_id)) != cursor:
+        raise HTTPException(
+            400, "Invalid or expired cursor: the dataset may have been updated."
+        )
+    return int(version_id)
+
+
+@app.get(f"{BASE_PATH}/occurence_snippets/v1/{{term}}")
+@limiter.limit(RATE_LIMIT)
+async def occurence_snippets(
+    request: Request,
+    term: str,
+    context: int = SNIPPET_CONTEXT,
+    max_matches: int = SNIPPET_MATCHES,
+    limit: int = SNIPPETS_PAGE_SIZE,
+    cursor: str = None,
+    regex: bool = False,
+    filters: dict = Depends(scan_filters),
+):
+    """
+    Returns where a term occurs in the versions containing it: the character offset
+    and length of each match in the version text (the "data" of /get_version_at_date),
+    with the text around it.
+    Search for multiple terms by separating them with a comma. Search is case-insensitive.
+    {
+        "versions": [{"service": "Facebook", "doc_type": "Terms of Service",
+                      "date": "2020-08-12T14:30:11", "n_matches": 2,
+                      "matches": [{"offset": 1520, "length": 4,
+                                   "snippet_offset": 1440, "snippet": "... rgpd ..."}, ...]}],
+        "next_cursor": "1234.9f2c0a1b"
+    }
+    Versions are returned by pages of `limit` (at most 1000) in the order of the dataset:
+    pass `next_cursor` as `cursor` to get the next page, until it is null.
+    context: number of characters returned before and after each match (at most 1000)
+    max_matches: number of matches returned per version (at most 200),
+    "n_matches" counts all of them
+    regex: search the terms as regular expressions (see /first_occurence)
+    services, doc_types, start, end: only search some versions (see /first_occurence)
+    """
+    for name, value, minimum, maximum in [
+        ("context", context, 0, MAX_SNIPPET_CONTEXT),
+        ("max_matches", max_matches, 0, MAX_SNIPPET_MATCHES),
+        ("limit", limit, 1, MAX_SNIPPETS_PAGE_SIZE),
+    ]:
+        if not minimum <= value <= maximum:
+            raise HTTPException(
+                400, f"{name} should be between {minimum} and {maximum}."
+            )
+    version = await run_io(read_dataset)
+    options = dict(
+        regex=regex,
+        context=context,
+        max_matches=max_matches,
+        limit=limit,
+        cursor=decode_cursor(version, cursor),
+        **filters,
+    )
+    parser = make_parser("occurence_snippets", term, **options)
+    page = await jobs.wait(await submit_query("occurence_snippets", parser, **options))
+    next_cursor = page["next_cursor"]
+    return {
+        **page,
+        "next_cursor": (
+            None if next_cursor is None else encode_cursor(version, next_cursor)
+        ),
+    }
+
+
+@app.post(f"{BASE_PATH}/jobs/v1/{{endpoint}}/{{term}}")
+@limiter.limit(RATE_LIMIT)
+async def submit_job(
+    request: Request,
+    endpoint: str,
+    term: str,
+    assume_persistent: bool = False,
+    per_term: bool = False,
+    regex: bool = False,
+    filters: dict = Depends(scan_filters),
+):
+    """
+    Starts a /first_occurence or /all_occurences query in the background
+    and returns its job id, to fetch the result from /jobs/v1/{job_id}.
+    Long queries keep running even if the client disconnects.
+    """
+    if endpoint not in ("first_occurence", "all_occurences"):
+        raise HTTPException(404, f"Unknown endpoint {endpoint}")
+    options = dict(per_term=per_term, regex=regex, **filters)
+    if endpoint == "first_occurence":
+        options["assume_persistent"] = assume_persistent
+    parser = make_parser(endpoint, term, **options)
+    job = await submit_query(endpoint, parser, **options)
+    return job.to_dict(with_result=False)
+
+
+@app.get(f"{BASE_PATH}/jobs/v1/{{job_id}}")
+@limiter.limit(RATE_LIMIT)
+async def get_job(request: Request, job_id: str, wait: float = 0):
+    """
+    Returns the status of a job, and its result once it is done.
+    wait: number of seconds to wait for the job to finish before answering (long polling)
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Unknown job {job_id}")
+    if wait > 0:
+        # failures are reported by the job status rather than raised
+        await asyncio.wait(
+            [asyncio.wrap_future(job.future)], timeout=min(wait, JOB_MAX_WAIT)
+        )
+    return job.to_dict()
+
+
+@app.get(f"{BASE_PATH}/cache_stats/v1/")
+@limiter.limit(RATE_LIMIT)
+async def cache_stats(request: Request):
+    """
+    Returns the hit and miss counts of the occurrence query cache of the worker,
+    and of its cache of version texts.
     """
-    parser = CGUsAllOccurencesParser(Path(CGUS_DATASET_PATH), term)
-    parser.run()
-    return parser.to_dict()
+    return {**query_cache.stats(), "text_cache": text_cache.stats()}
+
+
+@app.get(f"{BASE_PATH}/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint(request: Request):
+    """
+    Returns counters and histograms of the API in the Prometheus text format:
+    request latencies, versions and bytes read by scans, cache hits and misses,
+    dataset load and index build times. Summed over every worker when METRICS_DIR is set.
+    """
+    return PlainTextResponse(
+        await run_io(metrics.render), media_type="text/plain; version=0.0.4"
+    )
 
 
 @app.get(f"{BASE_PATH}/list_services/v1/")
@@ -156,15 +562,28 @@ async def list_services(request: Request, multiple_versions_only: bool = False):
     multiple_versions_only: filters out service-document pairs for which only 1 version is recorded
     """
     dataset = CGUsDataset(Path(CGUS_DATASET_PATH))
-    return dataset.list_all_services_doc_types(
-        multiple_versions_only=multiple_versions_only
+    return await run_cpu(
+        dataset.list_all_services_doc_types,
+        multiple_versions_only=multiple_versions_only,
+    )
+
+
+@app.get(f"{BASE_PATH}/dedup_stats/v1/")
+@limiter.limit(RATE_LIMIT)
+async def dedup_stats(request: Request):
+    """
+    Returns statistics about versions sharing identical contents,
+    which are only read once when scanning the dataset.
+    """
+    return await run_cpu(
+        lambda: get_content_hashes(get_catalog(CGUS_DATASET_PATH)).stats()
     )
 
 
 @app.get(f"{BASE_PATH}/get_version_at_date/v1/{{service}}/{{document_type}}/{{date}}")
 @limiter.limit(RATE_LIMIT)
 async def get_version_at_date(
-    request: Request, service: str, document_type: str, date: str
+    request: Request, response: Response, service: str, document_type: str, date: str
 ):
     """
     Returns a the version for a given service and a given document type as it was on a certain date.
@@ -183,9 +602,12 @@ async def get_version_at_date(
         "next_version": "2020-09-03T12:30:05"
     }
 
+    Responses have a weak ETag, the same whether they are compressed or not: requests
+    sending it back in If-None-Match get an empty 304 response while the version and
+    the dates around it do not change.
     """
     try:
-        finder = CGUsDataFinder(service, document_type)
+        finder = await run_cpu(CGUsDataFinder, service, document_type)
     except Exception as exception:
         raise HTTPException(400, str(exception)) from exception
     try:
@@ -195,45 +617,242 @@ async def get_version_at_date(
             400,
             f"Issue parsing date : {str(exception)}. Expected format is YYYY-MM-DD.",
         ) from exception
-    return finder.get_version_at_date(parsed_date)
+    etag = await run_cpu(finder.version_etag, parsed_date)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return await run_io(finder.get_version_at_date, parsed_date)
+
+
+class VersionLookup(BaseModel):
+    """
+    A document, and the date of its version to find.
+    Without a date, the versions between the start and end of the request.
+    """
+
+    service: str
+    document_type: str
+    date: str = None
+
+
+class VersionsQuery(BaseModel):
+    """
+    Body of /get_versions_at_dates requests
+    """
+
+    lookups: List[VersionLookup]
+    start: str = None
+    end: str = None
+    step: str = "month"
+    include_data: bool = True
+
+
+def today() -> str:
+    """
+    Current date, in the format of user dates
+    """
+    return datetime.utcnow().strftime("%Y-%m-%d")
+
+
+def parse_dates(*dates: str) -> list:
+    """
+    Parse user dates, raising a 400 error on invalid ones
+    """
+    try:
+        return [parse_user_date(date) for date in dates]
+    except ValueError as exception:
+        raise HTTPException(
+            400,
+            f"Issue parsing date : {str(exception)}. Expected format is YYYY-MM-DD.",
+        ) from exception
+
+
+async def answer_lookups(lookups: list, include_data: bool):
+    """
+    Find the versions of (service, doc_type, date) lookups, raising 400 errors
+    on too many lookups or unknown documents
+    """
+    if len(lookups) > MAX_VERSION_LOOKUPS:
+        raise HTTPException(
+            400, f"Too many versions requested, the maximum is {MAX_VERSION_LOOKUPS}."
+        )
+    try:
+        return await run_io(find_versions, lookups, include_data)
+    except Exception as exception:
+        raise HTTPException(400, str(exception)) from exception
+
+
+@app.post(f"{BASE_PATH}/get_versions_at_dates/v1/")
+@limiter.limit(RATE_LIMIT)
+async def get_versions_at_dates(request: Request, query: VersionsQuery):
+    """
+    Returns the versions of many documents at many dates at once.
+    Each lookup gives a service, a document type and a date; lookups without a date
+    ask for the versions of the document from `start` to `end` (default today),
+    every `step` ("day", "week" or "month").
+
+    Example :
+    {"lookups": [{"service": "Facebook", "document_type": "Terms of Service", "date": "2020-08-13"},
+                 {"service": "Google", "document_type": "Privacy Policy"}],
+     "start": "2020-01-01", "end": "2020-12-31", "step": "month"}
+
+    Versions are returned in the order of the lookups, like /get_version_at_date results
+    but with a "content" digest instead of "data". Each distinct content is returned
+    once in "contents", unless `include_data` is false:
+    {
+        "versions": [{"service": "Facebook", ..., "content": "9f2c...", "next_version": ...}, ...],
+        "contents": {"9f2c...": "Terms of Service. Welcome to Facebook! ..."}
+    }
+    """
+    range_dates = list()
+    if any(lookup.date is None for lookup in query.lookups):
+        if query.start is None:
+            raise HTTPException(400, "Lookups without a date need a start date.")
+        start, end = parse_dates(query.start, query.end or today())
+        try:
+            range_dates = date_range(
+                start, end, query.step, limit=MAX_VERSION_LOOKUPS + 1
+            )
+        except (ValueError, OverflowError) as exception:
+            raise HTTPException(400, str(exception)) from exception
+    lookups = list()
+    for lookup in query.lookups:
+        dates = parse_dates(lookup.date) if lookup.date else range_dates
+        lookups.extend((lookup.service, lookup.document_type, date) for date in dates)
+        if len(lookups) > MAX_VERSION_LOOKUPS:
+            # answer_lookups rejects the request, no need to list the other lookups
+            break
+    return await answer_lookups(lookups, query.include_data)
+
+
+@app.get(f"{BASE_PATH}/get_version_timeline/v1/{{service}}/{{document_type}}")
+@limiter.limit(RATE_LIMIT)
+async def get_version_timeline(
+    request: Request,
+    service: str,
+    document_type: str,
+    start: str,
+    end: str = None,
+    step: str = "month",
+    include_data: bool = True,
+):
+    """
+    Returns the versions of a document from `start` to `end` (default today),
+    every `step` ("day", "week" or "month"), in the format of /get_versions_at_dates.
+
+    Example :
+    /get_version_timeline/v1/Facebook/Terms of Service?start=2020-01-01&step=week
+    """
+    start_date, end_date = parse_dates(start, end or today())
+    try:
+        dates = date_range(start_date, end_date, step, limit=MAX_VERSION_LOOKUPS + 1)
+    except (ValueError, OverflowError) as exception:
+        raise HTTPException(400, str(exception)) from exception
+    return await answer_lookups(
+        [(service, document_type, date) for date in dates], include_data
+    )
 
 
 @app.get(f"{BASE_PATH}/graph_services/v1/")
 @limiter.limit(RATE_LIMIT)
-async def graph_services(request: Request):
+async def graph_services(
+    request: Request,
+    granularity: str = "month",
+    start: str = None,
+    end: str = None,
+    services: str = None,
+):
     """
-    Returns a JSON object with monthly statistics about tracked services.
+    Returns a JSON object with monthly statistics about tracked services:
+    for every month, the number of services which recorded a version during the month,
+    and the number of services tracked since the beginning of the dataset.
+    granularity: "day", "week" or "month"
+    start, end: only return the periods between these dates (format YYYY-MM-DD)
+    services: only count these services, separated by a comma
     """
-    dataset = CGUsDataset(Path(CGUS_DATASET_PATH))
-    stats = dataset.get_stats()
-    data = pd.DataFrame.from_dict(stats, orient="index")
-    data.sort_values(by="date", inplace=True)
-    data["year_month"] = data.date.dt.to_period("M")
-    over_years = data.groupby("year_month", as_index=False).agg(
-        services_tracked=("service", "unique"),
-        n_services_active=("service", pd.Series.nunique),
+    if granularity not in PERIOD_FIELDS:
+        raise HTTPException(
+            400, f"Unknown granularity {granularity}, expected day, week or month."
+        )
+    try:
+        start_date = parse_user_date(start).date() if start else None
+        end_date = parse_user_date(end).date() if end else None
+    except ValueError as exception:
+        raise HTTPException(
+            400,
+            f"Issue parsing date : {str(exception)}. Expected format is YYYY-MM-DD.",
+        ) from exception
+    catalog = await run_cpu(get_catalog, CGUS_DATASET_PATH)
+    stats = await run_cpu(get_service_stats, catalog)
+    return stats.series(
+        granularity,
+        start=start_date,
+        end=end_date,
+        services=services.split(",") if services else None,
     )
-    all_services = set()
-    num_unique_services = list()
-    for i in over_years.iterrows():
-        all_services.update(i[1].services_tracked)
-        num_unique_services.append(len(all_services))
-    over_years["n_services_tracked"] = num_unique_services
-    over_years["proportion_active"] = (
-        over_years.n_services_active / over_years.n_services_tracked
+
+
+@app.get(f"{BASE_PATH}/term_frequency/v1/{{term}}")
+@limiter.limit(RATE_LIMIT)
+async def term_frequency(
+    request: Request,
+    term: str,
+    granularity: str = "month",
+    start: str = None,
+    end: str = None,
+    services: str = None,
+    doc_types: str = None,
+    regex: bool = False,
+):
+    """
+    Returns, for every period of /graph_services, how many documents and services
+    contain a term in their version current at the end of the period,
+    out of those tracked since the beginning of the dataset:
+    [{"year_month": "2020-11", "n_documents_containing": 12, "n_documents_tracked": 40,
+      "n_services_containing": 9, "n_services_tracked": 25}, ...]
+    Search for multiple terms by separating them with a comma: a document then counts
+    if it contains any of them. Search is case-insensitive.
+    The versions containing the term are found once per dataset release (reading only
+    the versions the term index selects); other granularities, dates and filters of the
+    same term are then computed without reading any version.
+    granularity: "day", "week" or "month"
+    start, end: only return the periods between these dates (format YYYY-MM-DD)
+    services, doc_types: only count these services and document types, separated by a comma
+    regex: search the terms as regular expressions (see /first_occurence)
+    """
+    if granularity not in PERIOD_FIELDS:
+        raise HTTPException(
+            400, f"Unknown granularity {granularity}, expected day, week or month."
+        )
+    start_date, end_date = (
+        parse_dates(date)[0].date() if date else None for date in (start, end)
+    )
+    parser = make_parser("term_frequency", term, regex=regex)
+    presence = await jobs.wait(
+        await submit_query("term_frequency", parser, regex=regex)
+    )
+    catalog = await run_cpu(get_catalog, CGUS_DATASET_PATH)
+    grid = await run_cpu(get_version_grid, catalog, granularity)
+    return await run_cpu(
+        grid.term_series,
+        presence,
+        start=start_date,
+        end=end_date,
+        services=services.split(",") if services else None,
+        doc_types=doc_types.split(",") if doc_types else None,
     )
-    print(over_years)
-    over_years.year_month = over_years.year_month.astype(str)
-    return over_years[
-        ["year_month", "n_services_active", "n_services_tracked"]
-    ].to_dict(orient="records")
 
 
 @app.get(f"{BASE_PATH}/list_documentTypes/v1/")
 @limiter.limit(RATE_LIMIT)
 async def list_document_types(request: Request):
     """
-    Returns a JSON object with all document types used by OTA
+    Returns a JSON object with all document types used by OTA,
+    from a local copy refreshed in the background
     """
-    req = requests.get(DOCTYPE_URL)
-    return req.json()
+    try:
+        if document_types.document is None:
+            await run_io(document_types.refresh)
+        return document_types.get()
+    except requests.RequestException as exception:
+        raise HTTPException(502, f"Could not reach GitHub: {exception}") from exception
@@ -0,0 +1,229 @@
+from array import array
+from bisect import bisect_left
+import mmap
+from pathlib import Path
+import pickle
+import struct
+
+from config import INDEX_DIRNAME
+
+MAPPED_INDEX_FILENAME = "dataset.map"
+MAGIC = b"OTAMAP01"
+# offset and size of the header, at the end of the file
+FOOTER = struct.Struct("<QQ")
+# sections start on a multiple of this, so that their items are aligned
+ALIGNMENT = 8
+
+
+class StringTable:
+    """
+    Sequence of strings stored one after another in a buffer,
+    the i-th one between `offsets[i]` and `offsets[i + 1]`
+    """
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string index out of range")
+        return str(self.blob[self.offsets[index] : self.offsets[index + 1]], "utf-8")
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class MappedPostings:
+    """
+    Read-only mapping of trigrams to the sorted ids of the versions containing them,
+    answering like the dict of postings of a term index
+    """
+
+    def __init__(self, trigrams: memoryview, offsets: memoryview, postings: memoryview):
+        self.trigrams = trigrams
+        self.offsets = offsets
+        self.postings = postings
+
+    def __len__(self):
+        return len(self.trigrams)
+
+    def __contains__(self, trigram: int) -> bool:
+        return self._position(trigram) is not None
+
+    def _position(self, trigram: int):
+        position = bisect_left(self.trigrams, trigram)
+        if position < len(self.trigrams) and self.trigrams[position] == trigram:
+            return position
+        return None
+
+    def _at(self, position: int) -> memoryview:
+        return self.postings[self.offsets[position] : self.offsets[position + 1]]
+
+    def get(self, trigram: int, default=None):
+        """
+        Ids of the versions containing `trigram`, or `default`
+        """
+        position = self._position(trigram)
+        return default if position is None else self._at(position)
+
+    def items(self):
+        """
+        Yield (trigram, version ids) pairs in trigram order
+        """
+        for position, trigram in enumerate(self.trigrams):
+            yield trigram, self._at(position)
+
+
+class MappedIndex:
+    """
+    Catalog, content hashes and term index of a dataset, read from a single file
+    mapped in memory. Arrays are used in place, so every process opening the file
+    shares the same pages instead of loading its own copy.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.buffer[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a mapped dataset index")
+        header_offset, header_size = FOOTER.unpack(self.buffer[-FOOTER.size :])
+        header = pickle.loads(self.buffer[header_offset : header_offset + header_size])
+        # (service, doc_type, number of versions), in catalog iteration order
+        self.documents = header["documents"]
+        self.fingerprint = header["fingerprint"]
+        # whether the versions of a packed dataset are compressed, None if not packed
+        self.pack_compressed = header["pack_compressed"]
+        self._sections = header["sections"]
+
+    def section(self, name: str) -> memoryview:
+        """
+        Array stored in a section of the file, without copying it
+        """
+        offset, size, typecode = self._sections[name]
+        return memoryview(self.buffer)[offset : offset + size].cast(typecode)
+
+    def filenames(self) -> StringTable:
+        """
+        Filename of every version, in catalog iteration order
+        """
+        return StringTable(self.section("filenames"), self.section("filename_offsets"))
+
+    def postings(self) -> MappedPostings:
+        """
+        Postings of the term index
+        """
+        return MappedPostings(
+            self.section("trigrams"),
+            self.section("posting_offsets"),
+            self.section("postings"),
+        )
+
+
+class _SectionWriter:
+    """
+    Writes arrays into aligned sections of a file and records where they are
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.sections = dict()
+
+    def start(self, name: str, typecode: str):
+        """
+        Start an empty section of items of type `typecode`
+        """
+        self.file.write(bytes(-self.file.tell() % ALIGNMENT))
+        self.sections[name] = (self.file.tell(), 0, typecode)
+
+    def append(self, name: str, data):
+        """
+        Write `data` at the end of the section being written
+        """
+        offset, size, typecode = self.sections[name]
+        self.file.write(data)
+        self.sections[name] = (offset, size + memoryview(data).nbytes, typecode)
+
+    def write(self, name: str, data: array):
+        """
+        Write a whole section holding the array `data`
+        """
+        self.start(name, data.typecode)
+        self.append(name, data)
+
+
+def write_mapped_index(
+    path: Path, catalog, content_hashes, term_index, fingerprint: tuple
+):
+    """
+    Write the catalog, content hashes and term index of a dataset into a mapped index.
+    `fingerprint` identifies the state of the dataset files they were built from.
+    """
+    documents = list()
+    timestamps = array("q")
+    filenames = bytearray()
+    filename_offsets = array("Q", [0])
+    pack_offsets, pack_sizes, pack_compressed = array("Q"), array("Q"), None
+    for document in catalog.iter_documents():
+        documents.append((document.service, document.doc_type, len(document)))
+        timestamps.extend(document.timestamps)
+        for index, filename in enumerate(document.filenames):
+            filenames += filename.encode("utf-8")
+            filename_offsets.append(len(filenames))
+            version = document.path(index)
+            if not isinstance(version, Path):
+                pack_offsets.append(version.offset)
+                pack_sizes.append(version.size)
+                pack_compressed = version.compressed
+    if len(content_hashes) != len(timestamps):
+        raise ValueError("Content hashes were built for another set of versions")
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temporary_path = path.with_suffix(".tmp")
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC)
+        writer = _SectionWriter(file)
+        writer.write("timestamps", timestamps)
+        writer.write("filename_offsets", filename_offsets)
+        writer.write("filenames", array("B", filenames))
+        writer.write("digests", array("B", content_hashes.digests))
+        writer.write("sizes", array("Q", content_hashes.sizes))
+        writer.write("pack_offsets", pack_offsets)
+        writer.write("pack_sizes", pack_sizes)
+        trigrams = array("I", sorted(term_index.postings))
+        posting_offsets = array("Q", [0])
+        writer.start("postings", "I")
+        for trigram in trigrams:
+            version_ids = term_index.postings[trigram]
+            writer.append("postings", array("I", version_ids))
+            posting_offsets.append(posting_offsets[-1] + len(version_ids))
+        writer.write("trigrams", trigrams)
+        writer.write("posting_offsets", posting_offsets)
+        header = pickle.dumps(
+            {
+                "documents": documents,
+                "fingerprint": fingerprint,
+                "pack_compressed": pack_compressed,
+                "sections": writer.sections,
+            },
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        header_offset = file.tell()
+        file.write(header)
+        file.write(FOOTER.pack(header_offset, len(header)))
+    temporary_path.replace(path)
+
+
+def mapped_index_path(root_path) -> Path:
+    """
+    Location of the mapped index of the dataset at `root_path`
+    """
+    return Path(root_path, INDEX_DIRNAME, MAPPED_INDEX_FILENAME)
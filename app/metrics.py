@@ -0,0 +1,280 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+import json
+import logging
+import os
+from pathlib import Path
+import sys
+from threading import Lock
+import time
+
+from config import METRICS_DIR, METRICS_FLUSH_INTERVAL
+
+logger = logging.getLogger("uvicorn.error")
+
+# upper bounds of histogram buckets, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# name -> (type, help) of every metric
+DESCRIPTIONS = {
+    "http_requests_total": ("counter", "Requests answered, by route and status"),
+    "http_request_duration_seconds": (
+        "histogram",
+        "Time to answer a request, by route",
+    ),
+    "query_scan_duration_seconds": (
+        "histogram",
+        "Time to scan the dataset for an occurrence query, excluding serialization",
+    ),
+    "query_cache_requests_total": (
+        "counter",
+        "Occurrence query cache lookups, by result (hit, disk_hit, miss)",
+    ),
+    "scan_files_read_total": ("counter", "Versions read by scans, by parser"),
+    "scan_bytes_read_total": ("counter", "Bytes read by scans, by parser"),
+    "scan_files_matched_total": (
+        "counter",
+        "Versions read by scans which contain the terms",
+    ),
+    "scan_document_seconds_total": (
+        "counter",
+        "Time spent reading the versions of a document, by service and document type",
+    ),
+    "finder_versions_read_total": (
+        "counter",
+        "Versions read to answer version requests",
+    ),
+    "finder_bytes_read_total": ("counter", "Bytes read to answer version requests"),
+    "dataset_load_duration_seconds": (
+        "histogram",
+        "Time to load a structure of a new dataset release, by structure",
+    ),
+    "index_build_duration_seconds": ("histogram", "Time to build an index, by index"),
+}
+
+
+class Metrics:
+    """
+    Counters and histograms of a process.
+    With METRICS_DIR, each process regularly writes its values into its own file
+    of that directory, and `collect` sums the files of every process (API workers,
+    scan processes, index builds), so that totals are right whichever worker answers.
+    """
+
+    def __init__(self, directory: str = METRICS_DIR):
+        self.directory = Path(directory) if directory else None
+        self.lock = Lock()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.counters = dict()
+        self.histograms = dict()
+        self.file_name = f"{self.pid}-{time.time_ns()}.json"
+        self.last_flush = None
+
+    def _check_process(self):
+        # forked processes (scan pools) start with a copy of their parent's values
+        if os.getpid() != self.pid:
+            self._reset()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        Increase a counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._check_process()
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        Record a value in a histogram
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self._check_process()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # one count per bucket, then the +Inf bucket, the sum and the count
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 3)
+            histogram[bisect_left(BUCKETS, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """
+        Record the duration of a block in a histogram
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        Current values of the process, serializable as JSON
+        """
+        with self.lock:
+            self._check_process()
+            return {
+                "counters": [
+                    [name, dict(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    [name, dict(labels), list(values)]
+                    for (name, labels), values in self.histograms.items()
+                ],
+            }
+
+    def flush(self):
+        """
+        Write the values of the process to its file in METRICS_DIR
+        """
+        if self.directory is None:
+            return
+        snapshot = self.snapshot()
+        self.last_flush = time.monotonic()
+        path = self.directory / self.file_name
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temporary_path = path.with_suffix(".tmp")
+            temporary_path.write_text(json.dumps(snapshot))
+            temporary_path.replace(path)
+        except OSError as exception:
+            logger.warning(f"Could not write metrics: {exception}")
+
+    def flush_if_due(self, interval: float = METRICS_FLUSH_INTERVAL):
+        """
+        Flush, unless the process already did in the last `interval` seconds
+        """
+        with self.lock:
+            self._check_process()
+        if self.last_flush is None or time.monotonic() - self.last_flush >= interval:
+            self.flush()
+
+    def clear(self):
+        """
+        Remove the files of every process from METRICS_DIR, left by a previous run
+        """
+        if self.directory is None:
+            return
+        for path in list(self.directory.glob("*.json")) + list(
+            self.directory.glob("*.tmp")
+        ):
+            try:
+                path.unlink()
+            except OSError as exception:
+                logger.warning(f"Could not remove metrics {path}: {exception}")
+
+    def collect(self) -> dict:
+        """
+        Values summed over every process writing to METRICS_DIR, or of this process only
+        """
+        if self.directory is None:
+            snapshots = [self.snapshot()]
+        else:
+            self.flush()
+            snapshots = list()
+            for path in self.directory.glob("*.json"):
+                try:
+                    snapshots.append(json.loads(path.read_text()))
+                except (OSError, ValueError) as exception:
+                    logger.warning(f"Could not read metrics {path}: {exception}")
+        counters, histograms = dict(), dict()
+        for snapshot in snapshots:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, values in snapshot["histograms"]:
+                key = (name, tuple(sorted(labels.items())))
+                total = histograms.setdefault(key, [0] * len(values))
+                for index, value in enumerate(values):
+                    total[index] += value
+        return {"counters": counters, "histograms": histograms}
+
+    def render(self) -> str:
+        """
+        Collected values in the Prometheus text format
+        """
+        collected = self.collect()
+        series = dict()
+        for (name, labels), value in collected["counters"].items():
+            series.setdefault(name, list()).append(_line(name, labels, value))
+        for (name, labels), values in collected["histograms"].items():
+            lines = series.setdefault(name, list())
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), values):
+                cumulative += count
+                lines.append(
+                    _line(f"{name}_bucket", labels + (("le", str(bound)),), cumulative)
+                )
+            lines.append(_line(f"{name}_sum", labels, values[-2]))
+            lines.append(_line(f"{name}_count", labels, values[-1]))
+        output = list()
+        for name in sorted(series):
+            metric_type, description = DESCRIPTIONS.get(name, ("untyped", name))
+            output.append(f"# HELP {name} {description}")
+            output.append(f"# TYPE {name} {metric_type}")
+            output.extend(series[name])
+        return "\n".join(output) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _line(name: str, labels: tuple, value) -> str:
+    if labels:
+        label_text = ",".join(f'{key}="{_escape(value)}"' for key, value in labels)
+        name = f"{name}{{{label_text}}}"
+    return f"{name} {value}"
+
+
+metrics = Metrics()
+
+
+class MetricsMiddleware:  # pylint: disable=too-few-public-methods
+    """
+    ASGI middleware counting requests and their duration by route (handler name)
+    and status. Routes are labelled by handler rather than path, whose parameters
+    (terms, services) would create a series per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = dict(code=500)
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router stores the matched handler in the scope
+            route = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            metrics.observe(
+                "http_request_duration_seconds",
+                time.perf_counter() - start,
+                route=route,
+            )
+            metrics.inc("http_requests_total", route=route, status=str(status["code"]))
+
+
+if __name__ == "__main__":
+    # run before the workers start, so that /metrics does not sum the previous run
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    directory = sys.argv[1] if len(sys.argv) > 1 else METRICS_DIR
+    Metrics(directory).clear()
+    logger.info(f"Cleared the metrics of {directory or 'no directory'}")
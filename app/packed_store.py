@@ -0,0 +1,138 @@
+from array import array
+from functools import lru_cache
+import io
+import mmap
+from pathlib import Path
+import pickle
+import struct
+from typing import NamedTuple
+import zlib
+
+from config import PACK_FILENAME
+
+MAGIC = b"OTAPACK1"
+# offset and size of the table of contents, at the end of the file
+FOOTER = struct.Struct("<QQ")
+
+
+class PackedVersion(NamedTuple):
+    """
+    Location of a version content in a pack file.
+    Read like a Path (`name`, `read_bytes`, `read_text`, `open`), and cheap to pickle.
+    """
+
+    pack_path: str
+    offset: int
+    size: int
+    compressed: bool
+    name: str
+
+    def read_bytes(self) -> bytes:
+        """
+        Content of the version
+        """
+        content = _map_pack(self.pack_path)[self.offset : self.offset + self.size]
+        return zlib.decompress(content) if self.compressed else content
+
+    def read_text(self) -> str:
+        """
+        Content of the version, decoded as a file opened in text mode would be
+        """
+        with self.open() as file:
+            return file.read()
+
+    def open(self, mode: str = "r"):
+        """
+        Open the version content as a file object
+        """
+        if mode == "rb":
+            return io.BytesIO(self.read_bytes())
+        if mode != "r":
+            raise ValueError(f"Packed versions are read-only, cannot open in {mode}")
+        return io.TextIOWrapper(io.BytesIO(self.read_bytes()))
+
+
+@lru_cache(maxsize=4)
+def _map_pack(pack_path: str) -> mmap.mmap:
+    # a few generations may be served at once while a new release is installed
+    with open(pack_path, "rb") as file:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class PackWriter:
+    """
+    Writes versions one after another into a pack file, followed by a table of contents:
+    service -> document type -> (filenames, offsets, sizes).
+    Versions should be added in catalog order, so that scans read the file sequentially.
+    """
+
+    def __init__(self, path: Path, compress: bool = False):
+        self.path = Path(path)
+        self.compress = compress
+        self.documents = dict()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.temporary_path = self.path.with_suffix(".tmp")
+        self.file = open(
+            self.temporary_path, "wb"
+        )  # pylint: disable=consider-using-with
+        self.file.write(MAGIC)
+
+    def add(self, service: str, doc_type: str, filename: str, content: bytes):
+        """
+        Append a version
+        """
+        if self.compress:
+            content = zlib.compress(content)
+        filenames, offsets, sizes = self.documents.setdefault(
+            service, dict()
+        ).setdefault(doc_type, (list(), array("Q"), array("Q")))
+        filenames.append(filename)
+        offsets.append(self.file.tell())
+        sizes.append(len(content))
+        self.file.write(content)
+
+    def close(self):
+        """
+        Write the table of contents and move the pack to its final location
+        """
+        table = pickle.dumps(
+            {"compressed": self.compress, "documents": self.documents},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        table_offset = self.file.tell()
+        self.file.write(table)
+        self.file.write(FOOTER.pack(table_offset, len(table)))
+        self.file.close()
+        self.temporary_path.replace(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, *_):
+        if exception_type is None:
+            self.close()
+        else:
+            self.file.close()
+            self.temporary_path.unlink()
+
+
+def pack_path(root_path) -> Path:
+    """
+    Location of the pack file of the dataset at `root_path`
+    """
+    return Path(root_path, PACK_FILENAME)
+
+
+def read_pack_table(path: Path):
+    """
+    Return whether the versions of a pack are compressed, and its table of contents:
+    service -> document type -> (filenames, offsets, sizes)
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a dataset pack")
+        file.seek(-FOOTER.size, io.SEEK_END)
+        table_offset, table_size = FOOTER.unpack(file.read(FOOTER.size))
+        file.seek(table_offset)
+        table = pickle.loads(file.read(table_size))
+    return table["compressed"], table["documents"]
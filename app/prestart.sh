@@ -0,0 +1,5 @@
+#! /usr/bin/env bash
+# Run by the image before gunicorn starts its workers
+
+# metrics files of the workers of the previous run
+python /app/metrics.py
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+import hashlib
+import logging
+import os
+from pathlib import Path
+import pickle
+import shutil
+from threading import Lock
+
+from config import QUERY_CACHE_BYTES, QUERY_CACHE_DIR, QUERY_CACHE_SIZE
+from metrics import metrics
+from scanner import is_literal
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def normalize_terms(comma_separated_terms: str) -> tuple:
+    """
+    Terms as a sorted tuple without duplicates, so that equivalent queries share a key.
+    Only plain ASCII terms are lowercased: lowercasing a regex can change its meaning (\\S, \\W).
+    """
+    terms = comma_separated_terms.split(",")
+    if is_literal(comma_separated_terms):
+        terms = [term.lower() if term.isascii() else term for term in terms]
+    return tuple(sorted(set(terms)))
+
+
+def query_key(endpoint: str, parser, **options) -> tuple:
+    """
+    Key of an occurrence query in the cache. Terms are normalized, unless the result
+    depends on them as they were written: per-term results are keyed by each term,
+    and match offsets depend on the order of the terms (the first matching one wins).
+    """
+    if parser.matcher is not None or parser.ordered_terms:
+        terms = tuple(parser.term_list)
+    else:
+        terms = normalize_terms(parser.terms)
+    return (endpoint, terms, tuple(sorted(options.items())))
+
+
+class QueryCache:
+    """
+    LRU cache of query results for a given dataset version,
+    with an optional on-disk tier shared by workers and surviving restarts.
+    Entries of other dataset versions are dropped as soon as the version changes.
+    The memory tier is bounded both by its number of entries and by their size,
+    approximated by the size of their pickle: results of common terms on a large
+    dataset take megabytes each.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = QUERY_CACHE_SIZE,
+        directory: str = QUERY_CACHE_DIR,
+        max_bytes: int = QUERY_CACHE_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self.version = None
+        # key -> (result, size)
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get_or_compute(self, version: str, key: tuple, compute):
+        """
+        Return the cached result of `key` for the dataset `version`,
+        or compute it with `compute()` and cache it.
+        """
+        with self.lock:
+            self._set_version(version)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                metrics.inc("query_cache_requests_total", result="hit")
+                return self.entries[key][0]
+        found = self._read(version, key)
+        metrics.inc(
+            "query_cache_requests_total", result="miss" if found is None else "disk_hit"
+        )
+        if found is None:
+            value = compute()
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            self._write(version, key, data)
+            size = len(data)
+        else:
+            value, size = found
+        with self.lock:
+            if found is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            if self.version == version and size <= self.max_bytes:
+                self._store(key, value, size)
+        return value
+
+    def _store(self, key: tuple, value, size: int):
+        if key in self.entries:
+            self.size -= self.entries.pop(key)[1]
+        self.entries[key] = (value, size)
+        self.size += size
+        while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.size -= evicted_size
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counts since the worker started
+        """
+        with self.lock:
+            return {
+                "dataset_version": self.version,
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def clear(self):
+        """
+        Drop every cached result, in memory and on disk
+        """
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            if self.directory is not None:
+                shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _set_version(self, version: str):
+        if version == self.version:
+            return
+        self.version = version
+        self.entries.clear()
+        self.size = 0
+        if self.directory is None or not self.directory.exists():
+            return
+        current = self._version_directory(version).name
+        for directory in self.directory.iterdir():
+            if directory.name != current:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def _version_directory(self, version: str) -> Path:
+        return self.directory / hashlib.sha256(str(version).encode()).hexdigest()[:16]
+
+    def _path(self, version: str, key: tuple) -> Path:
+        name = hashlib.sha256(repr(key).encode()).hexdigest()
+        return self._version_directory(version) / f"{name}.pickle"
+
+    def _read(self, version: str, key: tuple):
+        """
+        Result of `key` stored on disk and the size of its pickle, or None
+        """
+        if self.directory is None:
+            return None
+        try:
+            data = self._path(version, key).read_bytes()
+            return pickle.loads(data), len(data)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as exception:
+            logger.warning(f"Could not read cached query result: {exception}")
+            return None
+
+    def _write(self, version: str, key: tuple, data: bytes):
+        if self.directory is None:
+            return
+        path = self._path(version, key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # several workers may write the same result at once
+            temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+            temporary_path.write_bytes(data)
+            temporary_path.replace(path)
+        except OSError as exception:
+            logger.warning(f"Could not write cached query result: {exception}")
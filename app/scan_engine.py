@@ -0,0 +1,69 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from threading import Lock
+
+from config import SCAN_CHUNK_SIZE, SCAN_WORKERS
+from metrics import metrics
+
+_pools = dict()
+_pools_lock = Lock()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+        return _pools[workers]
+
+
+def _run_and_flush_metrics(function, chunk):
+    # scan processes have no other occasion to report their metrics,
+    # but writing them after every chunk would slow scans down
+    result = function(chunk)
+    metrics.flush_if_due()
+    return result
+
+
+def _discard_pool(workers: int):
+    with _pools_lock:
+        pool = _pools.pop(workers, None)
+    if pool is not None:
+        pool.shutdown(wait=False)
+
+
+class ScanEngine:
+    """
+    Shards a list of items into chunks and applies a function to each chunk,
+    in a pool of processes shared by every query when more than one worker is configured.
+    The function and its arguments must be picklable.
+    """
+
+    def __init__(self, workers: int = None, chunk_size: int = None):
+        self.workers = workers or SCAN_WORKERS
+        self.chunk_size = chunk_size or SCAN_CHUNK_SIZE
+
+    def chunks(self, items: list) -> list:
+        """
+        Split items into chunks of at most `chunk_size` items
+        """
+        return [
+            items[start : start + self.chunk_size]
+            for start in range(0, len(items), self.chunk_size)
+        ]
+
+    def map(self, function, items: list):
+        """
+        Yield `function(chunk)` for each chunk of items, in order
+        """
+        chunks = self.chunks(items)
+        if self.workers <= 1 or len(chunks) <= 1:
+            yield from map(function, chunks)
+            return
+        try:
+            yield from _get_pool(self.workers).map(
+                partial(_run_and_flush_metrics, function), chunks
+            )
+        except BrokenProcessPool:
+            _discard_pool(self.workers)
+            raise
@@ -0,0 +1,168 @@
+from functools import lru_cache
+import mmap
+from pathlib import Path
+import re
+import string
+
+# characters with a special meaning in the regexes built from user terms
+REGEX_METACHARACTERS = set(".^$*+?{}[]\\|()")
+# text files are scanned line by line, so a term containing these cannot be searched as bytes
+LINE_BREAKS = set("\r\n")
+# non-ASCII characters can only match characters which have an upper or lower case,
+# and these are all below this code point
+LAST_CASED_CODE_POINT = 0x1F000
+
+
+def is_literal(comma_separated_terms: str) -> bool:
+    """
+    Whether the terms are plain text rather than regexes
+    """
+    return (
+        all(comma_separated_terms.split(","))
+        and not REGEX_METACHARACTERS.intersection(comma_separated_terms)
+        and not LINE_BREAKS.intersection(comma_separated_terms)
+    )
+
+
+@lru_cache(maxsize=1)
+def _cased_characters() -> list:
+    characters = [
+        chr(code_point)
+        for code_point in range(0x80, LAST_CASED_CODE_POINT)
+        if chr(code_point).lower() != chr(code_point)
+        or chr(code_point).upper() != chr(code_point)
+    ]
+    return list(string.ascii_letters) + characters
+
+
+@lru_cache(maxsize=4096)
+def case_variants(character: str) -> tuple:
+    """
+    All the characters a case-insensitive `re` search considers equal to `character`,
+    including special cases such as the Kelvin sign for "k" or the dotless i for "i".
+    """
+    pattern = re.compile(re.escape(character), re.IGNORECASE)
+    variants = {character}
+    if character.lower() != character or character.upper() != character:
+        variants.update(c for c in _cased_characters() if pattern.fullmatch(c))
+    return tuple(sorted(variants))
+
+
+def _lowered_bytes_alternatives(character: str) -> bytes:
+    # the searched buffer is lowercased (ASCII only), so ASCII variants collapse to lowercase
+    variants = sorted(
+        {
+            variant.lower().encode() if variant.isascii() else variant.encode()
+            for variant in case_variants(character)
+        }
+    )
+    if len(variants) == 1:
+        return re.escape(variants[0])
+    return b"(?:" + b"|".join(re.escape(variant) for variant in variants) + b")"
+
+
+def _term_bytes_pattern(term: str) -> bytes:
+    return b"".join(_lowered_bytes_alternatives(character) for character in term)
+
+
+def compile_bytes_patterns(comma_separated_terms: str):
+    """
+    Compile literal comma-separated terms to bytes regexes, one per term, matching
+    their UTF-8 encoding in an ASCII-lowercased buffer. Together they give the same
+    results as the case-insensitive text regex used by the parsers.
+    Returns None for terms which are regexes, which have to be searched as text.
+    """
+    if not is_literal(comma_separated_terms):
+        return None
+    # one pattern per term rather than an alternation: a pattern starting with a
+    # literal is searched much faster by `re`
+    return tuple(
+        re.compile(_term_bytes_pattern(term))
+        for term in comma_separated_terms.split(",")
+    )
+
+
+def read_mapped(file_path: Path) -> bytes:
+    """
+    Content of a file, copied out of a memory map. Scans read files with
+    `Path.read_bytes`, which avoids the mapping and is slightly faster.
+    """
+    with open(file_path, "rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty files cannot be mapped
+            return b""
+        with buffer:
+            return buffer[:]
+
+
+def mmap_contains(file_path: Path, bytes_patterns: tuple) -> bool:
+    """
+    Search a memory-mapped file for the patterns of `compile_bytes_patterns`,
+    without decoding it or splitting it into lines.
+    """
+    return bytes_contains(read_mapped(file_path), bytes_patterns)
+
+
+def bytes_contains(content: bytes, bytes_patterns: tuple) -> bool:
+    """
+    Search the content of a version for the patterns of `compile_bytes_patterns`
+    """
+    # a case-insensitive regex is an order of magnitude slower than
+    # lowercasing the content once and searching it case-sensitively
+    lowered = content.lower()
+    return any(pattern.search(lowered) for pattern in bytes_patterns)
+
+
+class TermMatcher:
+    """
+    Finds which of several terms a content contains, reading it once.
+    Literal terms are searched as bytes in the ASCII-lowercased content, like the
+    patterns of `compile_bytes_patterns`; with `regex`, terms are case-insensitive
+    regexes searched line by line, like the parsers search them.
+    Each term keeps its own pattern: `re` finds a pattern starting with a literal
+    much faster than an alternation of the terms, which it tries at every position.
+    """
+
+    def __init__(self, terms: list, regex: bool = False):
+        self.terms = terms
+        self.regex = regex
+        if regex:
+            self.patterns = tuple(re.compile(term, re.IGNORECASE) for term in terms)
+        else:
+            self.patterns = tuple(
+                re.compile(_term_bytes_pattern(term)) for term in terms
+            )
+
+    def _search(self, text, remaining: tuple, found: set) -> tuple:
+        """
+        Add the indexes of the `remaining` terms found in `text` to `found`,
+        and return the terms still remaining
+        """
+        still_remaining = list()
+        for index in remaining:
+            if self.patterns[index].search(text):
+                found.add(index)
+            else:
+                still_remaining.append(index)
+        return tuple(still_remaining)
+
+    def find_bytes(self, content: bytes) -> frozenset:
+        """
+        Indexes of the literal terms contained in `content`
+        """
+        found = set()
+        self._search(content.lower(), tuple(range(len(self.terms))), found)
+        return frozenset(found)
+
+    def find_lines(self, lines) -> frozenset:
+        """
+        Indexes of the terms found in an iterable of lines, stopping once all are found
+        """
+        found = set()
+        remaining = tuple(range(len(self.terms)))
+        for line in lines:
+            remaining = self._search(line, remaining, found)
+            if not remaining:
+                break
+        return frozenset(found)
@@ -0,0 +1,291 @@
+from array import array
+from datetime import date, timedelta
+
+from catalog import DatasetCatalog, EPOCH
+
+SECONDS_PER_DAY = 24 * 60 * 60
+EPOCH_DATE = EPOCH.date()
+# name of the field labelling each period in the series
+PERIOD_FIELDS = {"day": "date", "week": "week", "month": "year_month"}
+
+
+def _day_to_date(day: int) -> date:
+    return EPOCH_DATE + timedelta(days=day)
+
+
+def _period_start(day: int, granularity: str) -> int:
+    """
+    First day (in days since the epoch) of the period containing `day`
+    """
+    if granularity == "day":
+        return day
+    if granularity == "week":
+        return day - _day_to_date(day).weekday()
+    return day - _day_to_date(day).day + 1
+
+
+def _period_label(start: int, granularity: str) -> str:
+    start_date = _day_to_date(start)
+    if granularity == "day":
+        return start_date.isoformat()
+    if granularity == "week":
+        year, week, _ = start_date.isocalendar()
+        return f"{year}-W{week:02d}"
+    return start_date.strftime("%Y-%m")
+
+
+class ServiceStats:
+    """
+    Days on which each service recorded at least one version, computed once per catalog.
+    Series of active and tracked services are derived from them for any granularity,
+    date range or set of services without reading the dataset again.
+    """
+
+    def __init__(self, days: dict):
+        self.days = days
+        self._periods = dict()
+
+    @classmethod
+    def build(cls, catalog: DatasetCatalog):
+        """
+        Collect the version days of every service of a catalog
+        """
+        days = dict()
+        for document in catalog.iter_documents():
+            days.setdefault(document.service, set()).update(
+                timestamp // SECONDS_PER_DAY for timestamp in document.timestamps
+            )
+        return cls(
+            {service: sorted(service_days) for service, service_days in days.items()}
+        )
+
+    def periods(self, granularity: str) -> dict:
+        """
+        Map each service to the sorted start days of the periods in which it was active
+        """
+        if granularity not in PERIOD_FIELDS:
+            raise ValueError(f"Unknown granularity {granularity}")
+        if granularity not in self._periods:
+            self._periods[granularity] = {
+                service: sorted({_period_start(day, granularity) for day in days})
+                for service, days in self.days.items()
+            }
+        return self._periods[granularity]
+
+    def series(
+        self,
+        granularity: str = "month",
+        start: date = None,
+        end: date = None,
+        services: list = None,
+    ) -> list:
+        """
+        For every period with at least one version, the number of services active
+        during the period and the number of services tracked since the beginning
+        of the dataset, optionally restricted to some services and to the periods
+        overlapping the `start` to `end` range.
+        """
+        periods = self.periods(granularity)
+        if services is not None:
+            periods = {
+                service: periods[service] for service in services if service in periods
+            }
+        active = dict()
+        first_seen = dict()
+        for service_periods in periods.values():
+            for period in service_periods:
+                active[period] = active.get(period, 0) + 1
+            first_seen[service_periods[0]] = first_seen.get(service_periods[0], 0) + 1
+
+        field = PERIOD_FIELDS[granularity]
+        first_day = (start - EPOCH_DATE).days if start else None
+        last_day = (end - EPOCH_DATE).days if end else None
+        series = list()
+        tracked = 0
+        for period in sorted(active):
+            tracked += first_seen.get(period, 0)
+            if first_day is not None and period < _period_start(first_day, granularity):
+                continue
+            if last_day is not None and period > last_day:
+                break
+            series.append(
+                {
+                    field: _period_label(period, granularity),
+                    "n_services_active": active[period],
+                    "n_services_tracked": tracked,
+                }
+            )
+        return series
+
+
+def contains_version(presence: bytes, version_id: int) -> bool:
+    """
+    Whether the presence bitmap of a term has the bit of a version set
+    """
+    return bool(presence[version_id >> 3] & (1 << (version_id & 7)))
+
+
+class VersionGrid:
+    """
+    For every period of a granularity in which versions were recorded, the documents
+    whose current version changed during the period, with the id of their version
+    at the end of it. Computed once per catalog and granularity: the number of documents
+    containing a term at the end of each period then only depends on the bitmap of
+    the versions containing it, and no version is read again.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        granularity: str,
+        periods: array,
+        offsets: array,
+        documents: array,
+        versions: array,
+        document_keys: list,
+    ):
+        self.granularity = granularity
+        # start days of the periods, and the changes of period i between
+        # offsets[i] and offsets[i + 1] in `documents` and `versions`
+        self.periods = periods
+        self.offsets = offsets
+        self.documents = documents
+        self.versions = versions
+        # (service, doc_type) of each document number
+        self.document_keys = document_keys
+
+    @classmethod
+    def build(cls, catalog: DatasetCatalog, granularity: str):
+        """
+        Find the last version of every document in every period
+        """
+        if granularity not in PERIOD_FIELDS:
+            raise ValueError(f"Unknown granularity {granularity}")
+        changes = dict()
+        period_starts = dict()
+        document_keys = list()
+        for number, document in enumerate(catalog.iter_documents()):
+            document_keys.append((document.service, document.doc_type))
+            last_versions = dict()
+            for version_id, timestamp in enumerate(
+                document.timestamps, document.first_version_id
+            ):
+                day = timestamp // SECONDS_PER_DAY
+                if day not in period_starts:
+                    period_starts[day] = _period_start(day, granularity)
+                last_versions[period_starts[day]] = version_id
+            for period, version_id in last_versions.items():
+                changes.setdefault(period, list()).append((number, version_id))
+        periods, offsets = array("q"), array("Q", [0])
+        documents, versions = array("I"), array("I")
+        for period in sorted(changes):
+            periods.append(period)
+            for number, version_id in changes[period]:
+                documents.append(number)
+                versions.append(version_id)
+            offsets.append(len(documents))
+        return cls(granularity, periods, offsets, documents, versions, document_keys)
+
+    def term_series(
+        self,
+        presence: bytes,
+        start: date = None,
+        end: date = None,
+        services: list = None,
+        doc_types: list = None,
+    ) -> list:
+        """
+        For every period with at least one version, the number of documents and services
+        whose current version at the end of the period contains a term, and the number
+        of documents and services tracked since the beginning of the dataset.
+        `presence` is the bitmap of the versions containing the term, by version id.
+        Documents can be restricted to some services and document types,
+        and periods to those overlapping the `start` to `end` range.
+        """
+        selected = bytes(
+            (services is None or service in services)
+            and (doc_types is None or doc_type in doc_types)
+            for service, doc_type in self.document_keys
+        )
+        service_numbers = dict()
+        document_services = array(
+            "I",
+            (
+                service_numbers.setdefault(service, len(service_numbers))
+                for service, _ in self.document_keys
+            ),
+        )
+        # per document: 0 not tracked yet, 1 current version without the term, 2 with it
+        states = bytearray(len(self.document_keys))
+        # per service: number of tracked documents, and of those containing the term
+        service_tracked = array("I", bytes(4 * len(service_numbers)))
+        service_containing = array("I", bytes(4 * len(service_numbers)))
+        documents_tracked = documents_containing = 0
+        services_tracked = services_containing = 0
+
+        field = PERIOD_FIELDS[self.granularity]
+        first_day = (start - EPOCH_DATE).days if start else None
+        last_day = (end - EPOCH_DATE).days if end else None
+        series = list()
+        for position, period in enumerate(self.periods):
+            if last_day is not None and period > last_day:
+                break
+            changed = False
+            for change in range(self.offsets[position], self.offsets[position + 1]):
+                number = self.documents[change]
+                if not selected[number]:
+                    continue
+                changed = True
+                service = document_services[number]
+                state = 2 if contains_version(presence, self.versions[change]) else 1
+                previous = states[number]
+                states[number] = state
+                if previous == 0:
+                    documents_tracked += 1
+                    service_tracked[service] += 1
+                    if service_tracked[service] == 1:
+                        services_tracked += 1
+                if previous == state:
+                    continue
+                if state == 2:
+                    documents_containing += 1
+                    service_containing[service] += 1
+                    if service_containing[service] == 1:
+                        services_containing += 1
+                elif previous == 2:
+                    documents_containing -= 1
+                    service_containing[service] -= 1
+                    if service_containing[service] == 0:
+                        services_containing -= 1
+            if not changed or (
+                first_day is not None
+                and period < _period_start(first_day, self.granularity)
+            ):
+                continue
+            series.append(
+                {
+                    field: _period_label(period, self.granularity),
+                    "n_documents_containing": documents_containing,
+                    "n_documents_tracked": documents_tracked,
+                    "n_services_containing": services_containing,
+                    "n_services_tracked": services_tracked,
+                }
+            )
+        return series
+
+
+def get_version_grid(catalog: DatasetCatalog, granularity: str) -> VersionGrid:
+    """
+    Version grid of a catalog for a granularity, computed once per catalog
+    """
+    return catalog.derived(
+        f"version_grid_{granularity}",
+        lambda catalog: VersionGrid.build(catalog, granularity),
+    )
+
+
+def get_service_stats(catalog: DatasetCatalog) -> ServiceStats:
+    """
+    Service statistics of a catalog, computed once per catalog
+    """
+    return catalog.derived("service_stats", ServiceStats.build)
@@ -0,0 +1,188 @@
+from array import array
+import codecs
+import logging
+from pathlib import Path
+import pickle
+
+from catalog import DatasetCatalog
+from content_hashes import ContentHashes
+from scanner import is_literal
+from config import INDEX_DIRNAME
+
+TERM_INDEX_FILENAME = "terms.pickle"
+
+# non-ASCII characters that a case-insensitive `re` search considers equal to an ASCII letter
+SPECIAL_CASE_FOLDS = str.maketrans(
+    {"\u0130": "i", "\u0131": "i", "\u212a": "k", "\u017f": "s"}
+)
+# every other non-ASCII character is folded to this byte, which never appears in a term trigram
+UNINDEXED = b"\x00"
+
+codecs.register_error("term_index_fold", lambda error: ("\x00", error.end))
+
+logger = logging.getLogger("uvicorn.error")
+
+
+def fold(text: str) -> bytes:
+    """
+    Fold text so that two strings matching case-insensitively
+    have the same folded ASCII characters.
+    """
+    if not text.isascii():
+        text = text.translate(SPECIAL_CASE_FOLDS)
+    return text.encode("ascii", "term_index_fold").lower()
+
+
+def trigrams(folded: bytes) -> set:
+    """
+    Distinct trigrams of folded text, as integers
+    """
+    return {
+        int.from_bytes(folded[i : i + 3], "big")
+        for i in range(len(folded) - 2)
+        if UNINDEXED not in folded[i : i + 3]
+    }
+
+
+class TermIndex:
+    """
+    Trigram index of a dataset: maps each trigram to the versions containing it.
+    Versions are identified by their position in the catalog iteration order.
+    Postings are arrays in a dict, or a MappedPostings read from a mapped index
+    (paths then are None).
+    """
+
+    def __init__(self, paths: list, postings: dict):
+        self.paths = paths
+        self.postings = postings
+
+    @classmethod
+    def build(
+        cls, catalog: DatasetCatalog, content_hashes: ContentHashes, previous=None
+    ):
+        """
+        Read each distinct content of the dataset once and index its trigrams
+        for every version sharing it.
+        With the index of a previous release, its postings are renumbered for the
+        versions the dataset still has, and only the new versions are read.
+        """
+        relative_paths = catalog.relative_paths()
+        postings, new_ids = dict(), range(len(relative_paths))
+        if previous is not None:
+            postings, new_ids = previous._renumbered(relative_paths)
+        groups = dict()
+        for version_id in new_ids:
+            groups.setdefault(content_hashes.digest(version_id), list()).append(
+                version_id
+            )
+        paths = [path for *_, path in catalog.iter_versions()]
+        updated = set()
+        for version_ids in groups.values():
+            for trigram in trigrams(fold(paths[version_ids[0]].read_text())):
+                postings.setdefault(trigram, array("I")).extend(version_ids)
+                updated.add(trigram)
+        for trigram in updated:
+            postings[trigram] = array("I", sorted(postings[trigram]))
+        return cls(relative_paths, postings)
+
+    def _renumbered(self, relative_paths: list):
+        """
+        Postings of the versions still in `relative_paths`, with their ids in it,
+        and the ids of the versions missing from this index.
+        Versions keep their relative order in the catalog, so postings stay sorted.
+        """
+        new_ids = {path: version_id for version_id, path in enumerate(relative_paths)}
+        removed = len(relative_paths)  # never a version id
+        mapping = array("I", (new_ids.pop(path, removed) for path in self.paths))
+        has_removed = removed in mapping
+        postings = dict()
+        for trigram, version_ids in self.postings.items():
+            renumbered = array("I", map(mapping.__getitem__, version_ids))
+            if has_removed:
+                renumbered = array("I", filter(removed.__ne__, renumbered))
+                if not renumbered:
+                    continue
+            postings[trigram] = renumbered
+        # ids left in `new_ids` were not in this index
+        return postings, sorted(new_ids.values())
+
+    def candidates(self, comma_separated_terms: str):
+        """
+        Return the ids of the versions that may contain one of the terms,
+        or None when the index cannot narrow the search down (regexes, short terms).
+        """
+        if not is_literal(comma_separated_terms):
+            return None
+        candidates = set()
+        for term in comma_separated_terms.split(","):
+            term_trigrams = trigrams(fold(term))
+            if not term_trigrams:
+                return None
+            term_candidates = None
+            # intersect the rarest postings first
+            for trigram in sorted(
+                term_trigrams, key=lambda t: len(self.postings.get(t, ()))
+            ):
+                postings = self.postings.get(trigram, ())
+                if term_candidates is None:
+                    term_candidates = set(postings)
+                else:
+                    term_candidates.intersection_update(postings)
+                if not term_candidates:
+                    break
+            candidates.update(term_candidates)
+        return candidates
+
+    def save(self, path: Path):
+        """
+        Persist the index
+        """
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = path.with_suffix(".tmp")
+        with open(temporary_path, "wb") as file:
+            pickle.dump(
+                {"paths": self.paths, "postings": self.postings},
+                file,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        temporary_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path):
+        """
+        Load a persisted index
+        """
+        with open(path, "rb") as file:
+            content = pickle.load(file)
+        return cls(content["paths"], content["postings"])
+
+
+def term_index_path(root_path) -> Path:
+    """
+    Location of the term index of the dataset at `root_path`
+    """
+    return Path(root_path, INDEX_DIRNAME, TERM_INDEX_FILENAME)
+
+
+def load_term_index(catalog: DatasetCatalog):
+    """
+    Load the persisted term index of a catalog.
+    Returns None if there is none, or if it was built for another set of versions.
+    """
+    if catalog.mapped is not None:
+        return TermIndex(None, catalog.mapped.postings())
+    path = term_index_path(catalog.root_path)
+    if not path.exists():
+        return None
+    index = TermIndex.load(path)
+    if index.paths != catalog.relative_paths():
+        logger.warning(f"Term index {path} does not match the dataset, ignoring it")
+        return None
+    return index
+
+
+def get_term_index(catalog: DatasetCatalog):
+    """
+    Term index of a catalog, loaded once per catalog
+    """
+    return catalog.derived("term_index", load_term_index)
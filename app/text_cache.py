@@ -0,0 +1,64 @@
+from collections import OrderedDict
+import sys
+from threading import Lock
+
+from config import TEXT_CACHE_BYTES
+from metrics import metrics
+
+
+class TextCache:
+    """
+    LRU cache of version texts, bounded by the memory they take.
+    Texts are keyed by the digest of their content, so they stay valid across
+    dataset releases and versions sharing a content share an entry.
+    """
+
+    def __init__(self, max_bytes: int = TEXT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get_or_read(self, digest: bytes, read) -> str:
+        """
+        Return the cached text of the content `digest`,
+        or read it with `read()` and cache it.
+        """
+        with self.lock:
+            if digest in self.entries:
+                self.entries.move_to_end(digest)
+                self.hits += 1
+                metrics.inc("text_cache_requests_total", result="hit")
+                return self.entries[digest]
+            self.misses += 1
+        metrics.inc("text_cache_requests_total", result="miss")
+        text = read()
+        size = sys.getsizeof(text)
+        if size > self.max_bytes:
+            return text
+        with self.lock:
+            if digest not in self.entries:
+                self.entries[digest] = text
+                self.size += size
+                while self.size > self.max_bytes:
+                    _, evicted = self.entries.popitem(last=False)
+                    self.size -= sys.getsizeof(evicted)
+        return text
+
+    def stats(self) -> dict:
+        """
+        Hit and miss counts since the worker started, and memory used
+        """
+        with self.lock:
+            return {
+                "entries": len(self.entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+text_cache = TextCache()
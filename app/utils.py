@@ -1,6 +1,9 @@
-from datetime import datetime
+import calendar
+from datetime import datetime, timedelta
 import re
 
+DATE_STEPS = ("day", "week", "month")
+
 
 def parse_user_date(user_date: str):
     """
@@ -13,6 +16,57 @@ def parse_user_date(user_date: str):
     return parsed_datetime
 
 
+def date_range(start: datetime, end: datetime, step: str = "month", limit: int = None):
+    """
+    Dates from `start` to `end` included, every day, week or month.
+    Monthly dates keep the day of `start`, or the last day of shorter months.
+    With `limit`, at most that many dates are returned, however far `end` is.
+    Dates stop at the largest date Python can represent.
+    """
+    if step not in DATE_STEPS:
+        raise ValueError(
+            f"Unknown step {step}, expected one of {', '.join(DATE_STEPS)}"
+        )
+    dates = list()
+    months = 0
+    date = start
+    while date <= end and (limit is None or len(dates) < limit):
+        dates.append(date)
+        if step == "month":
+            months += 1
+            year, month = divmod(start.month - 1 + months, 12)
+            year, month = start.year + year, month + 1
+            if year > datetime.max.year:
+                break
+            day = min(start.day, calendar.monthrange(year, month)[1])
+            date = start.replace(year=year, month=month, day=day)
+        else:
+            try:
+                date += timedelta(days=1 if step == "day" else 7)
+            except OverflowError:
+                break
+    return dates
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """
+    Whether an If-None-Match header lists `etag`, i.e. the client already has it.
+    Tags are compared weakly, as If-None-Match requires.
+    """
+    if if_none_match is None:
+        return False
+    etag = _opaque_tag(etag)
+    for tag in if_none_match.split(","):
+        tag = _opaque_tag(tag.strip())
+        if tag in ("*", etag):
+            return True
+    return False
+
+
+def _opaque_tag(tag: str) -> str:
+    return tag[len("W/") :] if tag.startswith("W/") else tag
+
+
 def parse_date_from_dataset_url(url: str):
     """
     Given a dataset release url,
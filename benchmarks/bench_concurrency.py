@@ -0,0 +1,122 @@
+"""
+Measure the latency of a cheap endpoint (/version) while heavy occurrence scans run
+on the same worker, to check that scans do not block the event loop.
+
+The application is called directly through ASGI on a generated dataset, so no server
+or network is involved.
+
+Usage: python benchmarks/bench_concurrency.py [--scans 8] [--probes 200] [dataset options]
+(see generate_dataset.py for the dataset options)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from pathlib import Path
+import statistics
+import sys
+import tempfile
+import time
+
+from generate_dataset import add_arguments, generate_workdir
+
+
+async def call(app, method: str, path: str):
+    """
+    Send a request to an ASGI application and return its status and duration
+    """
+    path, _, query_string = path.partition("?")
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": method,
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "scheme": "http",
+        "query_string": query_string.encode(),
+        "headers": [(b"host", b"benchmark")],
+        "client": ("127.0.0.1", 0),
+        "server": ("benchmark", 80),
+    }
+    status = dict()
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    start = time.perf_counter()
+    await app(scope, receive, send)
+    return status.get("code"), time.perf_counter() - start
+
+
+async def probe(app, probes: int, interval: float) -> list:
+    """
+    Latencies of `probes` requests to /version, sent every `interval` seconds
+    """
+    latencies = []
+    for _ in range(probes):
+        _, duration = await call(app, "GET", "/version")
+        latencies.append(duration)
+        await asyncio.sleep(interval)
+    return latencies
+
+
+def summarize(latencies: list) -> dict:
+    """
+    Median and 99th percentile latencies in milliseconds
+    """
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "p50_ms": round(statistics.median(latencies) * 1000, 2),
+        "p99_ms": round(quantiles[98] * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+async def run(app, scans: int, probes: int, interval: float) -> dict:
+    """
+    Probe /version alone, then while `scans` distinct scans run
+    """
+    # build the catalog and content hashes first, as done at startup
+    await call(app, "GET", "/dedup_stats/v1/")
+    idle = await probe(app, probes, interval)
+    # regexes cannot use the term index, and distinct terms are neither cached nor coalesced
+    heavy = [
+        asyncio.ensure_future(call(app, "GET", f"/all_occurences/v1/cookie{n}s?"))
+        for n in range(scans)
+    ]
+    loaded = await probe(app, probes, interval)
+    scan_durations = [duration for _, duration in await asyncio.gather(*heavy)]
+    return {
+        "idle": summarize(idle),
+        "during_scans": summarize(loaded),
+        "scan_max_s": round(max(scan_durations), 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_arguments(parser)
+    parser.add_argument("--scans", type=int, default=8)
+    parser.add_argument("--probes", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.01)
+    args = parser.parse_args()
+
+    app_directory = Path(__file__).resolve().parent.parent / "app"
+    with tempfile.TemporaryDirectory() as directory:
+        generate_workdir(directory, args)
+        os.chdir(directory)
+        sys.path.append(str(app_directory))
+        import main as api  # pylint: disable=import-outside-toplevel,import-error
+
+        results = asyncio.run(run(api.app, args.scans, args.probes, args.interval))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
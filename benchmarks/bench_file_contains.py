@@ -0,0 +1,97 @@
+"""
+Compare the throughput of the text (line by line) and memory-mapped (bytes) backends
+of CGUsParser._file_contains.
+
+Usage: python benchmarks/bench_file_contains.py [--files 200] [--size 100000] [--repeat 3]
+"""
+
+import argparse
+from pathlib import Path
+import random
+import re
+import sys
+import tempfile
+import time
+
+sys.path.append("./app/")
+
+from scanner import (
+    compile_bytes_patterns,
+    mmap_contains,
+)  # pylint: disable=wrong-import-position
+
+WORDS = (
+    "conditions utilisation données personnelles service compte contenu "
+    "terms service account content privacy policy user information café élève"
+).split()
+
+
+def text_contains(file_path: Path, regex_term) -> bool:
+    """
+    The text backend, as implemented before the bytes backend
+    """
+    with open(file_path, "r") as file:
+        for line in file:
+            if regex_term.search(line):
+                return True
+    return False
+
+
+def generate_files(directory: Path, files: int, size: int) -> list:
+    """
+    Write `files` markdown-like files of about `size` characters
+    """
+    random_generator = random.Random(0)
+    paths = []
+    for number in range(files):
+        lines = []
+        length = 0
+        while length < size:
+            line = " ".join(random_generator.choices(WORDS, k=12))
+            lines.append(line)
+            length += len(line) + 1
+        path = directory / f"{number}.md"
+        path.write_text("\n".join(lines))
+        paths.append(path)
+    return paths
+
+
+def measure(function, paths: list, repeat: int) -> float:
+    """
+    Best time to run `function` on every path
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for path in paths:
+            function(path)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--terms", default="rgpd,cookies")
+    args = parser.parse_args()
+
+    regex_term = re.compile(args.terms.replace(",", "|"), re.IGNORECASE)
+    bytes_terms = compile_bytes_patterns(args.terms)
+    with tempfile.TemporaryDirectory() as directory:
+        paths = generate_files(Path(directory), args.files, args.size)
+        total_bytes = sum(path.stat().st_size for path in paths)
+        for name, function in [
+            ("text", lambda path: text_contains(path, regex_term)),
+            ("mmap", lambda path: mmap_contains(path, bytes_terms)),
+        ]:
+            duration = measure(function, paths, args.repeat)
+            print(
+                f"{name}: {total_bytes / duration / 1e6:8.1f} MB/s "
+                f"({total_bytes / 1e6:.1f} MB in {duration:.3f}s)"
+            )
+
+
+if __name__ == "__main__":
+    main()
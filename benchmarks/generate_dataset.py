@@ -0,0 +1,199 @@
+"""
+Generate a synthetic dataset in the layout of the real releases:
+<root>/<Service>/<Document Type>/<YYYY-MM-DDTHH-MM-SSZ>.md
+
+Every document starts as random text and changes a little at every version.
+Searched terms can be planted with a given frequency: a term with frequency 0.3
+appears in 30% of the documents, from a random version onwards.
+The same arguments always generate the same dataset.
+
+Usage: python benchmarks/generate_dataset.py ./synthetic_dataset \
+    [--services 100] [--doc-types 3] [--versions 20] [--size 20000] \
+    [--terms rgpd:0.3,cookies:0.8] [--unchanged 0.1]
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+import random
+
+DATASET_DATE_FORMAT = "%Y-%m-%dT%H-%M-%SZ"
+DOC_TYPES = [
+    "Terms of Service",
+    "Privacy Policy",
+    "Community Guidelines",
+    "Cookies Policy",
+    "Developer Terms",
+    "Commercial Terms",
+    "Acceptable Use Policy",
+    "Copyright Claims Policy",
+]
+WORDS = (
+    "the of and to in you your we our may use service services account content "
+    "information data personal privacy policy terms agreement user users third "
+    "parties provide access rights law including any not with for by this that "
+    "conditions utilisation données personnelles compte contenu société droits "
+    "café élève résiliation responsabilité"
+).split()
+FIRST_DATE = datetime(2018, 1, 1)
+
+
+def parse_terms(terms: str) -> dict:
+    """
+    Parse "term:frequency,..." into a dict
+    """
+    frequencies = dict()
+    for item in filter(None, terms.split(",")):
+        term, _, frequency = item.partition(":")
+        frequencies[term] = float(frequency or 0.5)
+    return frequencies
+
+
+def _paragraph(random_generator: random.Random) -> str:
+    return " ".join(random_generator.choices(WORDS, k=random_generator.randint(20, 80)))
+
+
+def _document_versions(
+    random_generator: random.Random,
+    versions: int,
+    size: int,
+    terms: dict,
+    unchanged: float,
+):
+    """
+    Yield the successive texts of a document
+    """
+    paragraphs = []
+    while sum(len(paragraph) + 2 for paragraph in paragraphs) < size:
+        paragraphs.append(_paragraph(random_generator))
+    # the version from which each term appears, if it ever does
+    appearances = {
+        term: random_generator.randrange(versions)
+        for term, frequency in terms.items()
+        if random_generator.random() < frequency
+    }
+    for number in range(versions):
+        if number and random_generator.random() >= unchanged:
+            paragraphs[random_generator.randrange(len(paragraphs))] = _paragraph(
+                random_generator
+            )
+        text = "\n\n".join(paragraphs)
+        planted = [term for term, first in appearances.items() if number >= first]
+        if planted:
+            text += "\n\n" + " ".join(f"About {term.upper()}." for term in planted)
+        yield text
+
+
+def generate_dataset(
+    root_path,
+    services: int = 100,
+    doc_types: int = 3,
+    versions: int = 20,
+    size: int = 20_000,
+    terms: dict = None,
+    unchanged: float = 0.1,
+    seed: int = 0,
+) -> dict:
+    """
+    Write a synthetic dataset into `root_path` and return its description.
+    Each document has between half and one and a half times `versions` versions
+    of about `size` characters; `unchanged` is the probability that a version
+    has the same text as the previous one.
+    """
+    root_path = Path(root_path)
+    random_generator = random.Random(seed)
+    terms = terms or dict()
+    total_versions = 0
+    total_bytes = 0
+    for service_number in range(services):
+        service = f"Service {service_number:05d}"
+        for doc_type in random_generator.sample(
+            DOC_TYPES, min(doc_types, len(DOC_TYPES))
+        ):
+            directory = root_path / service / doc_type
+            directory.mkdir(parents=True, exist_ok=True)
+            count = random_generator.randint(
+                max(1, versions // 2), max(1, versions * 3 // 2)
+            )
+            date = FIRST_DATE + timedelta(hours=random_generator.randrange(24 * 365))
+            for text in _document_versions(
+                random_generator, count, size, terms, unchanged
+            ):
+                content = text.encode()
+                (directory / f"{date.strftime(DATASET_DATE_FORMAT)}.md").write_bytes(
+                    content
+                )
+                total_versions += 1
+                total_bytes += len(content)
+                date += timedelta(hours=random_generator.randint(1, 24 * 60))
+    return {
+        "services": services,
+        "doc_types": doc_types,
+        "versions_per_document": versions,
+        "size": size,
+        "terms": terms,
+        "unchanged": unchanged,
+        "seed": seed,
+        "total_versions": total_versions,
+        "total_bytes": total_bytes,
+    }
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """
+    Arguments describing a synthetic dataset, shared with the benchmark scripts
+    """
+    parser.add_argument("--services", type=int, default=100)
+    parser.add_argument("--doc-types", type=int, default=3)
+    parser.add_argument("--versions", type=int, default=20)
+    parser.add_argument("--size", type=int, default=20_000)
+    parser.add_argument("--terms", default="rgpd:0.3,cookies:0.8")
+    parser.add_argument("--unchanged", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def generate_from_arguments(root_path, args) -> dict:
+    """
+    Generate the dataset described by parsed `add_arguments` arguments
+    """
+    return generate_dataset(
+        root_path,
+        services=args.services,
+        doc_types=args.doc_types,
+        versions=args.versions,
+        size=args.size,
+        terms=parse_terms(args.terms),
+        unchanged=args.unchanged,
+        seed=args.seed,
+    )
+
+
+def generate_workdir(directory, args) -> dict:
+    """
+    Generate a dataset into `directory`/dataset, with the files the API expects
+    next to it, so that the API run from `directory` serves it
+    """
+    description = generate_from_arguments(Path(directory, "dataset"), args)
+    Path(directory, "latest_dataset.txt").write_text(
+        "https://github.com/OpenTermsArchive/contrib-versions/releases/download/"
+        f"synthetic-{args.seed}/dataset-synthetic-{args.seed}.zip\n"
+    )
+    return description
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("root_path")
+    add_arguments(parser)
+    args = parser.parse_args()
+    description = generate_from_arguments(args.root_path, args)
+    print(
+        f"Generated {description['total_versions']} versions "
+        f"({description['total_bytes'] / 1e6:.1f} MB) in {args.root_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Run the parsers and endpoints of the API against a synthetic dataset, in-process and
+through the ASGI application, and record their latency percentiles, throughput and
+peak memory as JSON, along with the commit they were measured on.
+
+Results of two runs with the same arguments can be compared with --compare.
+
+Usage: python benchmarks/run_benchmarks.py [--repeat 5] [--output results.json] \
+    [--compare baseline.json] [--only first_occurence] [dataset options]
+(see generate_dataset.py for the dataset options)
+"""
+
+import argparse
+import asyncio
+from datetime import datetime
+import gc
+import json
+import os
+from pathlib import Path
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from bench_concurrency import call
+from generate_dataset import add_arguments, generate_workdir, parse_terms
+
+ROOT_PATH = Path(__file__).resolve().parent.parent
+
+
+def git_commit() -> dict:
+    """
+    Commit of the measured code, and whether it had uncommitted changes
+    """
+
+    def git(*args):
+        return subprocess.run(
+            ["git", *args], cwd=ROOT_PATH, capture_output=True, text=True, check=False
+        ).stdout.strip()
+
+    return {
+        "sha": git("rev-parse", "HEAD") or "unknown",
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def summarize(durations: list, peak_bytes: int, processed_bytes: int = None) -> dict:
+    """
+    Latency percentiles in milliseconds, throughput and peak memory of a benchmark
+    """
+    quantiles = statistics.quantiles(durations, n=100, method="inclusive")
+    result = {
+        "runs": len(durations),
+        "mean_ms": round(statistics.mean(durations) * 1000, 3),
+        "p50_ms": round(statistics.median(durations) * 1000, 3),
+        "p95_ms": round(quantiles[94] * 1000, 3),
+        "p99_ms": round(quantiles[98] * 1000, 3),
+        "ops_per_s": round(len(durations) / sum(durations), 2),
+        "peak_memory_mb": round(peak_bytes / 1e6, 2),
+    }
+    if processed_bytes:
+        result["mb_per_s"] = round(
+            processed_bytes / statistics.median(durations) / 1e6, 1
+        )
+    return result
+
+
+def measure(function, repeat: int, processed_bytes: int = None) -> dict:
+    """
+    Time `repeat` calls of `function`, then measure the peak memory of one more call
+    (tracing allocations slows it down, so it is not timed)
+    """
+    function()  # warm up: load the catalog and indexes
+    durations = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return summarize(durations, peak, processed_bytes)
+
+
+def in_process_benchmarks(terms: list, lookups: list, total_bytes: int) -> dict:
+    """
+    Benchmarks calling the parsers and helpers directly.
+    Must be called from the directory holding the dataset.
+    """
+    # pylint: disable=import-outside-toplevel,import-error
+    from catalog import DatasetCatalog, get_catalog
+    from config import CGUS_DATASET_PATH
+    from data_finder import CGUsDataFinder
+    from dataset_parser import (
+        CGUsAllOccurencesParser,
+        CGUsDataset,
+        CGUsFirstOccurenceParser,
+    )
+    from stats import ServiceStats
+
+    def run(parser_class, term, **options):
+        def function():
+            parser = parser_class(Path(CGUS_DATASET_PATH), term, **options)
+            parser.run()
+
+        return function
+
+    def versions_at_dates():
+        for service, doc_type, date in lookups:
+            CGUsDataFinder(service, doc_type).get_version_at_date(date)
+
+    benchmarks = dict()
+    for term in terms:
+        benchmarks[f"first_occurence:{term}"] = (
+            run(CGUsFirstOccurenceParser, term),
+            total_bytes,
+        )
+        benchmarks[f"first_occurence_persistent:{term}"] = (
+            run(CGUsFirstOccurenceParser, term, assume_persistent=True),
+            total_bytes,
+        )
+        benchmarks[f"all_occurences:{term}"] = (
+            run(CGUsAllOccurencesParser, term),
+            total_bytes,
+        )
+        benchmarks[f"all_occurences_regex:{term}"] = (
+            run(CGUsAllOccurencesParser, term, regex=True),
+            total_bytes,
+        )
+    # per-term results: one scan for every term, against one scan per term
+    all_terms = ",".join(terms)
+
+    def each_term(parser_class):
+        def function():
+            for term in terms:
+                run(parser_class, term)()
+
+        return function
+
+    for name, parser_class in [
+        ("first_occurence", CGUsFirstOccurenceParser),
+        ("all_occurences", CGUsAllOccurencesParser),
+    ]:
+        benchmarks[f"{name}_per_term:{all_terms}"] = (
+            run(parser_class, all_terms, per_term=True),
+            total_bytes,
+        )
+        benchmarks[f"{name}_each_term:{all_terms}"] = (
+            each_term(parser_class),
+            total_bytes,
+        )
+    benchmarks["catalog"] = (lambda: DatasetCatalog(CGUS_DATASET_PATH), None)
+    benchmarks["get_version_at_date"] = (versions_at_dates, None)
+    benchmarks["list_services"] = (
+        lambda: CGUsDataset(Path(CGUS_DATASET_PATH)).list_all_services_doc_types(),
+        None,
+    )
+    benchmarks["graph_services"] = (
+        lambda: ServiceStats.build(get_catalog(CGUS_DATASET_PATH)).series(),
+        None,
+    )
+    return benchmarks
+
+
+def asgi_benchmarks(terms: list, lookups: list) -> dict:
+    """
+    Benchmarks sending requests to the ASGI application, with an empty query cache.
+    Must be called from the directory holding the dataset.
+    """
+    import main as api  # pylint: disable=import-outside-toplevel,import-error
+
+    def get(path, clear_cache=False):
+        def function():
+            if clear_cache:
+                api.query_cache.clear()
+            status, _ = asyncio.run(call(api.app, "GET", path))
+            assert status == 200, f"{path} answered {status}"
+
+        return function
+
+    service, doc_type, date = lookups[0]
+    benchmarks = {
+        "GET /version": get("/version"),
+        "GET /list_services/v1/": get("/list_services/v1/"),
+        "GET /graph_services/v1/": get("/graph_services/v1/"),
+        "GET /get_version_at_date/v1/": get(
+            f"/get_version_at_date/v1/{service}/{doc_type}/{date:%Y-%m-%d}"
+        ),
+    }
+    for term in terms:
+        benchmarks[f"GET /first_occurence/v1/{term}"] = get(
+            f"/first_occurence/v1/{term}", clear_cache=True
+        )
+        benchmarks[f"GET /all_occurences/v1/{term}"] = get(
+            f"/all_occurences/v1/{term}", clear_cache=True
+        )
+    return {name: (function, None) for name, function in benchmarks.items()}
+
+
+def random_lookups(dataset_path: Path, count: int, seed: int) -> list:
+    """
+    (service, doc_type, date) lookups spread over the dataset
+    """
+    random_generator = random.Random(seed)
+    documents = sorted(
+        (service.name, doc_type.name)
+        for service in dataset_path.iterdir()
+        for doc_type in service.iterdir()
+    )
+    return [
+        (
+            *random_generator.choice(documents),
+            datetime(random_generator.randint(2018, 2022), 6, 1),
+        )
+        for _ in range(count)
+    ]
+
+
+def compare(baseline: dict, results: dict):
+    """
+    Print the median latency of each benchmark against a baseline run
+    """
+    print(f"{'benchmark':<45} {'baseline':>10} {'current':>10} {'ratio':>7}")
+    for name, result in results["results"].items():
+        if name not in baseline["results"]:
+            continue
+        before = baseline["results"][name]["p50_ms"]
+        after = result["p50_ms"]
+        print(f"{name:<45} {before:>8.2f}ms {after:>8.2f}ms {after / before:>6.2f}x")
+    if baseline["dataset"] != results["dataset"]:
+        print("Warning: the runs used different datasets", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    add_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--lookups", type=int, default=100)
+    parser.add_argument(
+        "--only", default="", help="only run benchmarks containing this"
+    )
+    parser.add_argument("--output", help="file to write the results to")
+    parser.add_argument("--compare", help="results of a previous run to compare with")
+    args = parser.parse_args()
+
+    terms = list(parse_terms(args.terms)) + ["absent"]
+    with tempfile.TemporaryDirectory() as directory:
+        description = generate_workdir(directory, args)
+        os.chdir(directory)
+        sys.path.append(str(ROOT_PATH / "app"))
+        lookups = random_lookups(Path("dataset"), args.lookups, args.seed)
+        benchmarks = {
+            f"in_process {name}": benchmark
+            for name, benchmark in in_process_benchmarks(
+                terms, lookups, description["total_bytes"]
+            ).items()
+        }
+        benchmarks.update(
+            {
+                f"asgi {name}": benchmark
+                for name, benchmark in asgi_benchmarks(terms, lookups).items()
+            }
+        )
+        measured = dict()
+        for name, (function, processed_bytes) in benchmarks.items():
+            if args.only in name:
+                measured[name] = measure(function, args.repeat, processed_bytes)
+                print(f"{name}: {measured[name]['p50_ms']:.2f}ms", file=sys.stderr)
+
+    results = {
+        "commit": git_commit(),
+        "date": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "environment": {
+            name: os.environ[name]
+            for name in ["SCAN_WORKERS", "SCAN_CHUNK_SIZE", "JOB_WORKERS"]
+            if name in os.environ
+        },
+        "dataset": description,
+        "max_rss_mb": round(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3, 1
+        ),
+        "results": measured,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+    if args.compare:
+        compare(json.loads(Path(args.compare).read_text()), results)
+    elif not args.output:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
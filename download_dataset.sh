@@ -1,7 +1,74 @@
 #!/bin/bash
+# Install the latest dataset release without disturbing the running API:
+# the release is unpacked and indexed in datasets/<release>, then the `dataset`
+# symlink is switched to it in one atomic rename.
+# The previous release is kept, so that requests still reading it can finish.
+set -o pipefail
+
+lock_file=dataset.updating
+if ! (set -o noclobber; echo $$ > "$lock_file") 2>/dev/null; then
+  echo "Another update is running (pid $(cat "$lock_file")), exiting"
+  exit 0
+fi
+trap 'rm -rf "$staging_dir" dataset.zip dataset.next; rm -f "$lock_file"' EXIT
+
 file_url=$(curl --silent "https://api.github.com/repos/OpenTermsArchive/contrib-versions/releases/latest" | jq '.assets[0].browser_download_url' | sed -E 's/.*"([^"]+)".*/\1/')
-echo "updating" > latest_dataset.txt
+release=$(basename "$file_url" .zip)
+if [ -z "$release" ] || [ "$release" = "null" ]; then
+  echo "ERROR: could not find the latest release" >&2
+  exit 1
+fi
 echo "Downloaded $file_url"
-curl -LJS $file_url -o dataset.zip
-unzip -o dataset.zip && rm -rf dataset && mv dataset-* dataset
-echo $file_url > latest_dataset.txt
+curl -LJSf "$file_url" -o dataset.zip || exit 1
+
+mkdir -p datasets
+app_dir=$([ -d app ] && echo app || echo .)
+python_bin=$(command -v python3 || command -v python)
+staging_dir=$(mktemp -d datasets/.staging-XXXXXX)
+release_dir="datasets/$release"
+# never overwrite a directory which may be served, e.g. when reinstalling a release
+if [ -e "$release_dir" ]; then
+  release_dir="$release_dir-$(date +%s)"
+fi
+# DATASET_BACKEND=packed stores the versions in a single file instead of unpacking them
+if [ "$DATASET_BACKEND" = "packed" ] && [ -f "$app_dir/build_pack.py" ]; then
+  pack_options=$([ "$DATASET_PACK_COMPRESS" = "1" ] && echo --compress)
+  "$python_bin" "$app_dir/build_pack.py" $pack_options dataset.zip "$staging_dir/dataset" || exit 1
+else
+  unzip -q -o dataset.zip -d "$staging_dir" || exit 1
+fi
+mv "$staging_dir"/dataset* "$release_dir" || exit 1
+echo "$file_url" > "$release_dir/.release"
+
+# index the new dataset when the API code is available next to it,
+# updating the indexes of the served release so that only new versions are read
+if [ -f "$app_dir/build_index.py" ]; then
+  index_options=()
+  if [ -d dataset/.index ]; then
+    index_options=(--previous "$(readlink -f dataset)")
+  fi
+  if ! "$python_bin" "$app_dir/build_index.py" "$release_dir" "${index_options[@]}"; then
+    echo "ERROR: could not build the term index, queries will scan the whole dataset" >&2
+  fi
+fi
+
+# datasets installed before releases were staged are a plain directory
+previous_dir=$(readlink dataset)
+if [ -d dataset ] && [ ! -L dataset ]; then
+  previous_dir="datasets/.previous-$(date +%s)"
+  mv dataset "$previous_dir"
+fi
+ln -s "$release_dir" dataset.next && mv -T dataset.next dataset
+echo "$file_url" > latest_dataset.txt.next && mv latest_dataset.txt.next latest_dataset.txt
+echo "Switched dataset to $release_dir"
+
+# keep the current and previous releases only
+for directory in datasets/* datasets/.previous-*; do
+  if [ -d "$directory" ] && [ "$directory" != "$release_dir" ] && [ "$directory" != "$previous_dir" ]; then
+    rm -rf "$directory"
+  fi
+done
+# cached query results are only valid for the previous dataset
+if [ -n "$QUERY_CACHE_DIR" ]; then
+  rm -rf "$QUERY_CACHE_DIR"
+fi
@@ -0,0 +1,76 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+from datetime import datetime
+from pathlib import Path
+import shutil
+import sys
+
+sys.path.append("./app/")
+
+from app.catalog import DatasetCatalog, get_catalog
+
+
+def test_catalog_documents():
+    catalog = DatasetCatalog("tests/test_dataset/")
+    assert set(catalog.documents.keys()) == {"FakeService"}
+    document = catalog.get("FakeService", "Community Guidelines")
+    assert document.dates == [
+        datetime(2020, 11, 9, 17, 30, 22),
+        datetime(2020, 11, 11, 16, 30, 22),
+    ]
+    assert document.path(0) == Path(
+        "tests/test_dataset/FakeService/Community Guidelines/2020-11-09T17-30-22Z.md"
+    )
+
+
+def test_locate_versions():
+    document = DatasetCatalog("tests/test_dataset/").get(
+        "FakeService", "Community Guidelines"
+    )
+    assert document.locate(datetime(2020, 1, 1)) == 0
+    assert document.locate(datetime(2020, 11, 9, 17, 30, 22)) == 0
+    assert document.locate(datetime(2020, 11, 9, 17, 30, 22, 1)) == 1
+    assert document.locate(datetime(2020, 11, 9, 17, 30, 23)) == 1
+    assert document.locate(datetime(2021, 1, 1)) == 2
+    assert document.date(1) == datetime(2020, 11, 11, 16, 30, 22)
+
+
+def test_catalog_missing_document():
+    catalog = DatasetCatalog("tests/test_dataset/")
+    assert catalog.get("FakeService", "Terms of Service") is None
+    assert catalog.get("OtherService", "Community Guidelines") is None
+
+
+def test_catalog_ignores_files_outside_layout():
+    catalog = DatasetCatalog("tests/test_dataset/")
+    assert catalog.count_versions() == 2
+    assert all(
+        path.name != "FAKE_README.md" for _, _, _, path in catalog.iter_versions()
+    )
+
+
+def test_get_catalog_is_shared():
+    assert get_catalog("tests/test_dataset/") is get_catalog("tests/test_dataset")
+
+
+def test_get_catalog_follows_a_switched_symlink(tmp_path):
+    for release in ["first", "second"]:
+        shutil.copytree("tests/test_dataset", tmp_path / release)
+        (tmp_path / release / ".release").write_text(f"{release}\n")
+    (tmp_path / "second" / "FakeService" / "Community Guidelines").rename(
+        tmp_path / "second" / "FakeService" / "Terms of Service"
+    )
+    link = tmp_path / "dataset"
+    link.symlink_to(tmp_path / "first")
+    first = get_catalog(link)
+    assert first.release == "first"
+    assert get_catalog(link) is first
+
+    (tmp_path / "dataset.next").symlink_to(tmp_path / "second")
+    (tmp_path / "dataset.next").replace(link)
+    second = get_catalog(link)
+    assert second.release == "second"
+    assert second.generation > first.generation
+    assert second.get("FakeService", "Terms of Service") is not None
+    # requests which started on the first release keep reading its directory
+    assert first.root_path == (tmp_path / "first").resolve()
+    assert all(path.exists() for *_, path in first.iter_versions())
@@ -0,0 +1,62 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+import asyncio
+import gzip
+import sys
+
+sys.path.append("./app/")
+
+from app.compression import CompressionMiddleware
+
+BODY = b"terms " * 1000
+
+
+async def endpoint(scope, receive, send):
+    await send(
+        {
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"text/plain")],
+        }
+    )
+    for _ in range(2):
+        await send({"type": "http.response.body", "body": BODY, "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+
+def request(path: str, accept_encoding: str = "gzip") -> tuple:
+    messages = list()
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "path": path,
+        "headers": [(b"accept-encoding", accept_encoding.encode())],
+    }
+    middleware = CompressionMiddleware(endpoint, paths=("/get_version_at_date/",))
+    asyncio.run(middleware(scope, None, send))
+    headers = {
+        key.decode(): value.decode() for key, value in messages[0].get("headers", [])
+    }
+    body = b"".join(message.get("body", b"") for message in messages[1:])
+    return headers, body, len(messages) - 1
+
+
+def test_compressed_routes_vary_by_encoding():
+    headers, body, _ = request("/get_version_at_date/v1/A/B/2020-01-01")
+    assert headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding"
+    assert gzip.decompress(body) == BODY * 2
+    headers, body, _ = request("/get_version_at_date/v1/A/B/2020-01-01", "identity")
+    assert "content-encoding" not in headers
+    assert headers["vary"] == "Accept-Encoding"
+    assert body == BODY * 2
+
+
+def test_other_routes_are_streamed_as_is():
+    headers, body, chunks = request("/all_occurences/v1/privacy")
+    assert "content-encoding" not in headers
+    assert "vary" not in headers
+    assert body == BODY * 2
+    assert chunks == 3
@@ -0,0 +1,50 @@
+# pylint: disable=missing-function-docstring,wrong-import-position,redefined-outer-name
+import sys
+
+sys.path.append("./app/")
+
+import pytest
+
+from app.build_index import build_indexes
+from app.catalog import DatasetCatalog
+from app.content_hashes import ContentHashes, content_hashes_path, load_content_hashes
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    directory = tmp_path / "FakeService" / "Terms of Service"
+    directory.mkdir(parents=True)
+    for day, text in enumerate(["one", "one", "two", "one"], 1):
+        (directory / f"2021-01-0{day}T00-00-00Z.md").write_text(text)
+    return tmp_path
+
+
+def test_groups(dataset):
+    hashes = ContentHashes.build(DatasetCatalog(dataset))
+    assert sorted(hashes.groups().values()) == [[0, 1, 3], [2]]
+    assert hashes.digest(0) == hashes.digest(3) != hashes.digest(2)
+
+
+def test_stats(dataset):
+    stats = ContentHashes.build(DatasetCatalog(dataset)).stats()
+    assert stats["versions"] == 4
+    assert stats["distinct_contents"] == 2
+    assert stats["duplicate_versions"] == 2
+    assert stats["total_bytes"] == 12
+    assert stats["distinct_bytes"] == 6
+    assert stats["saved_ratio"] == 0.5
+
+
+def test_persisted_hashes_are_loaded(dataset):
+    build_indexes(dataset)
+    assert content_hashes_path(dataset).exists()
+    hashes = load_content_hashes(DatasetCatalog(dataset))
+    assert len(hashes.groups()) == 2
+
+
+def test_stale_hashes_are_rebuilt(dataset):
+    build_indexes(dataset)
+    (dataset / "FakeService" / "Terms of Service" / "2021-01-03T00-00-00Z.md").unlink()
+    hashes = load_content_hashes(DatasetCatalog(dataset))
+    assert len(hashes) == 3
+    assert len(hashes.groups()) == 1
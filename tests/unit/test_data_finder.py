@@ -0,0 +1,135 @@
+# pylint: disable=missing-function-docstring,wrong-import-position,redefined-outer-name
+from datetime import datetime
+import shutil
+import sys
+
+sys.path.append("./app/")
+
+import pytest
+
+from app import data_finder
+from app.content_hashes import get_content_hashes
+from app.data_finder import CGUsDataFinder
+from app.text_cache import TextCache
+
+FIRST_VERSION = datetime(2020, 11, 9, 17, 30, 22)
+SECOND_VERSION = datetime(2020, 11, 11, 16, 30, 22)
+
+
+@pytest.fixture
+def finder(monkeypatch):
+    monkeypatch.setattr(data_finder, "CGUS_DATASET_PATH", "tests/test_dataset/")
+    # as in a worker which finished warming up the dataset
+    get_content_hashes(data_finder.get_catalog("tests/test_dataset/"))
+    return CGUsDataFinder("FakeService", "Community Guidelines")
+
+
+def test_version_before_first(finder):
+    around = finder._get_versions_around_date(datetime(2020, 1, 1))
+    assert around == {"version_at_date": None, "next_version": FIRST_VERSION}
+
+
+def test_version_between(finder):
+    version = finder.get_version_at_date(datetime(2020, 11, 10))
+    assert version["version_at_date"] == FIRST_VERSION.isoformat()
+    assert version["next_version"] == SECOND_VERSION.isoformat()
+    assert version["data"].startswith("Community Guidelines")
+
+
+def test_version_after_last(finder):
+    version = finder.get_version_at_date(datetime(2021, 1, 1))
+    assert version["version_at_date"] == SECOND_VERSION.isoformat()
+    assert version["next_version"] is False
+
+
+def test_version_at_exact_date(finder):
+    around = finder._get_versions_around_date(FIRST_VERSION)
+    assert around == {"version_at_date": None, "next_version": FIRST_VERSION}
+    around = finder._get_versions_around_date(FIRST_VERSION.replace(microsecond=1))
+    assert around == {"version_at_date": FIRST_VERSION, "next_version": SECOND_VERSION}
+
+
+def test_versions_at_dates_keeps_order(finder):
+    dates = [datetime(2021, 1, 1), datetime(2020, 1, 1), datetime(2020, 11, 10)]
+    versions = finder.get_versions_at_dates(dates)
+    assert [version["date"] for version in versions] == [
+        date.isoformat() for date in dates
+    ]
+    assert [version["version_at_date"] for version in versions] == [
+        SECOND_VERSION.isoformat(),
+        False,
+        FIRST_VERSION.isoformat(),
+    ]
+
+
+def test_path_outside_dataset(monkeypatch):
+    monkeypatch.setattr(data_finder, "CGUS_DATASET_PATH", "tests/test_dataset/")
+    with pytest.raises(Exception, match="is not in the dataset directory"):
+        CGUsDataFinder("..", "unit")
+
+
+def test_find_versions_returns_each_content_once(finder):
+    lookups = [
+        ("FakeService", "Community Guidelines", datetime(2020, 11, 10)),
+        ("FakeService", "Community Guidelines", datetime(2020, 1, 1)),
+        ("FakeService", "Community Guidelines", datetime(2020, 11, 10, 12)),
+        ("FakeService", "Community Guidelines", datetime(2021, 1, 1)),
+    ]
+    result = data_finder.find_versions(lookups)
+    versions = result["versions"]
+    assert [version["date"] for version in versions] == [
+        date.isoformat() for _, _, date in lookups
+    ]
+    assert versions[0]["content"] == versions[2]["content"]
+    assert versions[1]["content"] is None
+    assert set(result["contents"]) == {versions[0]["content"], versions[3]["content"]}
+    assert result["contents"][versions[0]["content"]] == (
+        finder.get_version_at_date(datetime(2020, 11, 10))["data"]
+    )
+
+
+def test_find_versions_without_data(finder):
+    lookups = [("FakeService", "Community Guidelines", datetime(2020, 11, 10))]
+    result = data_finder.find_versions(lookups, include_data=False)
+    assert "contents" not in result
+    assert result["versions"][0]["version_at_date"] == FIRST_VERSION.isoformat()
+
+
+def test_find_versions_of_unknown_document(finder):
+    with pytest.raises(Exception):
+        data_finder.find_versions([("FakeService", "Unknown", datetime(2020, 1, 1))])
+
+
+def test_texts_are_read_once_across_requests(finder, monkeypatch):
+    monkeypatch.setattr(data_finder, "text_cache", TextCache())
+    reads = list()
+    original = finder._read
+    monkeypatch.setattr(
+        finder, "_read", lambda index: reads.append(index) or original(index)
+    )
+    version = finder.get_version_at_date(datetime(2021, 1, 1))
+    result = data_finder.find_versions(
+        [("FakeService", "Community Guidelines", datetime(2021, 1, 1))]
+    )
+    assert finder.get_version_at_date(datetime(2021, 1, 1)) == version
+    assert list(result["contents"].values()) == [version["data"]]
+    assert reads == [1]
+
+
+def test_version_etag(finder):
+    etag = finder.version_etag(datetime(2020, 11, 10))
+    assert etag.startswith('W/"') and etag.endswith('"')
+    assert finder.version_etag(datetime(2020, 11, 10)) == etag
+    assert finder.version_etag(datetime(2021, 1, 1)) != etag
+
+
+def test_versions_found_before_content_hashes_are_ready(finder, tmp_path, monkeypatch):
+    shutil.copytree("tests/test_dataset", tmp_path / "dataset")
+    monkeypatch.setattr(data_finder, "CGUS_DATASET_PATH", str(tmp_path / "dataset"))
+    monkeypatch.setattr(data_finder, "text_cache", TextCache())
+    unready = CGUsDataFinder("FakeService", "Community Guidelines")
+    assert unready.content_hashes is None
+    dates = [datetime(2020, 1, 1), datetime(2020, 11, 10), datetime(2021, 1, 1)]
+    assert unready.get_versions_at_dates(dates) == finder.get_versions_at_dates(dates)
+    assert unready.find_versions_at_dates(dates) == finder.find_versions_at_dates(dates)
+    assert unready.version_etag(dates[1]) == finder.version_etag(dates[1])
@@ -7,10 +7,12 @@ sys.path.append("./app/")
 
 import pytest
 
+from app.build_index import build_indexes
 from app.dataset_parser import (
     CGUsDataset,
     CGUsFirstOccurenceParser,
     CGUsAllOccurencesParser,
+    CGUsSnippetsParser,
 )
 
 # test CGUsDataset
@@ -109,3 +111,260 @@ def test_run_not_found_all():
     assert not output["FakeService"]["Community Guidelines"][
         datetime(2020, 11, 11, 16, 30, 22)
     ]
+
+
+# test early exit of CGUsFirstOccurenceParser
+
+
+@pytest.fixture
+def history(tmp_path):
+    directory = tmp_path / "FakeService" / "Terms of Service"
+    directory.mkdir(parents=True)
+    for day in range(1, 10):
+        text = f"Version {day}. " + ("We use cookies." if day >= 4 else "Hello.")
+        (directory / f"2021-01-0{day}T00-00-00Z.md").write_text(text)
+    return tmp_path
+
+
+def count_reads(parser, monkeypatch):
+    reads = []
+    file_contains = parser._file_contains
+
+    def counting_file_contains(path):
+        reads.append(path)
+        return file_contains(path)
+
+    monkeypatch.setattr(parser, "_file_contains", counting_file_contains)
+    parser.run()
+    return len(reads)
+
+
+def test_first_occurence_stops_at_first_match(history, monkeypatch):
+    parser = CGUsFirstOccurenceParser(history, "cookies")
+    assert count_reads(parser, monkeypatch) == 4
+    assert parser.to_dict()["FakeService"]["Terms of Service"] == datetime(2021, 1, 4)
+
+
+def test_first_occurence_assume_persistent(history, monkeypatch):
+    parser = CGUsFirstOccurenceParser(history, "cookies", assume_persistent=True)
+    assert count_reads(parser, monkeypatch) < 4
+    assert parser.to_dict()["FakeService"]["Terms of Service"] == datetime(2021, 1, 4)
+
+
+def test_first_occurence_assume_persistent_not_found(history):
+    parser = CGUsFirstOccurenceParser(history, "Ambanum", assume_persistent=True)
+    parser.run()
+    assert not parser.to_dict()["FakeService"]["Terms of Service"]
+
+
+def test_identical_versions_read_once(history, monkeypatch):
+    directory = history / "FakeService" / "Terms of Service"
+    for day in range(1, 10):
+        (directory / f"2021-01-0{day}T00-00-00Z.md").write_text("Same text.")
+    parser = CGUsAllOccurencesParser(history, "cookies")
+    assert count_reads(parser, monkeypatch) == 1
+    assert not any(parser.to_dict()["FakeService"]["Terms of Service"].values())
+
+
+# test streaming of CGUsAllOccurencesParser
+
+
+def records_to_output(records):
+    output = dict()
+    for service, document_type, version_date, contains in records:
+        output.setdefault(service, dict()).setdefault(document_type, dict())[
+            version_date
+        ] = contains
+    return output
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_iter_records_matches_run(history, indexed):
+    if indexed:
+        build_indexes(history)
+    parser = CGUsAllOccurencesParser(history, "cookies")
+    records = list(parser.iter_records())
+    assert len(records) == 9
+    parser.run()
+    assert records_to_output(records) == parser.to_dict()
+
+
+# test per-term results
+
+
+def test_first_occurence_per_term(history, monkeypatch):
+    parser = CGUsFirstOccurenceParser(
+        history, "cookies,hello,version 7,absent", per_term=True
+    )
+    # reads every version since "absent" is never found
+    assert count_reads(parser, monkeypatch) == 9
+    assert parser.to_dict()["FakeService"]["Terms of Service"] == {
+        "cookies": datetime(2021, 1, 4),
+        "hello": datetime(2021, 1, 1),
+        "version 7": datetime(2021, 1, 7),
+        "absent": False,
+    }
+
+
+def test_first_occurence_per_term_stops_when_all_found(history, monkeypatch):
+    parser = CGUsFirstOccurenceParser(history, "cookies,hello", per_term=True)
+    assert count_reads(parser, monkeypatch) == 4
+
+
+def test_first_occurence_per_term_assume_persistent(history):
+    parser = CGUsFirstOccurenceParser(
+        history, "cookies,version,absent", assume_persistent=True, per_term=True
+    )
+    parser.run()
+    assert parser.to_dict()["FakeService"]["Terms of Service"] == {
+        "cookies": datetime(2021, 1, 4),
+        "version": datetime(2021, 1, 1),
+        "absent": False,
+    }
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_all_occurences_per_term(history, indexed):
+    if indexed:
+        build_indexes(history)
+    parser = CGUsAllOccurencesParser(history, "cookies,hello,absent", per_term=True)
+    parser.run()
+    output = parser.to_dict()["FakeService"]["Terms of Service"]
+    assert output[datetime(2021, 1, 2)] == ["hello"]
+    assert output[datetime(2021, 1, 5)] == ["cookies"]
+    assert records_to_output(parser.iter_records()) == parser.to_dict()
+
+
+def test_regex_option_gives_the_same_results(history):
+    literal = CGUsAllOccurencesParser(history, "cookies,hello", per_term=True)
+    regex = CGUsAllOccurencesParser(history, "cookies,hello", per_term=True, regex=True)
+    literal.run()
+    regex.run()
+    assert regex.bytes_terms is None
+    assert regex.to_dict() == literal.to_dict()
+
+
+# test query filters
+
+
+@pytest.fixture
+def two_services(history):
+    directory = history / "OtherService" / "Privacy Policy"
+    directory.mkdir(parents=True)
+    for day in range(1, 10):
+        (directory / f"2021-01-0{day}T00-00-00Z.md").write_text("We use cookies.")
+    return history
+
+
+def test_filters_restrict_documents_before_reading(two_services, monkeypatch):
+    parser = CGUsAllOccurencesParser(
+        two_services,
+        "cookies",
+        services=["FakeService"],
+        doc_types=["Terms of Service"],
+    )
+    assert count_reads(parser, monkeypatch) == 9
+    assert list(parser.to_dict()) == ["FakeService"]
+
+
+def test_date_range_restricts_versions(two_services, monkeypatch):
+    parser = CGUsAllOccurencesParser(
+        two_services,
+        "cookies",
+        services=["FakeService"],
+        start=datetime(2021, 1, 3),
+        end=datetime(2021, 1, 5, 23, 59, 59, 59),
+    )
+    assert count_reads(parser, monkeypatch) == 3
+    assert parser.to_dict()["FakeService"]["Terms of Service"] == {
+        datetime(2021, 1, 3): False,
+        datetime(2021, 1, 4): True,
+        datetime(2021, 1, 5): True,
+    }
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_filters_with_iter_records(two_services, indexed):
+    if indexed:
+        build_indexes(two_services)
+    parser = CGUsAllOccurencesParser(
+        two_services, "hello", doc_types=["Privacy Policy"], end=datetime(2021, 1, 2)
+    )
+    records = list(parser.iter_records())
+    assert len(records) == 1
+    parser.run()
+    assert records_to_output(records) == parser.to_dict()
+
+
+def test_first_occurence_in_date_range(two_services):
+    parser = CGUsFirstOccurenceParser(two_services, "hello", start=datetime(2021, 1, 3))
+    parser.run()
+    assert parser.to_dict() == {
+        "FakeService": {"Terms of Service": datetime(2021, 1, 3)},
+        "OtherService": {"Privacy Policy": False},
+    }
+
+
+# test CGUsSnippetsParser
+
+
+def snippet_pages(root_path, terms, **options):
+    pages, cursor = list(), 0
+    while cursor is not None:
+        parser = CGUsSnippetsParser(root_path, terms, cursor=cursor, **options)
+        parser.run()
+        pages.append(parser.to_dict()["versions"])
+        cursor = parser.to_dict()["next_cursor"]
+    return pages
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_snippets_pages_cover_every_match(two_services, indexed):
+    if indexed:
+        build_indexes(two_services)
+    (everything,) = snippet_pages(two_services, "cookies", limit=100)
+    pages = snippet_pages(two_services, "cookies", limit=4)
+    assert [len(page) for page in pages] == [4, 4, 4, 3]
+    assert sum(pages, []) == everything
+    assert [version["service"] for version in everything] == 6 * ["FakeService"] + 9 * [
+        "OtherService"
+    ]
+    for version in everything:
+        path = two_services / version["service"] / version["doc_type"]
+        date = datetime.fromisoformat(version["date"])
+        text = (path / f"{date.strftime('%Y-%m-%dT%H-%M-%SZ')}.md").read_text()
+        (match,) = version["matches"]
+        assert text[match["offset"] :][: match["length"]] == "cookies"
+        assert text[match["snippet_offset"] :].startswith(match["snippet"])
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_snippets_read_each_candidate_content_once(two_services, indexed, monkeypatch):
+    if indexed:
+        build_indexes(two_services)
+    parser = CGUsSnippetsParser(two_services, "cookies")
+    reads = []
+    find_matches = parser._find_matches
+    monkeypatch.setattr(
+        parser, "_find_matches", lambda path: reads.append(path) or find_matches(path)
+    )
+    parser.run()
+    assert len(parser.to_dict()["versions"]) == 15
+    # without the index, the first three versions of FakeService are read too
+    assert len(reads) == (7 if indexed else 10)
+
+
+def test_snippets_context_and_matches_limit(tmp_path):
+    directory = tmp_path / "FakeService" / "Terms of Service"
+    directory.mkdir(parents=True)
+    (directory / "2021-01-01T00-00-00Z.md").write_text(
+        "We use Cookies, cookies, COOKIES."
+    )
+    parser = CGUsSnippetsParser(tmp_path, "cookies", context=4, max_matches=2)
+    parser.run()
+    (version,) = parser.to_dict()["versions"]
+    assert version["n_matches"] == 3
+    assert version["matches"] == [
+        {"offset": 7, "length": 7, "snippet_offset": 3, "snippet": "use Cookies, co"},
+        {"offset": 16, "length": 7, "snippet_offset": 12, "snippet": "es, cookies, CO"},
+    ]
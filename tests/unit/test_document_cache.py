@@ -0,0 +1,112 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import sys
+from threading import Thread
+
+import pytest
+import requests
+
+sys.path.append("./app/")
+
+from app.document_cache import RemoteDocumentCache
+
+
+class DocumentServer(ThreadingHTTPServer):
+    """
+    Local stand-in for GitHub, serving a JSON document with an ETag
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), DocumentHandler)
+        self.document = {"Terms of Service": {"topic": "terms"}}
+        self.version = 1
+        self.requests = list()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/termsTypes.json"
+
+
+class DocumentHandler(BaseHTTPRequestHandler):
+    def do_GET(self):  # pylint: disable=invalid-name
+        self.server.requests.append(dict(self.headers))
+        etag = f'"v{self.server.version}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(self.server.document).encode()
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@pytest.fixture(name="server")
+def fixture_server():
+    server = DocumentServer()
+    Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_downloads_when_there_is_no_copy(server, tmp_path):
+    cache = RemoteDocumentCache(server.url, tmp_path / "types.json")
+    assert cache.get() == server.document
+    assert len(server.requests) == 1
+    assert json.loads((tmp_path / "types.json").read_text())["etag"] == '"v1"'
+
+
+def test_fresh_copy_is_served_without_requests(server, tmp_path):
+    RemoteDocumentCache(server.url, tmp_path / "types.json").get()
+    cache = RemoteDocumentCache(server.url, tmp_path / "types.json", max_age=3600)
+    assert cache.get() == server.document
+    assert len(server.requests) == 1
+
+
+def test_unchanged_document_is_not_downloaded_again(server, tmp_path):
+    cache = RemoteDocumentCache(server.url, tmp_path / "types.json")
+    cache.get()
+    cache.refresh()
+    assert server.requests[1]["If-None-Match"] == '"v1"'
+    assert cache.document == server.document
+
+
+def test_stale_copy_is_served_while_refreshed(server, tmp_path):
+    cache = RemoteDocumentCache(server.url, tmp_path / "types.json", max_age=0)
+    previous = cache.get()
+    server.document = {"Privacy Policy": {"topic": "privacy"}}
+    server.version = 2
+    assert cache.get() == previous
+    cache.refresh_future.result()
+    assert cache.document == server.document
+    # the refreshed copy is used after a restart
+    restarted = RemoteDocumentCache(server.url, tmp_path / "types.json")
+    assert restarted.document == server.document
+    assert restarted.etag == '"v2"'
+
+
+def test_snapshot_is_served_offline(server, tmp_path):
+    RemoteDocumentCache(server.url, tmp_path / "types.json").get()
+    url = server.url
+    server.shutdown()
+    server.server_close()
+    cache = RemoteDocumentCache(url, tmp_path / "types.json", max_age=0, timeout=1)
+    assert cache.get() == {"Terms of Service": {"topic": "terms"}}
+    cache.refresh_future.result()
+    assert cache.get() == {"Terms of Service": {"topic": "terms"}}
+
+
+def test_missing_copy_offline_raises(tmp_path):
+    cache = RemoteDocumentCache(
+        "http://127.0.0.1:9/termsTypes.json", tmp_path / "types.json", timeout=1
+    )
+    with pytest.raises(requests.RequestException):
+        cache.get()
@@ -0,0 +1,23 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+import asyncio
+import sys
+import threading
+
+sys.path.append("./app/")
+
+from app.executors import run_cpu, run_io
+
+
+def test_calls_run_outside_the_event_loop_thread():
+    async def main():
+        loop_thread = threading.get_ident()
+        io_thread = await run_io(threading.get_ident)
+        cpu_thread = await run_cpu(threading.get_ident)
+        return loop_thread, io_thread, cpu_thread
+
+    loop_thread, io_thread, cpu_thread = asyncio.run(main())
+    assert loop_thread not in (io_thread, cpu_thread)
+
+
+def test_arguments_are_forwarded():
+    assert asyncio.run(run_cpu(sorted, [3, 1, 2], reverse=True)) == [3, 2, 1]
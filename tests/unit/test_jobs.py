@@ -0,0 +1,67 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+import asyncio
+import sys
+from threading import Event
+
+import pytest
+
+sys.path.append("./app/")
+
+from app.jobs import JobManager
+
+
+def test_identical_jobs_share_one_computation():
+    manager = JobManager(max_workers=2)
+    release = Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "result"
+
+    first = manager.submit("key", compute)
+    second = manager.submit("key", compute)
+    other = manager.submit("other", lambda: "other result")
+    release.set()
+    assert first is second
+    assert first.future.result(5) == "result"
+    assert other.future.result(5) == "other result"
+    assert len(calls) == 1
+
+
+def test_finished_job_is_not_shared():
+    manager = JobManager(max_workers=1)
+    first = manager.submit("key", lambda: 1)
+    first.future.result(5)
+    second = manager.submit("key", lambda: 2)
+    assert second is not first
+    assert second.future.result(5) == 2
+
+
+def test_job_status_and_result():
+    manager = JobManager(max_workers=1)
+    job = manager.submit("key", lambda: {"a": 1})
+    assert asyncio.run(manager.wait(job)) == {"a": 1}
+    assert manager.get(job.id) is job
+    assert job.to_dict() == {"job_id": job.id, "status": "done", "result": {"a": 1}}
+    assert manager.get("unknown") is None
+
+
+def test_failed_job():
+    manager = JobManager(max_workers=1)
+    job = manager.submit("key", lambda: 1 / 0)
+    with pytest.raises(ZeroDivisionError):
+        asyncio.run(manager.wait(job))
+    assert job.to_dict()["status"] == "failed"
+    assert "division" in job.to_dict()["error"]
+
+
+def test_finished_jobs_are_bounded():
+    manager = JobManager(max_workers=1, max_kept=2)
+    submitted = []
+    for key in range(4):
+        submitted.append(manager.submit(key, lambda key=key: key))
+        submitted[-1].future.result(5)
+    assert manager.get(submitted[0].id) is None
+    assert manager.get(submitted[-1].id) is submitted[-1]
@@ -0,0 +1,121 @@
+# pylint: disable=missing-function-docstring,wrong-import-position,redefined-outer-name
+from datetime import datetime
+import shutil
+import sys
+
+sys.path.append("./app/")
+
+import pytest
+
+from app import data_finder
+from app.build_index import build_indexes
+from app.build_pack import build_pack_from_directory
+from app.catalog import DatasetCatalog, MappedDocumentVersions
+from app.content_hashes import ContentHashes, get_content_hashes
+from app.data_finder import CGUsDataFinder
+from app.mapped_index import MappedIndex, mapped_index_path
+from app.term_index import TermIndex, get_term_index
+
+
+@pytest.fixture(params=["directory", "packed"])
+def mapped_dataset(tmp_path, request):
+    root_path = tmp_path / "dataset"
+    if request.param == "packed":
+        build_pack_from_directory("tests/test_dataset", root_path, compress=True)
+    else:
+        shutil.copytree("tests/test_dataset", root_path)
+    build_indexes(root_path)
+    return root_path
+
+
+def scanned(root_path) -> DatasetCatalog:
+    mapped_index_path(root_path).rename(root_path / "moved.map")
+    try:
+        return DatasetCatalog(root_path)
+    finally:
+        (root_path / "moved.map").rename(mapped_index_path(root_path))
+
+
+def test_catalog_read_from_mapped_index(mapped_dataset, monkeypatch):
+    expected = scanned(mapped_dataset)
+    monkeypatch.setattr(DatasetCatalog, "_scan", pytest.fail)
+    catalog = DatasetCatalog(mapped_dataset)
+    assert catalog.mapped is not None
+    assert all(
+        isinstance(document, MappedDocumentVersions)
+        for document in catalog.iter_documents()
+    )
+    assert list(catalog.iter_versions()) == list(expected.iter_versions())
+    assert catalog.relative_paths() == expected.relative_paths()
+    for document in catalog.iter_documents():
+        other = expected.get(document.service, document.doc_type)
+        assert document.first_version_id == other.first_version_id
+        assert list(document.filenames) == other.filenames
+        assert document.dates == other.dates
+        for date in other.dates:
+            assert document.locate(date) == other.locate(date)
+    for (*_, path), (*_, expected_path) in zip(
+        catalog.iter_versions(), expected.iter_versions()
+    ):
+        assert path.read_bytes() == expected_path.read_bytes()
+
+
+def test_indexes_read_from_mapped_index(mapped_dataset):
+    catalog = DatasetCatalog(mapped_dataset)
+    expected = scanned(mapped_dataset)
+    expected_hashes = ContentHashes.build(expected)
+    expected_index = TermIndex.build(expected, expected_hashes)
+
+    hashes = get_content_hashes(catalog)
+    assert hashes.paths is None
+    assert [hashes.digest(i) for i in range(len(hashes))] == [
+        expected_hashes.digest(i) for i in range(len(expected_hashes))
+    ]
+    assert list(hashes.sizes) == list(expected_hashes.sizes)
+    assert hashes.groups() == expected_hashes.groups()
+
+    index = get_term_index(catalog)
+    assert len(index.postings) == len(expected_index.postings)
+    assert {
+        trigram: list(version_ids) for trigram, version_ids in index.postings.items()
+    } == {
+        trigram: list(version_ids)
+        for trigram, version_ids in expected_index.postings.items()
+    }
+    for terms in ["California", "rgpd", "rgpd,CALIFORNIA", "Ambanum", "r.pd"]:
+        assert index.candidates(terms) == expected_index.candidates(terms)
+
+
+def test_versions_found_with_mapped_index(mapped_dataset, monkeypatch):
+    monkeypatch.setattr(data_finder, "CGUS_DATASET_PATH", str(mapped_dataset))
+    finder = CGUsDataFinder("FakeService", "Community Guidelines")
+    dates = [datetime(2020, 11, 10), datetime(2021, 1, 1)]
+    versions = finder.get_versions_at_dates(dates)
+    monkeypatch.setattr(data_finder, "CGUS_DATASET_PATH", "tests/test_dataset")
+    expected = CGUsDataFinder("FakeService", "Community Guidelines")
+    assert versions == expected.get_versions_at_dates(dates)
+
+
+def test_added_version_invalidates_mapped_index(tmp_path):
+    root_path = tmp_path / "dataset"
+    shutil.copytree("tests/test_dataset", root_path)
+    build_indexes(root_path)
+    assert DatasetCatalog(root_path).mapped is not None
+    (
+        root_path / "FakeService" / "Community Guidelines" / "2021-01-01T00-00-00Z.md"
+    ).write_text("new version")
+    catalog = DatasetCatalog(root_path)
+    assert catalog.mapped is None
+    assert get_term_index(catalog) is None
+
+
+def test_invalid_mapped_index_is_ignored(tmp_path):
+    root_path = tmp_path / "dataset"
+    shutil.copytree("tests/test_dataset", root_path)
+    build_indexes(root_path)
+    mapped_index_path(root_path).write_bytes(b"not an index")
+    with pytest.raises(ValueError):
+        MappedIndex(mapped_index_path(root_path))
+    catalog = DatasetCatalog(root_path)
+    assert catalog.mapped is None
+    assert catalog.count_versions() == 2
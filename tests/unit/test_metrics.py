@@ -0,0 +1,134 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.append("./app/")
+
+from app.metrics import BUCKETS, Metrics, MetricsMiddleware, metrics as registry
+
+
+def test_counters_sum_by_labels():
+    metrics = Metrics("")
+    metrics.inc("scan_files_read_total", parser="A")
+    metrics.inc("scan_files_read_total", 2, parser="A")
+    metrics.inc("scan_files_read_total", parser="B")
+    counters = metrics.collect()["counters"]
+    assert counters[("scan_files_read_total", (("parser", "A"),))] == 3
+    assert counters[("scan_files_read_total", (("parser", "B"),))] == 1
+
+
+def test_histograms_count_values_in_buckets():
+    metrics = Metrics("")
+    metrics.observe("query_scan_duration_seconds", 0.003)
+    metrics.observe("query_scan_duration_seconds", 0.005)
+    metrics.observe("query_scan_duration_seconds", 1000)
+    values = metrics.collect()["histograms"][("query_scan_duration_seconds", ())]
+    assert values[BUCKETS.index(0.005)] == 2
+    assert values[len(BUCKETS)] == 1  # +Inf
+    assert values[-2] == pytest.approx(1000.008)
+    assert values[-1] == 3
+
+
+def test_processes_are_summed_through_the_metrics_directory(tmp_path):
+    first, second = Metrics(tmp_path), Metrics(tmp_path)
+    second.file_name = "other-process.json"
+    first.inc("http_requests_total", route="version", status="200")
+    second.inc("http_requests_total", route="version", status="200")
+    second.observe("http_request_duration_seconds", 0.2, route="version")
+    second.flush()
+    collected = first.collect()
+    assert len(list(tmp_path.glob("*.json"))) == 2
+    assert (
+        collected["counters"][
+            ("http_requests_total", (("route", "version"), ("status", "200")))
+        ]
+        == 2
+    )
+    assert (
+        collected["histograms"][
+            ("http_request_duration_seconds", (("route", "version"),))
+        ][-1]
+        == 1
+    )
+
+
+def test_flushes_are_throttled(tmp_path):
+    metrics = Metrics(tmp_path)
+    metrics.inc("scan_files_read_total")
+    metrics.flush_if_due(interval=60)
+    metrics.inc("scan_files_read_total")
+    metrics.flush_if_due(interval=60)
+    written = Metrics(tmp_path)
+    written.file_name = "reader.json"
+    assert written.collect()["counters"][("scan_files_read_total", ())] == 1
+    metrics.flush_if_due(interval=0)
+    assert written.collect()["counters"][("scan_files_read_total", ())] == 2
+
+
+def test_clear_removes_previous_runs(tmp_path):
+    previous = Metrics(tmp_path)
+    previous.inc("scan_files_read_total")
+    previous.flush()
+    Metrics(tmp_path).clear()
+    assert not list(tmp_path.iterdir())
+    assert Metrics(tmp_path).collect()["counters"] == dict()
+
+
+def test_render_prometheus_text_format():
+    metrics = Metrics("")
+    metrics.inc("query_cache_requests_total", result="hit")
+    metrics.observe("dataset_load_duration_seconds", 0.3, structure="catalog")
+    text = metrics.render()
+    assert "# TYPE query_cache_requests_total counter" in text
+    assert 'query_cache_requests_total{result="hit"} 1' in text
+    assert "# TYPE dataset_load_duration_seconds histogram" in text
+    assert (
+        'dataset_load_duration_seconds_bucket{structure="catalog",le="0.25"} 0' in text
+    )
+    assert (
+        'dataset_load_duration_seconds_bucket{structure="catalog",le="0.5"} 1' in text
+    )
+    assert (
+        'dataset_load_duration_seconds_bucket{structure="catalog",le="+Inf"} 1' in text
+    )
+    assert 'dataset_load_duration_seconds_count{structure="catalog"} 1' in text
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_processes_start_empty():
+    metrics = Metrics("")
+    metrics.inc("scan_files_read_total")
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover
+        metrics.inc("scan_files_read_total")
+        os.write(write, str(metrics.snapshot()["counters"][0][2]).encode())
+        os._exit(0)  # pylint: disable=protected-access
+    os.waitpid(pid, 0)
+    assert os.read(read, 16) == b"1"
+    assert metrics.snapshot()["counters"][0][2] == 1
+
+
+def test_middleware_records_route_and_status(monkeypatch):
+    # only count the requests of this process
+    monkeypatch.setattr(registry, "directory", None)
+
+    async def endpoint(scope, receive, send):
+        scope["endpoint"] = get_version
+        await send({"type": "http.response.start", "status": 404})
+        await send({"type": "http.response.body", "body": b""})
+
+    def get_version():
+        pass
+
+    async def send(message):
+        pass
+
+    middleware = MetricsMiddleware(endpoint)
+    asyncio.run(middleware({"type": "http"}, None, send))
+    assert (
+        'http_requests_total{route="get_version",status="404"} 1' in registry.render()
+    )
@@ -0,0 +1,90 @@
+# pylint: disable=missing-function-docstring,wrong-import-position,redefined-outer-name
+from datetime import datetime
+from pathlib import Path
+import pickle
+import sys
+import zipfile
+
+sys.path.append("./app/")
+
+import pytest
+
+from app import data_finder
+from app.build_index import build_indexes
+from app.build_pack import build_pack_from_directory, build_pack_from_zip
+from app.catalog import DatasetCatalog
+from app.data_finder import CGUsDataFinder
+from app.dataset_parser import CGUsAllOccurencesParser, CGUsFirstOccurenceParser
+from app.packed_store import PackedVersion
+
+
+@pytest.fixture(params=[False, True], ids=["raw", "compressed"])
+def packed(tmp_path, request):
+    root_path = tmp_path / "packed"
+    build_pack_from_directory("tests/test_dataset", root_path, compress=request.param)
+    return root_path
+
+
+def test_packed_catalog_matches_directory(packed):
+    directory = DatasetCatalog("tests/test_dataset")
+    catalog = DatasetCatalog(packed)
+    assert catalog.relative_paths() == directory.relative_paths()
+    for (*version, path), (*packed_version, packed_path) in zip(
+        directory.iter_versions(), catalog.iter_versions()
+    ):
+        assert version == packed_version
+        assert not isinstance(packed_path, Path)
+        assert packed_path.name == path.name
+        assert packed_path.read_bytes() == path.read_bytes()
+        assert packed_path.read_text() == path.read_text()
+
+
+def test_pack_from_zip(tmp_path):
+    archive_path = tmp_path / "dataset.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        for source in Path("tests/test_dataset").rglob("*"):
+            name = Path("dataset-2021-01-01", source.relative_to("tests/test_dataset"))
+            archive.write(source, name.as_posix())
+    build_pack_from_zip(archive_path, tmp_path / "packed")
+    catalog = DatasetCatalog(tmp_path / "packed")
+    assert (
+        catalog.relative_paths()
+        == DatasetCatalog("tests/test_dataset").relative_paths()
+    )
+
+
+def test_packed_version_pickles():
+    version = PackedVersion("versions.pack", 8, 10, False, "2021-01-01T00-00-00Z.md")
+    assert pickle.loads(pickle.dumps(version)) == version
+
+
+@pytest.mark.parametrize("terms", ["rgpd", "California,Ambanum", "rg.d"])
+def test_parsers_read_packed_versions(packed, terms):
+    for parser_class in [CGUsFirstOccurenceParser, CGUsAllOccurencesParser]:
+        expected = parser_class("tests/test_dataset", terms)
+        expected.run()
+        parser = parser_class(packed, terms)
+        parser.run()
+        assert parser.to_dict() == expected.to_dict()
+
+
+def test_indexes_of_packed_dataset(packed):
+    build_indexes(packed)
+    parser = CGUsAllOccurencesParser(packed, "rgpd")
+    parser.run()
+    assert list(parser.to_dict()["FakeService"]["Community Guidelines"].values()) == [
+        False,
+        True,
+    ]
+
+
+def test_finder_reads_packed_versions(packed, monkeypatch):
+    monkeypatch.setattr(data_finder, "CGUS_DATASET_PATH", str(packed))
+    finder = CGUsDataFinder("FakeService", "Community Guidelines")
+    version = finder.get_version_at_date(datetime(2021, 1, 1))
+    expected = (
+        "tests/test_dataset/FakeService/Community Guidelines/2020-11-11T16-30-22Z.md"
+    )
+    assert version["data"] == open(expected).read()
+    with pytest.raises(Exception):
+        CGUsDataFinder("FakeService", "Unknown")
@@ -0,0 +1,87 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+from pathlib import Path
+import sys
+
+sys.path.append("./app/")
+
+from app.dataset_parser import CGUsAllOccurencesParser, CGUsSnippetsParser
+from app.query_cache import QueryCache, normalize_terms, query_key
+
+
+def test_normalize_terms():
+    assert normalize_terms("RGPD,cookies,rgpd") == ("cookies", "rgpd")
+    assert normalize_terms("\\S+,a") == ("\\S+", "a")
+
+
+def test_hits_and_misses():
+    cache = QueryCache(max_entries=2, directory="")
+    computed = []
+    for key in ["a", "b", "a"]:
+        cache.get_or_compute("v1", key, lambda key=key: computed.append(key) or key)
+    assert computed == ["a", "b"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_lru_eviction():
+    cache = QueryCache(max_entries=2, directory="")
+    for key in ["a", "b", "a", "c"]:
+        cache.get_or_compute("v1", key, lambda key=key: key)
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_memory_bounded_by_size():
+    cache = QueryCache(max_entries=10, directory="", max_bytes=2500)
+    for key in ["a", "b", "c"]:
+        cache.get_or_compute("v1", key, lambda: "x" * 1000)
+    assert list(cache.entries) == ["b", "c"]
+    assert 2000 < cache.stats()["bytes"] <= 2500
+    cache.get_or_compute("v1", "large", lambda: "x" * 5000)
+    assert list(cache.entries) == ["b", "c"]
+
+
+def test_new_version_invalidates():
+    cache = QueryCache(max_entries=2, directory="")
+    cache.get_or_compute("v1", "a", lambda: 1)
+    assert cache.get_or_compute("v2", "a", lambda: 2) == 2
+    assert cache.stats()["misses"] == 2
+
+
+def test_disk_tier(tmp_path):
+    QueryCache(directory=tmp_path).get_or_compute("v1", "a", lambda: {"a": 1})
+    restarted = QueryCache(directory=tmp_path)
+    assert restarted.get_or_compute("v1", "a", lambda: None) == {"a": 1}
+    assert restarted.stats()["hits"] == 1
+
+
+def test_disk_tier_drops_other_versions(tmp_path):
+    QueryCache(directory=tmp_path).get_or_compute("v1", "a", lambda: 1)
+    restarted = QueryCache(directory=tmp_path)
+    assert restarted.get_or_compute("v2", "a", lambda: 2) == 2
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_snippets_keyed_by_term_order():
+    cache = QueryCache(directory="")
+    lengths = list()
+    for terms in ["california,california act", "california act,california"]:
+        parser = CGUsSnippetsParser(Path("tests/test_dataset"), terms)
+
+        def compute(parser=parser):
+            parser.run()
+            return parser.to_dict()
+
+        page = cache.get_or_compute(
+            "v1", query_key("occurence_snippets", parser), compute
+        )
+        lengths.append(page["versions"][0]["matches"][0]["length"])
+    assert lengths == [len("california"), len("california act")]
+    assert cache.stats()["misses"] == 2
+
+
+def test_occurences_share_normalized_key():
+    keys = {
+        query_key("all_occurences", CGUsAllOccurencesParser(Path("."), terms))
+        for terms in ["rgpd,cookies", "COOKIES,rgpd"]
+    }
+    assert len(keys) == 1
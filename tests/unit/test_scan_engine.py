@@ -0,0 +1,47 @@
+# pylint: disable=missing-function-docstring,wrong-import-position,redefined-outer-name
+import sys
+
+sys.path.append("./app/")
+
+import pytest
+
+from app.dataset_parser import CGUsAllOccurencesParser, CGUsFirstOccurenceParser
+from app.scan_engine import ScanEngine
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    for service_number in range(3):
+        for doc_type in ["Terms of Service", "Privacy Policy"]:
+            directory = tmp_path / f"Service{service_number}" / doc_type
+            directory.mkdir(parents=True)
+            for day in range(1, 6):
+                text = "We use cookies." if day > service_number + 1 else "Hello."
+                (directory / f"2021-01-0{day}T00-00-00Z.md").write_text(text)
+    return tmp_path
+
+
+def test_chunks():
+    engine = ScanEngine(workers=1, chunk_size=2)
+    assert engine.chunks([1, 2, 3, 4, 5]) == [[1, 2], [3, 4], [5]]
+    assert engine.chunks([]) == []
+
+
+def test_map_sequential_and_parallel():
+    items = list(range(10))
+    sequential = ScanEngine(workers=1, chunk_size=3).map(sum, items)
+    parallel = ScanEngine(workers=2, chunk_size=3).map(sum, items)
+    assert list(sequential) == list(parallel) == [3, 12, 21, 9]
+
+
+@pytest.mark.parametrize(
+    "parser_class", [CGUsFirstOccurenceParser, CGUsAllOccurencesParser]
+)
+@pytest.mark.parametrize("terms", ["cookies", "hello,cookies", "nothing"])
+def test_parallel_parser_same_output(dataset, parser_class, terms):
+    sequential = parser_class(dataset, terms, workers=1)
+    sequential.run()
+    parallel = parser_class(dataset, terms, workers=2, chunk_size=4)
+    parallel.run()
+    assert parallel.to_dict() == sequential.to_dict()
+    assert list(parallel.to_dict()) == list(sequential.to_dict())
@@ -0,0 +1,82 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+import re
+import sys
+
+sys.path.append("./app/")
+
+import pytest
+
+from app.scanner import (
+    TermMatcher,
+    case_variants,
+    compile_bytes_patterns,
+    is_literal,
+    mmap_contains,
+)
+
+TEXTS = [
+    "Nous utilisons des COOKIES.",
+    "Données personnelles\r\nRGPD",
+    "DONNÉES PERSONNELLES",
+    "\ufeffKELVIN with a Kelvin sign: \u212aelvin",
+    "L\u0130ST and l\u0131st",
+    "\u017ftrict",
+    "Σίσυφος",
+    "",
+]
+TERMS = ["cookies", "données", "kelvin", "list", "strict", "σίσυφος", "rgpd,missing"]
+
+
+def test_is_literal():
+    assert is_literal("rgpd,cookies,California Act")
+    assert not is_literal("rg.d")
+    assert not is_literal("rgpd,")
+    assert not is_literal("(rgpd|cookies)")
+
+
+def test_case_variants():
+    assert case_variants("k") == ("K", "k", "\u212a")
+    assert case_variants("é") == ("É", "é")
+    assert case_variants("1") == ("1",)
+
+
+def test_regexes_are_not_compiled():
+    assert compile_bytes_patterns("rg.d") is None
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("terms", TERMS)
+def test_same_result_as_text_regex(tmp_path, text, terms):
+    path = tmp_path / "version.md"
+    path.write_bytes(text.encode())
+    regex = re.compile(terms.replace(",", "|"), re.IGNORECASE)
+    expected = any(regex.search(line) for line in text.splitlines())
+    assert mmap_contains(path, compile_bytes_patterns(terms)) == expected
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("regex", [False, True])
+def test_matcher_finds_each_term(text, regex):
+    terms = ["cookies", "données", "kelvin", "list", "strict", "σίσυφος", "rgpd"]
+    matcher = TermMatcher(terms, regex=regex)
+    if regex:
+        found = matcher.find_lines(text.splitlines())
+    else:
+        found = matcher.find_bytes(text.encode())
+    expected = {
+        index
+        for index, term in enumerate(terms)
+        if any(re.search(term, line, re.IGNORECASE) for line in text.splitlines())
+    }
+    assert found == expected
+
+
+def test_matcher_finds_terms_starting_at_the_same_position():
+    matcher = TermMatcher(["data", "data protection", "protect"])
+    assert matcher.find_bytes(b"Data Protection Act") == {0, 1, 2}
+    assert matcher.find_bytes(b"data only") == {0}
+
+
+def test_matcher_regex_terms():
+    matcher = TermMatcher(["rg.d", "cook(ie)?s", "absent"], regex=True)
+    assert matcher.find_lines(["About RGPD", "and COOKIES"]) == {0, 1}
@@ -0,0 +1,139 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+from datetime import date
+import sys
+
+import pytest
+
+sys.path.append("./app/")
+
+from app.catalog import DatasetCatalog
+from app.dataset_parser import CGUsAllOccurencesParser, CGUsTermPresenceParser
+from app.stats import ServiceStats, VersionGrid, contains_version
+
+
+@pytest.fixture
+def stats(tmp_path):
+    versions = {
+        "A": ["2021-01-04T10-00-00Z", "2021-01-04T12-00-00Z", "2021-02-01T00-00-00Z"],
+        "B": ["2021-01-10T00-00-00Z", "2021-03-15T00-00-00Z"],
+        "C": ["2021-03-16T00-00-00Z"],
+    }
+    for service, dates in versions.items():
+        directory = tmp_path / service / "Terms of Service"
+        directory.mkdir(parents=True)
+        for version_date in dates:
+            (directory / f"{version_date}.md").write_text(service)
+    return ServiceStats.build(DatasetCatalog(tmp_path))
+
+
+def test_monthly_series(stats):
+    assert stats.series() == [
+        {"year_month": "2021-01", "n_services_active": 2, "n_services_tracked": 2},
+        {"year_month": "2021-02", "n_services_active": 1, "n_services_tracked": 2},
+        {"year_month": "2021-03", "n_services_active": 2, "n_services_tracked": 3},
+    ]
+
+
+def test_daily_and_weekly_series(stats):
+    assert [row["date"] for row in stats.series("day")] == [
+        "2021-01-04",
+        "2021-01-10",
+        "2021-02-01",
+        "2021-03-15",
+        "2021-03-16",
+    ]
+    weeks = stats.series("week")
+    assert weeks[0] == {
+        "week": "2021-W01",
+        "n_services_active": 2,
+        "n_services_tracked": 2,
+    }
+    assert weeks[-1] == {
+        "week": "2021-W11",
+        "n_services_active": 2,
+        "n_services_tracked": 3,
+    }
+
+
+def test_date_range_keeps_tracked_count_since_the_beginning(stats):
+    assert stats.series(start=date(2021, 2, 15), end=date(2021, 3, 1)) == [
+        {"year_month": "2021-02", "n_services_active": 1, "n_services_tracked": 2},
+        {"year_month": "2021-03", "n_services_active": 2, "n_services_tracked": 3},
+    ]
+
+
+def test_services_filter(stats):
+    assert stats.series(services=["B", "unknown"]) == [
+        {"year_month": "2021-01", "n_services_active": 1, "n_services_tracked": 1},
+        {"year_month": "2021-03", "n_services_active": 1, "n_services_tracked": 1},
+    ]
+
+
+def test_unknown_granularity(stats):
+    with pytest.raises(ValueError):
+        stats.series("year")
+
+
+@pytest.fixture
+def term_dataset(tmp_path):
+    versions = {
+        ("A", "Terms of Service"): [
+            ("2021-01-04T10-00-00Z", "nothing yet"),
+            ("2021-01-20T00-00-00Z", "AI is mentioned"),
+            ("2021-03-01T00-00-00Z", "not anymore"),
+        ],
+        ("A", "Privacy Policy"): [("2021-02-01T00-00-00Z", "AI")],
+        ("B", "Terms of Service"): [("2021-03-15T00-00-00Z", "uses AI")],
+    }
+    for (service, doc_type), texts in versions.items():
+        directory = tmp_path / service / doc_type
+        directory.mkdir(parents=True)
+        for version_date, text in texts:
+            (directory / f"{version_date}.md").write_text(text)
+    return tmp_path
+
+
+def term_series(root_path, term, granularity="month", **filters):
+    parser = CGUsTermPresenceParser(root_path, term)
+    parser.run()
+    grid = VersionGrid.build(DatasetCatalog(root_path), granularity)
+    return [list(row.values()) for row in grid.term_series(parser.to_dict(), **filters)]
+
+
+def test_presence_matches_all_occurences(term_dataset):
+    parser = CGUsTermPresenceParser(term_dataset, "AI")
+    parser.run()
+    occurences = CGUsAllOccurencesParser(term_dataset, "AI")
+    occurences.run()
+    expected = [
+        contains
+        for documents in occurences.to_dict().values()
+        for dates in documents.values()
+        for contains in dates.values()
+    ]
+    presence = parser.to_dict()
+    assert [contains_version(presence, i) for i in range(len(expected))] == expected
+
+
+def test_term_series(term_dataset):
+    # period, documents containing, documents tracked, services containing, tracked
+    assert term_series(term_dataset, "AI") == [
+        ["2021-01", 1, 1, 1, 1],
+        ["2021-02", 2, 2, 1, 1],
+        ["2021-03", 2, 3, 2, 2],
+    ]
+    assert term_series(term_dataset, "AI", "day")[:2] == [
+        ["2021-01-04", 0, 1, 0, 1],
+        ["2021-01-20", 1, 1, 1, 1],
+    ]
+
+
+def test_term_series_filters(term_dataset):
+    assert term_series(term_dataset, "AI", services=["A"]) == [
+        ["2021-01", 1, 1, 1, 1],
+        ["2021-02", 2, 2, 1, 1],
+        ["2021-03", 1, 2, 1, 1],
+    ]
+    assert term_series(
+        term_dataset, "AI", doc_types=["Terms of Service"], start=date(2021, 2, 1)
+    ) == [["2021-03", 1, 2, 1, 2]]
@@ -0,0 +1,130 @@
+# pylint: disable=missing-function-docstring,wrong-import-position,redefined-outer-name
+import re
+import shutil
+import sys
+
+sys.path.append("./app/")
+
+import pytest
+
+from app.build_index import build_indexes
+from app.catalog import DatasetCatalog
+from app.content_hashes import ContentHashes
+from app.dataset_parser import CGUsAllOccurencesParser, CGUsFirstOccurenceParser
+from app.term_index import TermIndex, fold, trigrams
+
+
+@pytest.fixture
+def indexed_dataset(tmp_path):
+    root_path = tmp_path / "dataset"
+    shutil.copytree("tests/test_dataset", root_path)
+    build_indexes(root_path)
+    return root_path
+
+
+def test_fold_matches_case_insensitive_regex():
+    for term, text in [("kelvin", "KELVIN"), ("list", "LİST"), ("ss", "ſS")]:
+        assert re.search(term, text, re.IGNORECASE)
+        assert trigrams(fold(term)) <= trigrams(fold(text))
+
+
+def test_fold_ignores_other_non_ascii():
+    assert fold("Données") == b"donn\x00es"
+    assert trigrams(fold("Données")) == trigrams(b"don") | trigrams(b"onn")
+
+
+def test_candidates():
+    catalog = DatasetCatalog("tests/test_dataset/")
+    index = TermIndex.build(catalog, ContentHashes.build(catalog))
+    assert index.candidates("California") == {0, 1}
+    assert index.candidates("rgpd") == {1}
+    assert index.candidates("rgpd,CALIFORNIA") == {0, 1}
+    assert index.candidates("Ambanum") == set()
+
+
+def test_candidates_cannot_narrow():
+    catalog = DatasetCatalog("tests/test_dataset/")
+    index = TermIndex.build(catalog, ContentHashes.build(catalog))
+    assert index.candidates("rg.d") is None
+    assert index.candidates("rgpd,ca") is None
+    assert index.candidates("rgpd,") is None
+
+
+@pytest.mark.parametrize(
+    "terms", ["California", "rgpd", "Ambanum", "rgpd,ambanum", "r.pd", "ca"]
+)
+def test_parsers_same_output_with_index(indexed_dataset, terms):
+    for parser_class in [CGUsFirstOccurenceParser, CGUsAllOccurencesParser]:
+        without_index = parser_class("tests/test_dataset", terms)
+        without_index.run()
+        with_index = parser_class(indexed_dataset, terms)
+        with_index.run()
+        assert with_index.to_dict() == without_index.to_dict()
+
+
+def test_parser_only_reads_candidates(indexed_dataset, monkeypatch):
+    parser = CGUsAllOccurencesParser(indexed_dataset, "rgpd")
+    read = []
+    monkeypatch.setattr(
+        parser, "_file_contains", lambda path: read.append(path) or True
+    )
+    parser.run()
+    assert [path.name for path in read] == ["2020-11-11T16-30-22Z.md"]
+
+
+def test_stale_index_is_ignored(indexed_dataset):
+    (
+        indexed_dataset
+        / "FakeService"
+        / "Community Guidelines"
+        / "2020-11-11T16-30-22Z.md"
+    ).unlink()
+    parser = CGUsFirstOccurenceParser(indexed_dataset, "California")
+    parser.run()
+    assert parser._candidates(parser.dataset.catalog) is None
+
+
+def test_indexes_updated_from_previous_release(tmp_path, monkeypatch):
+    previous_root = tmp_path / "previous"
+    shutil.copytree("tests/test_dataset", previous_root)
+    (previous_root / "Removed" / "Terms of Service").mkdir(parents=True)
+    (
+        previous_root / "Removed" / "Terms of Service" / "2020-01-01T00-00-00Z.md"
+    ).write_text("Removed service, with California terms")
+    build_indexes(previous_root)
+    root_path = tmp_path / "next"
+    shutil.copytree(previous_root, root_path)
+    shutil.rmtree(root_path / ".index")
+    shutil.rmtree(root_path / "Removed")
+    added = (
+        root_path / "FakeService" / "Community Guidelines" / "2021-01-01T00-00-00Z.md"
+    )
+    added.write_text("A new version about rgpd and cookies")
+    (root_path / "Added" / "Privacy Policy").mkdir(parents=True)
+    (root_path / "Added" / "Privacy Policy" / "2020-06-01T00-00-00Z.md").write_text(
+        "California cookies"
+    )
+
+    reads = list()
+    for method in ["read_text", "read_bytes"]:
+        original = getattr(type(added), method)
+
+        def counting_read(path, *args, original=original, **kwargs):
+            reads.append(path.name)
+            return original(path, *args, **kwargs)
+
+        monkeypatch.setattr(type(added), method, counting_read)
+    build_indexes(root_path, previous_root)
+    monkeypatch.undo()
+    # each new version is read once to be hashed, and once to be indexed
+    assert sorted(reads) == 2 * ["2020-06-01T00-00-00Z.md"] + 2 * [
+        "2021-01-01T00-00-00Z.md"
+    ]
+
+    catalog = DatasetCatalog(root_path)
+    updated = TermIndex.load(root_path / ".index" / "terms.pickle")
+    rebuilt = TermIndex.build(catalog, ContentHashes.build(catalog))
+    assert updated.paths == rebuilt.paths
+    assert updated.postings == rebuilt.postings
+    updated_hashes = ContentHashes.load(root_path / ".index" / "contents.pickle")
+    assert updated_hashes.digests == ContentHashes.build(catalog).digests
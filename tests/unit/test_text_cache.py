@@ -0,0 +1,31 @@
+# pylint: disable=missing-function-docstring,wrong-import-position
+import sys
+
+sys.path.append("./app/")
+
+from app.text_cache import TextCache
+
+
+def test_hits_and_misses():
+    cache = TextCache()
+    reads = list()
+    for digest in [b"a", b"b", b"a"]:
+        cache.get_or_read(digest, lambda digest=digest: reads.append(digest) or "text")
+    assert reads == [b"a", b"b"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_eviction_bounded_by_size():
+    text = "x" * 1000
+    cache = TextCache(max_bytes=2 * sys.getsizeof(text))
+    for digest in [b"a", b"b", b"a", b"c"]:
+        cache.get_or_read(digest, lambda: text)
+    assert list(cache.entries) == [b"a", b"c"]
+    assert cache.stats()["bytes"] == 2 * sys.getsizeof(text)
+
+
+def test_larger_texts_are_not_kept():
+    cache = TextCache(max_bytes=100)
+    assert cache.get_or_read(b"a", lambda: "x" * 1000) == "x" * 1000
+    assert not cache.entries
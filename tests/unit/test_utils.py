@@ -6,7 +6,12 @@ sys.path.append("./app/")
 
 import pytest
 
-from app.utils import parse_user_date, parse_date_from_dataset_url
+from app.utils import (
+    date_range,
+    etag_matches,
+    parse_user_date,
+    parse_date_from_dataset_url,
+)
 
 
 def test_parse_date():
@@ -46,3 +51,55 @@ def test_parse_date_from_url_wrong_date_format():
     url = "https://github.com/releases/download/2021-03-04-fff81e8/dataset-04-03-2021-fff81e8.zip"
     parsed = parse_date_from_dataset_url(url)
     assert parsed == "could not parse"
+
+
+def test_date_range_steps():
+    start, end = datetime(2020, 1, 1), datetime(2020, 1, 15)
+    assert len(date_range(start, end, "day")) == 15
+    assert date_range(start, end, "week") == [
+        datetime(2020, 1, 1),
+        datetime(2020, 1, 8),
+        datetime(2020, 1, 15),
+    ]
+
+
+def test_date_range_months_keep_the_day():
+    dates = date_range(datetime(2020, 1, 31), datetime(2020, 5, 1), "month")
+    assert dates == [
+        datetime(2020, 1, 31),
+        datetime(2020, 2, 29),
+        datetime(2020, 3, 31),
+        datetime(2020, 4, 30),
+    ]
+
+
+def test_date_range_unknown_step():
+    with pytest.raises(ValueError):
+        date_range(datetime(2020, 1, 1), datetime(2020, 2, 1), "year")
+
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"def", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+    assert etag_matches('"abc"', 'W/"abc"')
+    assert etag_matches('W/"abc"', 'W/"abc"')
+
+
+def test_date_range_limit():
+    dates = date_range(datetime(1, 1, 1), datetime(9998, 12, 31), "day", limit=3)
+    assert dates == [datetime(1, 1, 1), datetime(1, 1, 2), datetime(1, 1, 3)]
+
+
+def test_date_range_stops_at_the_largest_date():
+    end = datetime(9999, 12, 31, 23, 59, 59)
+    assert date_range(datetime(9999, 12, 30), end, "day")[-1] == datetime(9999, 12, 31)
+    assert date_range(datetime(9999, 12, 1), end, "week") == [
+        datetime(9999, 12, day) for day in (1, 8, 15, 22, 29)
+    ]
+    assert date_range(datetime(9999, 11, 30), end, "month") == [
+        datetime(9999, 11, 30),
+        datetime(9999, 12, 30),
+    ]